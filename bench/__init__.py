@@ -0,0 +1 @@
+"""Offline benchmarks for the storage and prompt paths (``python -m bench --help``)."""
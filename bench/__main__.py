@@ -0,0 +1,262 @@
+"""Benchmark storage and prompt assembly against synthetic history, fully offline.
+
+    python -m bench --years 1 5 20 --save bench/baseline.json
+    python -m bench --years 1 5 20 --compare bench/baseline.json --threshold 1.5
+
+Backends: ``json`` / ``journal`` / ``sqlite`` use files in a temp directory, ``sheets``
+uses direct mode against ``FakeWorksheet``. ``--compare`` exits with status 1 when an
+operation's median slows beyond ``--threshold`` times the baseline (scaled by a
+calibration loop so a busier or slower machine does not read as a regression).
+``--compare`` also runs the import-time budget check (``bench.imports``) and fails on an
+overrun, so the one command used as a regression gate covers cold-start cost too
+(``--skip-imports`` leaves it out).
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from bench.datagen import generate_diaries, generate_mindmap
+from utils import mindmap as mindmaps
+from utils import prompting, rollups, sheets, storage
+from utils.fake_sheets import FakeWorksheet
+
+try:
+    from utils import ai
+except ImportError:  # streamlit / openai が無い環境では build_prompt を測らない
+    ai = None  # type: ignore
+
+BACKENDS = ["json", "journal", "sqlite", "sheets"]
+BENCH_SHEET_KEY = "bench"
+SEARCH_QUERIES = {
+    "search_diaries(語)": "カレー",
+    "search_diaries(項目)": "人:石田",
+    "search_diaries(AND/OR)": "早起き 散歩 OR 夜更かし",
+}
+
+
+def configure(backend: str, workdir: Path, diaries: List[Dict[str, Any]], mindmap_text: str) -> None:
+    """Point ``storage`` at ``workdir`` (or a fake sheet) and load ``diaries`` into it."""
+    storage.DIARY_FILE = workdir / "diaries.json"
+    storage.MINDMAP_FILE = workdir / "mindmap.json"
+    storage.MINDMAP_HISTORY_FILE = workdir / "mindmap_history.jsonl"
+    storage.JOURNAL_FILE = workdir / "diaries.jsonl"
+    storage.OUTBOX_FILE = workdir / "sheets_outbox.json"
+    storage.SQLITE_FILE = workdir / "diary.sqlite3"
+    storage.MIRROR_FILE = workdir / "sheets_mirror.json"
+    storage.JOURNAL_ENABLED = backend == "journal"
+    storage.SQLITE_ENABLED = backend == "sqlite"
+    storage.SHEETS_ENABLED = storage.SHEETS_DIRECT = backend == "sheets"
+    storage.SHEETS_WRITE_BEHIND = False
+    storage.SHEET_KEY = BENCH_SHEET_KEY
+    storage._sqlite_store = None
+    storage._sheet_mirror = None
+    rollups._default_store = rollups.RollupStore(workdir / "rollups.json")
+
+    storage.save_mindmap(mindmap_text)
+    if backend == "sheets":
+        rows = [storage.HEADERS] + [[d.get(h, "") for h in storage.HEADERS] for d in diaries]
+        sheets.install(BENCH_SHEET_KEY, FakeWorksheet(rows, user_entered=True), storage.HEADERS)
+    else:
+        storage.save_diaries(diaries)
+    storage.invalidate_cache()
+
+
+def operations(diaries: List[Dict[str, Any]], mindmap_text: str) -> Dict[str, Callable[[], Any]]:
+    latest = diaries[-1]
+    recent = diaries[-30:]
+    edits = itertools.count()
+
+    def upsert_diary() -> None:
+        # 直近30日を順に書き換える（新規追加ではなく更新の経路）
+        entry = dict(recent[next(edits) % len(recent)])
+        entry["反省"] = f"{entry['反省']}追記"
+        storage.upsert_diary(entry)
+
+    def load_cold() -> None:
+        storage.invalidate_cache()
+        storage.load_diaries()
+
+    def export_prompt() -> None:
+        # 「AIへ」ページと同じく、読み込みから組み立てまで
+        prompting.build_export_prompt(mindmap_text, storage.load_table())
+
+    def export_prompt_rollups() -> None:
+        prompting.build_export_prompt(
+            mindmap_text,
+            storage.load_table(),
+            history_builder=lambda ds, b: rollups.build_context(rollups.default_store(), ds, b),
+        )
+
+    # 先頭の枝を丸ごと消した版（削除された枝は今の版の枝一覧に無い）
+    chain, branches = mindmaps.parse(mindmap_text).trunk()
+    pruned = "\n".join([n.line for n in chain] + [line for b in branches[1:] for line in b.lines()])
+    related = [f"{d['仕事']} {d['反省']}" for d in recent]
+
+    ops: Dict[str, Callable[[], Any]] = {
+        "load_diaries(cold)": load_cold,
+        "load_diaries": storage.load_diaries,
+        "load_table": storage.load_table,
+        "get_diary": lambda: storage.get_diary(latest["date"]),
+        "upsert_diary": upsert_diary,
+        "query_diaries": lambda: storage.query_diaries(limit=20, offset=40),
+        "query_diaries(語)": lambda: storage.query_diaries(keyword="カレー", limit=20),
+        "list_missing_dates": lambda: storage.list_missing_dates(diaries, 30),
+        "list_missing_dates(365)": lambda: storage.list_missing_dates(diaries, 365),
+        "list_missing_dates(bitmap)": lambda: storage.list_missing_dates(lookback_days=30),
+        "list_missing_dates(bitmap,10y)": lambda: storage.list_missing_dates(lookback_days=3650),
+        "coverage.longest_streak": lambda: storage.coverage().longest_streak(diaries[0]["date"], latest["date"]),
+        "build_export_prompt": export_prompt,
+        "build_export_prompt(rollups)": export_prompt_rollups,
+        "mindmap.prompt_context": lambda: mindmaps.prompt_context(mindmap_text, related, budget_tokens=300),
+        "mindmap.prompt_context(枝の削除)": lambda: mindmaps.prompt_context(pruned, related, mindmap_text, 300),
+    }
+    for name, query in SEARCH_QUERIES.items():
+        ops[name] = lambda q=query: storage.search_diaries(q)
+    if ai is not None:
+        mindmap = {"content": mindmap_text}
+        ops["ai.build_prompt"] = lambda: ai.build_prompt(mindmap, latest)
+        ops["ai.build_prompt(history)"] = lambda: ai.build_prompt(mindmap, latest, history=diaries)
+    return ops
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    fn()  # 1回目はキャッシュ作成などを含むので捨てる
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    # メモリは別に1回だけ測る（tracemalloc 中は遅くなるため）
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+        "max_ms": max(samples),
+        "peak_kib": peak / 1024,
+    }
+
+
+def calibrate() -> float:
+    """Median ms of a fixed pure-Python workload, used to factor out machine speed in ``compare``."""
+    samples = []
+    for _ in range(7):
+        start = time.perf_counter()
+        sorted(str(i * 7919 % 10007) for i in range(100_000))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(years: List[float], backends: List[str], repeat: int, seed: int, only: Optional[str]) -> Dict[str, Dict[str, float]]:
+    mindmap_text = generate_mindmap(seed)
+    results: Dict[str, Dict[str, float]] = {}
+    for y in years:
+        diaries = generate_diaries(y, seed)
+        for backend in backends:
+            with tempfile.TemporaryDirectory(prefix="diary-bench-") as tmp:
+                configure(backend, Path(tmp), diaries, mindmap_text)
+                for name, fn in operations(diaries, mindmap_text).items():
+                    if only and only not in name:
+                        continue
+                    key = f"{backend}/{y:g}y/{name}"
+                    results[key] = measure(fn, repeat)
+                    r = results[key]
+                    print(
+                        f"{key:<48} p50 {r['p50_ms']:9.3f}ms  p95 {r['p95_ms']:9.3f}ms  "
+                        f"p99 {r['p99_ms']:9.3f}ms  peak {r['peak_kib']:9.1f}KiB",
+                        flush=True,
+                    )
+                storage.invalidate_cache()
+                sheets.reset(BENCH_SHEET_KEY)
+    if ai is None:
+        print("（streamlit / openai が無いため ai.build_prompt は測定していません）")
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+    min_delta_ms: float,
+    speed: float = 1.0,
+) -> List[str]:
+    """Keys whose median got slower than ``threshold`` x baseline (ignoring sub-``min_delta_ms`` noise).
+
+    Baseline times are multiplied by ``speed`` (current / baseline calibration time) first.
+    """
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        expected = base["p50_ms"] * speed
+        ratio = current["p50_ms"] / expected if expected > 0 else float("inf")
+        if ratio > threshold and current["p50_ms"] - expected > min_delta_ms:
+            regressions.append(f"{key}: {expected:.3f}ms -> {current['p50_ms']:.3f}ms (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5], help="history lengths to generate (1-20)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["json", "sheets"])
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="run operations whose name contains this text")
+    parser.add_argument("--save", type=Path, help="write results as a baseline JSON file")
+    parser.add_argument("--compare", type=Path, help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5, help="allowed slowdown ratio of the median")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    parser.add_argument("--skip-imports", action="store_true", help="with --compare, skip the import-time budget check")
+    args = parser.parse_args(argv)
+
+    calibration_ms = calibrate()
+    results = run(args.years, args.backends, args.repeat, args.seed, args.only)
+    if args.save:
+        meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "calibration_ms": calibration_ms,
+        }
+        args.save.write_text(json.dumps({"meta": meta, "results": results}, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"baseline を保存しました: {args.save}")
+    if args.compare:
+        status = 0
+        if not args.skip_imports:
+            from bench import imports
+
+            print("import 時間の予算:")
+            if imports.main([]):
+                status = 1
+        saved = json.loads(args.compare.read_text(encoding="utf-8"))
+        # 同じマシンでも負荷で速さが変わるので、基準処理の比で baseline を補正する
+        speed = calibration_ms / saved["meta"].get("calibration_ms", calibration_ms)
+        regressions = compare(results, saved["results"], args.threshold, args.min_delta_ms, speed)
+        if regressions:
+            print(f"遅くなった処理があります（閾値 x{args.threshold}）:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"baseline との比較: 閾値 x{args.threshold} を超えた処理はありません")
+        return status
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
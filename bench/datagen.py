@@ -0,0 +1,78 @@
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+DISHES = ["カレー", "味噌汁", "親子丼", "焼き魚", "野菜炒め", "パスタ", "肉じゃが", "冷やし中華", "鍋", "餃子", "サラダ", "卵焼き"]
+WORK = ["見積もり作成", "定例ミーティング", "資料レビュー", "出品作業", "在庫確認", "発送", "問い合わせ対応", "企画書", "経費精算", "コードレビュー"]
+PEOPLE = ["石田さん", "佐藤さん", "母", "父", "田中さん", "妻", "友人", "高橋さん", "上司", "後輩"]
+DONE = ["早起きできた", "筋トレ30分", "読書1章", "部屋の片付け", "英単語50個", "散歩", "日記を書く", "ストレッチ", "家計簿をつける"]
+TODO = ["早く寝る", "間食を減らす", "メールを溜めない", "朝のうちに重い作業", "スマホ時間を減らす", "水を多めに飲む"]
+REFLECTIONS = [
+    "午前中に集中できたのはよかった",
+    "夜更かししてしまい翌朝がつらかった",
+    "段取りを先に決めておけば迷わなかった",
+    "人に頼ることも大事だと感じた",
+    "思ったより時間がかかったので見積もりを見直したい",
+    "体調が万全ではなかったので無理をしなかった",
+    "小さな目標を積み重ねる感覚がつかめてきた",
+    "YouTube を見すぎたので時間を決めたい",
+]
+
+
+def _phrase(rng: random.Random, words: List[str], max_items: int) -> str:
+    return "、".join(rng.sample(words, rng.randint(1, max_items)))
+
+
+def generate_diaries(
+    years: float,
+    seed: int = 0,
+    end: Optional[date] = None,
+    skip_rate: float = 0.05,
+) -> List[Dict[str, Any]]:
+    """Realistic diary entries (oldest first) covering ``years`` up to ``end`` (default: today).
+
+    Each day's content depends only on ``seed`` and the day's distance from ``end``, so
+    runs with the same arguments produce the same data. About ``skip_rate`` of days are missing.
+    """
+    end = end or date.today()
+    days = int(years * 365)
+    diaries: List[Dict[str, Any]] = []
+    for offset in range(days - 1, -1, -1):
+        rng = random.Random(seed * 1_000_003 + offset)
+        if rng.random() < skip_rate:
+            continue
+        day = end - timedelta(days=offset)
+        # 反省は日によって長さが大きく違うので、1〜6文を連結する
+        reflection = "。".join(rng.choice(REFLECTIONS) for _ in range(rng.choice([1, 1, 2, 3, 6]))) + "。"
+        diaries.append(
+            {
+                "date": day.isoformat(),
+                "料理": _phrase(rng, DISHES, 3),
+                "仕事": _phrase(rng, WORK, 4),
+                "youtube": round(rng.uniform(0, 4), 1),
+                "やるでき": f"やる: {_phrase(rng, TODO, 2)} / でき: {_phrase(rng, DONE, 3)}",
+                "人": _phrase(rng, PEOPLE, 2),
+                "反省": reflection,
+                "updated_at": f"{day.isoformat()} 22:{rng.randint(0, 59):02d}",
+            }
+        )
+    return diaries
+
+
+def generate_mindmap(seed: int = 0, branches: int = 6, depth: int = 3) -> str:
+    """Indented bullet-list mindmap like the one edited on the mindmap page."""
+    rng = random.Random(seed)
+    topics = ["健康", "仕事", "家族", "学び", "お金", "趣味", "人間関係", "生活習慣"]
+    leaves = DONE + TODO + WORK
+
+    lines: List[str] = []
+
+    def grow(level: int, label: str) -> None:
+        lines.append("  " * level + f"- {label}")
+        if level + 1 < depth:
+            for _ in range(rng.randint(2, 4)):
+                grow(level + 1, rng.choice(leaves))
+
+    for topic in topics[:branches]:
+        grow(0, topic)
+    return "\n".join(lines)
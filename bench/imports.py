@@ -0,0 +1,107 @@
+"""Import-time budget check: ``python -m bench.imports`` exits 1 when a module is over budget.
+
+Each module is imported in a fresh interpreter after the modules every page has
+already loaded (streamlit and common stdlib), so the number is what the module adds
+to a cold start. Heavy SDKs must stay out of these imports entirely.
+"""
+import argparse
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# ページ側で先に読み込まれているもの（streamlit が無い環境でも標準ライブラリ分は揃える）
+PRELOAD = [
+    "streamlit",
+    "json",
+    "typing",
+    "re",
+    "inspect",
+    "pathlib",
+    "datetime",
+    "threading",
+    "dataclasses",
+    "concurrent.futures",
+    "hashlib",
+    "random",
+]
+BUDGETS_MS: Dict[str, float] = {
+    "utils.storage": 25.0,
+    "utils.nav": 30.0,
+    "utils.ai": 30.0,
+    "utils.prompting": 10.0,
+    "utils.rollups": 30.0,
+    "utils.batch": 30.0,
+}
+# 使う処理の中で初めて import されるべきもの
+FORBIDDEN = ["openai", "gspread", "oauth2client", "sqlite3", "numpy", "tiktoken"]
+# streamlit 前提のモジュール（streamlit が無いと測れない）
+NEEDS_STREAMLIT = {"utils.nav", "utils.ai"}
+
+_PROBE = """
+import importlib, json, sys, time
+for name in {preload!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
+before = set(sys.modules)
+start = time.perf_counter()
+importlib.import_module({module!r})
+ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": ms, "loaded": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def probe(module: str) -> Dict[str, object]:
+    code = _PROBE.format(preload=PRELOAD, module=module)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def check(modules: List[str], runs: int, scale: float) -> List[str]:
+    """Median import time per module over ``runs`` fresh interpreters; returns the failures."""
+    failures = []
+    have_streamlit = importlib.util.find_spec("streamlit") is not None
+    for module in modules:
+        if module in NEEDS_STREAMLIT and not have_streamlit:
+            print(f"{module:<18} skip（streamlit が無い環境）")
+            continue
+        results = [probe(module) for _ in range(runs)]
+        ms = statistics.median(float(r["ms"]) for r in results)  # type: ignore[arg-type]
+        budget = BUDGETS_MS[module] * scale
+        heavy = sorted({m.split(".")[0] for r in results for m in r["loaded"] if m.split(".")[0] in FORBIDDEN})  # type: ignore[union-attr]
+        status = "ok" if ms <= budget and not heavy else "NG"
+        print(f"{module:<18} {ms:7.1f}ms / budget {budget:5.1f}ms  {status}" + (f"  heavy: {', '.join(heavy)}" if heavy else ""))
+        if ms > budget:
+            failures.append(f"{module}: {ms:.1f}ms > {budget:.1f}ms")
+        if heavy:
+            failures.append(f"{module}: import 時に {', '.join(heavy)} を読み込んでいます")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.imports", description=__doc__)
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS), help="modules to check (default: all budgeted)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow CI machines)")
+    args = parser.parse_args(argv)
+    unknown = [m for m in args.modules if m not in BUDGETS_MS]
+    if unknown:
+        parser.error(f"budget がないモジュール: {', '.join(unknown)}")
+    failures = check(args.modules, args.runs, args.scale)
+    if failures:
+        print("import 時間の予算を超えています:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@ import datetime as dt
 
 import streamlit as st
 
-from utils import nav, storage
+from utils import coverage, nav, storage
 
 
 st.set_page_config(
@@ -17,8 +17,9 @@ nav.sidebar("ホーム")
 st.title("日記 × 目標管理")
 st.caption("スマホで完結する日記と目標の伴走アプリ")
 
-diaries = storage.load_diaries()
-missing = storage.list_missing_dates(diaries, lookback_days=14)
+today = dt.date.today()
+calendar = storage.coverage()
+missing = storage.list_missing_dates(lookback_days=14)
 
 st.header("メニュー", divider=True)
 cols = st.columns(2)
@@ -33,28 +34,43 @@ if missing:
 else:
     st.success("直近2週間はすべて記入済みです。")
 
+st.header("記入カレンダー", divider=True)
+first_day = calendar.first()
+years = list(range(today.year, first_day.year - 1, -1)) if first_day else []
+shown = st.selectbox("表示する期間", ["直近1年"] + years, format_func=lambda y: y if isinstance(y, str) else f"{y}年")
+end = today if isinstance(shown, str) else min(dt.date(shown, 12, 31), today)
+start = end - dt.timedelta(days=364) if isinstance(shown, str) else dt.date(shown, 1, 1)
+# 今日がまだ未記入でも、昨日まで続いていれば継続中として数える
+streak = calendar.current_streak(today) or calendar.current_streak(today - dt.timedelta(days=1))
+cols = st.columns(3)
+cols[0].metric("記入率", f"{calendar.ratio(start, end):.0%}", help=f"{start} 〜 {end}")
+cols[1].metric("連続記入", f"{streak} 日")
+cols[2].metric("最長連続", f"{calendar.longest_streak(start, end)[0]} 日", help="表示中の期間内")
+st.markdown(
+    f'<div style="overflow-x:auto">{coverage.calendar_svg(calendar, end)}</div>',
+    unsafe_allow_html=True,
+)
+
 st.header("最新の記録", divider="rainbow")
-if diaries:
-    latest = sorted(diaries, key=lambda x: x["date"], reverse=True)[0]
-    st.write(f"日付: {latest['date']}（更新: {latest.get('updated_at', 'N/A')}）")
+recent, _ = storage.query_diaries(limit=5)
+if recent:
+    latest = recent[0]
+    st.write(f"日付: {latest.date}（更新: {latest.updated_at or 'N/A'}）")
     st.markdown(
         f"""
-        - 料理: {latest.get('料理', '')}
-        - 仕事: {latest.get('仕事', '')}
-        - YouTube: {latest.get('youtube', 0)} 時間
-        - やる/でき: {latest.get('やるでき', '')}
-        - 人: {latest.get('人', '')}
-        - 反省: {latest.get('反省', '')}
+        - 料理: {latest.cooking}
+        - 仕事: {latest.work}
+        - YouTube: {latest.youtube} 時間
+        - やる/でき: {latest.yarudeki}
+        - 人: {latest.person}
+        - 反省: {latest.reflection}
         """.strip()
     )
 else:
     st.info("まだ日記がありません。まずは「日記を書く／編集」から始めましょう。")
 
 st.header("最近のアクティビティ", divider=True)
-recent = sorted(diaries, key=lambda x: x["date"], reverse=True)[:5]
 for entry in recent:
-    st.write(
-        f"{entry['date']}｜料理: {entry.get('料理', '')}｜仕事: {entry.get('仕事', '')}｜YouTube: {entry.get('youtube', 0)}h"
-    )
+    st.write(f"{entry.date}｜料理: {entry.cooking}｜仕事: {entry.work}｜YouTube: {entry.youtube}h")
 
 st.caption("OpenAI APIキーは .streamlit/secrets.toml に設定してください。")
@@ -3,6 +3,7 @@ import datetime as dt
 import streamlit as st
 
 from utils import nav, storage
+from utils.models import DiaryEntry
 
 
 st.set_page_config(
@@ -21,33 +22,35 @@ existing = storage.get_diary(date_str)
 
 if existing:
     st.info(f"{date_str} の既存データを読み込みました。")
+current = existing or DiaryEntry.empty(date_str)
 
 with st.form("diary_form"):
-    cooking = st.text_area("料理", value=existing.get("料理", "") if existing else "", height=120)
-    work = st.text_area("仕事", value=existing.get("仕事", "") if existing else "", height=120)
+    cooking = st.text_area("料理", value=current.cooking, height=120)
+    work = st.text_area("仕事", value=current.work, height=120)
     youtube = st.number_input(
         "YouTube視聴時間（h）",
         min_value=0.0,
         format="%.1f",
-        value=float(existing.get("youtube", 0.0)) if existing else 0.0,
+        value=max(0.0, current.youtube),
         step=0.5,
     )
-    yande = st.text_area("やる / できなかった", value=existing.get("やるでき", "") if existing else "", height=80)
-    person = st.text_area("人（会った・関わった）", value=existing.get("人", "") if existing else "", height=80)
-    reflection = st.text_area("反省・学び", value=existing.get("反省", "") if existing else "", height=120)
+    yande = st.text_area("やる / できなかった", value=current.yarudeki, height=80)
+    person = st.text_area("人（会った・関わった）", value=current.person, height=80)
+    reflection = st.text_area("反省・学び", value=current.reflection, height=120)
 
     submitted = st.form_submit_button("保存する", use_container_width=True)
 
 if submitted:
-    entry = {
-        "date": date_str,
-        "料理": cooking,
-        "仕事": work,
-        "youtube": youtube,
-        "やるでき": yande,
-        "人": person,
-        "反省": reflection,
-    }
+    entry = DiaryEntry(
+        date=date_str,
+        cooking=cooking,
+        work=work,
+        youtube=float(youtube),
+        yarudeki=yande,
+        person=person,
+        reflection=reflection,
+        updated_at="",
+    )
     try:
         storage.upsert_diary(entry)
         st.success("保存しました。")
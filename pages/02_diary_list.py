@@ -1,3 +1,5 @@
+import math
+
 import streamlit as st
 
 from utils import nav, storage
@@ -13,27 +15,59 @@ st.set_page_config(
 nav.sidebar("日記一覧／検索")
 st.title("📜 日記一覧／検索")
 
-diaries = storage.load_diaries()
+FIELD_OPTIONS = ["すべて", "料理", "仕事", "やるでき", "人", "反省"]
+PAGE_SIZES = [10, 20, 50, 100]
 
-if not diaries:
-    st.info("まだ日記がありません。")
-    st.stop()
+keyword = st.text_input("キーワード検索（人名・出来事など）", placeholder="例: 石田くん, 人:石田, カレー OR 肉")
+cols = st.columns(3)
+field = cols[0].selectbox("検索する項目", FIELD_OPTIONS)
+start = cols[1].date_input("開始日", value=None)
+end = cols[2].date_input("終了日", value=None)
+
+query = keyword
+if keyword and field != "すべて":
+    # 「人」を選んだら各語を「人:語」として項目を絞る
+    query = " ".join(t if t.upper() in ("OR", "|") or ":" in t else f"{field}:{t}" for t in keyword.split())
+
+st.session_state.setdefault("list-page-size", PAGE_SIZES[1])
+st.session_state.setdefault("list-page", 1)
+page_size = st.session_state["list-page-size"]
+page = st.session_state["list-page"]
+start_str = start.isoformat() if start else None
+end_str = end.isoformat() if end else None
 
-keyword = st.text_input("キーワード検索（人名・出来事など）", placeholder="例: 石田くん, 料理")
+entries, total = storage.query_diaries(start_str, end_str, query, limit=page_size, offset=(page - 1) * page_size)
+pages = max(1, math.ceil(total / page_size))
+if page > pages:
+    # 絞り込みでページ数が減ったときは先頭に戻す
+    page = st.session_state["list-page"] = 1
+    entries, total = storage.query_diaries(start_str, end_str, query, limit=page_size, offset=0)
+
+if total == 0:
+    st.info("まだ日記がありません。" if not (keyword or start or end) else "該当する日記がありません。")
+    st.stop()
 
-filtered = diaries
 if keyword:
-    filtered = storage.search_diaries(keyword)
-    st.caption(f"{len(filtered)} 件ヒット")
-
-for entry in sorted(filtered, key=lambda x: x["date"], reverse=True):
-    with st.expander(f"{entry['date']} ｜ {entry.get('仕事', '')[:20]}"):
-        st.write(f"更新: {entry.get('updated_at', 'N/A')}")
-        st.write(f"料理: {entry.get('料理', '')}")
-        st.write(f"仕事: {entry.get('仕事', '')}")
-        st.write(f"YouTube: {entry.get('youtube', 0)} 時間")
-        st.write(f"やる/でき: {entry.get('やるでき', '')}")
-        st.write(f"人: {entry.get('人', '')}")
-        st.write(f"反省: {entry.get('反省', '')}")
+    # 検索結果はヒット数→新しい順に並んでいる
+    st.caption(f"{total} 件ヒット（「人:石田」で項目を指定、スペース区切りでAND、ORで いずれか）")
+else:
+    st.caption(f"全 {total} 件")
+
+for entry in entries:
+    # 本文は開いたときだけ描画する
+    opened = st.toggle(f"{entry.date} ｜ {entry.work[:20]}", key=f"open-{entry.date}")
+    if opened:
+        with st.container(border=True):
+            st.write(f"更新: {entry.updated_at or 'N/A'}")
+            st.write(f"料理: {entry.cooking}")
+            st.write(f"仕事: {entry.work}")
+            st.write(f"YouTube: {entry.youtube} 時間")
+            st.write(f"やる/でき: {entry.yarudeki}")
+            st.write(f"人: {entry.person}")
+            st.write(f"反省: {entry.reflection}")
+
+cols = st.columns(2)
+cols[0].number_input(f"ページ（全 {pages} ページ）", min_value=1, max_value=pages, key="list-page")
+cols[1].selectbox("表示件数", PAGE_SIZES, key="list-page-size")
 
 st.page_link("pages/01_diary.py", label="✍️ この日記を編集するには「日付」を指定して保存してください", use_container_width=True)
@@ -1,5 +1,6 @@
 import streamlit as st
 
+from utils import mindmap as mindmaps
 from utils import nav, storage
 
 
@@ -32,3 +33,41 @@ if submitted:
         st.success(f"保存しました（{updated['updated_at']}）")
     except storage.StorageError as exc:
         st.error(str(exc))
+
+
+def restore(number: int) -> None:
+    # 復元も新しい版として保存する（復元前の内容も履歴に残る）
+    try:
+        storage.save_mindmap(storage.mindmap_history().content(number))
+        st.toast(f"第{number}版を復元しました。")
+    except storage.StorageError as exc:
+        st.toast(str(exc))
+
+
+history = storage.mindmap_history()
+revisions = history.revisions()
+if revisions:
+    st.header("変更履歴", divider=True)
+    labels = {r.number: f"第{r.number}版（{r.at or '日時不明'}）" for r in reversed(revisions)}
+    numbers = list(labels)
+    cols = st.columns(2)
+    old_no = cols[0].selectbox(
+        "元の版", numbers, index=min(1, len(numbers) - 1), format_func=labels.get, key="mindmap-old"
+    )
+    new_no = cols[1].selectbox("比べる版", numbers, format_func=labels.get, key="mindmap-new")
+    # 各版は全文1つ＋差分数件から復元し、ツリーは内容のハッシュごとにキャッシュされる
+    diff = mindmaps.diff_trees(
+        mindmaps.parse(history.content(old_no)), mindmaps.parse(history.content(new_no))
+    )
+    if diff:
+        lines = [f"+ {' › '.join(p)}" for p in diff.added] + [f"- {' › '.join(p)}" for p in diff.removed]
+        st.code("\n".join(lines), language="diff")
+    else:
+        st.caption("2つの版の項目に違いはありません。")
+    st.button(
+        f"{labels[old_no]}を復元する",
+        on_click=restore,
+        args=(old_no,),
+        disabled=revisions[old_no - 1].digest == revisions[-1].digest,
+        use_container_width=True,
+    )
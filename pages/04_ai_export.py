@@ -1,8 +1,9 @@
-import json
-
 import streamlit as st
 
-from utils import nav, storage
+from utils import ai, ai_cache, clipboard, nav, prompting, rollups, storage
+
+# 確認用の表示は先頭だけにする（全文はコピー・ダウンロードで渡す）
+PREVIEW_CHARS = 3000
 
 
 st.set_page_config(
@@ -15,30 +16,57 @@ st.set_page_config(
 nav.sidebar("AIへ")
 st.title("🤖 AIへ（コピー用プロンプト生成）")
 
-diaries = storage.load_diaries()
+diaries = storage.load_table()
 mindmap = storage.load_mindmap()
 
 if not diaries:
     st.info("日記データがまだありません。先に日記を登録してください。")
     st.stop()
 
-# シート全件をそのままテキスト化
-diary_text = json.dumps(diaries, ensure_ascii=False, indent=2)
-
-prompt_template = f"""#役割
-目標達成までの伴奏してくれるアドバイザーです。
-#命令
-今までのアドバイスをもとにマインドマップを作成し、取り組み始めました。
-昨日までの結果もふくめ、よくできたことを上げたり、もっと効率的にできたことなど気がついたことがあればアドバイスを箇条書きにしてください。
-#文脈
-マインドマップ
-{mindmap.get('content','')}
-日記
-{diary_text}
-""".strip()
+cols = st.columns(2)
+budget = cols[0].slider("トークン予算", min_value=1000, max_value=30000, value=prompting.DEFAULT_BUDGET_TOKENS, step=500)
+full_days = cols[1].slider("全文で載せる直近の日数", min_value=1, max_value=60, value=prompting.DEFAULT_FULL_DAYS)
+
+use_rollups = st.toggle("古い日は週・月ごとのまとめにする", value=len(diaries) > 60)
+
+# マインドマップは予算の1/4まで。超える分は直近の日記に関係する枝・その間に変わった枝だけ載せる
+recent = diaries.latest(full_days)
+context = ai.mindmap_context(mindmap, recent, budget // 4)
+mindmap_text = context.text if context is not None else ""
+
+if use_rollups:
+    # 期間ごとのまとめはキャッシュされ、その期間の日記が変わったときだけ作り直される
+    built = prompting.build_export_prompt(
+        mindmap_text,
+        diaries,
+        budget,
+        history_builder=lambda ds, b: rollups.build_context(rollups.default_store(), ds, b),
+    )
+    st.caption(f"推定トークン数: 約 {built.tokens:,}（月・週のまとめ＋直近の日記）")
+else:
+    # 直近は全文、古い日は要約した1行にして予算内に収める
+    built = prompting.build_export_prompt(mindmap_text, diaries, budget, full_days)
+    st.caption(
+        f"推定トークン数: 約 {built.tokens:,}（全文 {built.full_days} 日 / 要約 {built.condensed_days} 日"
+        + (f" / 省略 {built.omitted_days} 日" if built.omitted_days else "")
+        + "）"
+    )
+if context is not None and (context.omitted or context.changed):
+    st.caption(
+        f"マインドマップ: {' / '.join(context.shown) or 'なし'} を掲載"
+        + (f"（省略: {' / '.join(context.omitted)}）" if context.omitted else "")
+        + (f" / 直近 {len(recent)} 日で変更: {' / '.join(context.changed)}" if context.changed else "")
+    )
+prompt_template = built.text
 
 st.subheader("生成されたプロンプト")
-st.code(prompt_template, language="text")
+clipboard.copy_button(prompt_template, key="copy-ai-export")
+# 本文は開いたときだけ送る（閉じていれば再実行ごとの送信量はコピーボタンの digest だけ）
+if st.toggle("内容を確認する", key="ai-export-preview"):
+    preview = prompt_template[:PREVIEW_CHARS]
+    if len(prompt_template) > PREVIEW_CHARS:
+        preview += f"\n…（以下 {len(prompt_template) - PREVIEW_CHARS:,} 文字省略。コピー・ダウンロードには全文が入ります）"
+    st.text_area("生成されたプロンプト", value=preview, height=300, disabled=True, label_visibility="collapsed")
 st.download_button(
     label="テキストをダウンロード",
     data=prompt_template,
@@ -47,4 +75,17 @@ st.download_button(
     use_container_width=True,
 )
 
-st.caption("上のコピーアイコンまたはダウンロードボタンでAIに貼り付けてください。")
+st.caption("コピーボタンまたはダウンロードボタンでAIに貼り付けてください。")
+
+st.header("アプリ内で振り返る", divider=True)
+regenerate = st.checkbox("保存済みの振り返りを使わず作り直す")
+if st.button("最新の日記をAIに振り返ってもらう", use_container_width=True):
+    latest = diaries.latest()[0]
+    st.caption(f"{latest.date} の日記（古い日は週・月のまとめで送ります）")
+    try:
+        # 届いた分から順に表示する。同じ内容なら保存済みの結果をすぐ返す
+        st.write_stream(ai.stream_reflection(mindmap, latest, history=diaries, regenerate=regenerate))
+    except (RuntimeError, ValueError) as exc:
+        st.error(str(exc))
+    stats = ai_cache.default_cache().stats()
+    st.caption(f"キャッシュ: ヒット {stats['hits']} / ミス {stats['misses']}")
@@ -0,0 +1,63 @@
+import datetime as dt
+
+import streamlit as st
+
+from utils import ai, batch, nav, storage
+
+
+st.set_page_config(
+    page_title="振り返りをまとめて作成",
+    page_icon="🗓️",
+    layout="centered",
+    menu_items=None,
+)
+
+nav.sidebar("振り返りをまとめて作成")
+st.title("🗓️ 振り返りをまとめて作成")
+st.caption("期間内の日ごと／週ごとに AI の振り返りを作ります。作成済みの分は飛ばすので、途中で止まっても続きから再開できます。")
+
+diaries = storage.load_diaries()
+mindmap = storage.load_mindmap()
+
+if not diaries:
+    st.info("日記データがまだありません。先に日記を登録してください。")
+    st.stop()
+
+today = dt.date.today()
+cols = st.columns(2)
+start = cols[0].date_input("開始日", value=today - dt.timedelta(days=29))
+end = cols[1].date_input("終了日", value=today)
+unit = st.radio("単位", ["day", "week"], format_func=lambda u: "日ごと" if u == "day" else "週ごと", horizontal=True)
+workers = st.slider("同時実行数", min_value=1, max_value=8, value=4)
+regenerate = st.checkbox("作成済みの分も作り直す")
+
+jobs = batch.plan_jobs(diaries, start, end, unit)
+store = batch.default_store()
+st.caption(f"対象 {len(jobs)} 件（作成済み {sum(1 for job in jobs if store.get(job[0]))} 件）")
+
+if st.button("まとめて作成する", use_container_width=True, disabled=not jobs):
+    progress = st.progress(0.0, text="準備中…")
+
+    def on_progress(done: int, total: int, key: str) -> None:
+        progress.progress(done / total, text=f"{done} / {total} 件（{key}）")
+
+    def generate(entries, history, acquire):
+        target = entries[0] if unit == "day" else entries
+        return ai.generate_reflection(mindmap, target, history=history, regenerate=regenerate, reserve=acquire)
+
+    result = batch.run_batch(
+        jobs, generate, store, model="gpt-4o-mini", max_workers=workers, regenerate=regenerate, on_progress=on_progress
+    )
+    progress.progress(1.0, text="完了")
+    st.success(f"作成 {result['generated']} 件 / スキップ {result['skipped']} 件")
+    for key, error in result["errors"].items():
+        st.error(f"{key}: {error}")
+
+st.header("作成済みの振り返り", divider=True)
+keys = {job[0] for job in jobs}
+for key, item in reversed(store.items()):
+    if key not in keys:
+        continue
+    # 本文は開いたときだけ描画する
+    if st.toggle(f"{item['label']}（{item['generated_at']}）", key=f"reflection-{key}"):
+        st.markdown(item["text"])
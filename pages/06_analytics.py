@@ -0,0 +1,86 @@
+import math
+
+import streamlit as st
+
+from utils import analytics, nav, storage
+
+
+st.set_page_config(
+    page_title="YouTube 時間の分析",
+    page_icon="📈",
+    layout="centered",
+    menu_items=None,
+)
+
+nav.sidebar("YouTube 時間の分析")
+st.title("📈 YouTube 時間の分析")
+
+diaries = storage.load_table()
+if not diaries:
+    st.info("日記データがまだありません。先に日記を登録してください。")
+    st.stop()
+
+stats = analytics.current(diaries)
+latest = stats.latest()
+streaks = stats.streaks()
+
+
+def _fmt(value: float) -> str:
+    return "—" if math.isnan(value) else f"{value:.1f}h"
+
+
+cols = st.columns(4)
+cols[0].metric("連続記入", f"{streaks['current']} 日", help=f"最長 {streaks['longest']} 日")
+cols[1].metric("7日平均", _fmt(latest["7日平均"]))
+cols[2].metric("30日平均", _fmt(latest["30日平均"]))
+cols[3].metric(
+    "今週の合計",
+    f"{latest['今週']:.1f}h",
+    delta=f"{latest['今週'] - latest['先週']:+.1f}h",
+    delta_color="inverse",
+    help="先週との差",
+)
+
+st.header("日ごとの推移", divider=True)
+PERIODS = {"90日": 90, "1年": 365, "全期間": None}
+period = st.radio("期間", list(PERIODS), horizontal=True, label_visibility="collapsed")
+st.line_chart(stats.daily(PERIODS[period]), x="日付", y=["YouTube", "7日平均", "30日平均"])
+
+st.header("週ごとの合計", divider=True)
+weekly = stats.weekly(26)
+st.bar_chart(weekly, x="週", y="合計")
+st.dataframe(
+    {
+        "週": weekly["週"][::-1],
+        "合計(h)": weekly["合計"][::-1].round(1),
+        "前週比(h)": weekly["前週比"][::-1].round(1),
+        "記入日数": weekly["記入日数"][::-1],
+    },
+    hide_index=True,
+    use_container_width=True,
+)
+
+st.header("曜日ごとの傾向", divider=True)
+by_weekday = stats.weekday_stats()
+st.bar_chart(by_weekday, x="曜日", y="mean", y_label="平均(h)")
+st.dataframe(
+    {
+        "曜日": by_weekday["曜日"],
+        "平均(h)": by_weekday["mean"].round(1),
+        "中央値(h)": by_weekday["median"].round(1),
+        "25〜75%(h)": [
+            "—" if math.isnan(lo) else f"{lo:.1f}〜{hi:.1f}" for lo, hi in zip(by_weekday["p25"], by_weekday["p75"])
+        ],
+        "記入率": [f"{r:.0%}" if not math.isnan(r) else "—" for r in by_weekday["記入率"]],
+    },
+    hide_index=True,
+    use_container_width=True,
+)
+
+st.header("記入の抜け", divider=True)
+st.caption(f"記入 {streaks['written_days']} 日 / 未記入 {streaks['missing_days']} 日（最初の記録から今日まで）")
+if streaks["gaps"]:
+    for start, length in streaks["gaps"]:
+        st.write(f"- {start} から {length} 日")
+else:
+    st.success("抜けている日はありません。")
@@ -1,27 +1,37 @@
 ﻿# streamlit_mercari_prompts.py
-import json
-from textwrap import dedent
+import hashlib
+import os
+import tempfile
+from typing import Any, Dict, Optional, Tuple
 
 import streamlit as st
-import streamlit.components.v1 as components
+
+from utils.catalog import Catalog, CatalogItem, default_catalog, import_files
+from utils.clipboard import copy_button
+from utils.mercari import (
+    BULK_FIELDS,
+    FIELD_LABELS,
+    MODE_LABELS,
+    build_items,
+    read_rows,
+    registry,
+    write_jsonl,
+    write_zip,
+)
+from utils.templates import CompiledTemplate, FieldSpec
 
 st.set_page_config(page_title="メルカリ出品サポート", layout="centered")
 st.title("メルカリ出品サポート")
 st.caption("モードを選んで必要事項を入力し、生成されたプロンプトをコピーしてください。")
 
-MODE_OPTIONS = [
-    ("unknown", "1. 不明商品モード"),
-    ("name_lookup", "2. 商品名探索モード"),
-    ("known_name", "3. 商品名がわかる出品サポート"),
-    ("known_code", "4. 型番/JANがわかる出品サポート"),
-]
+# モードは templates/mercari/*.json から作る（ファイルを足す・直すと次の操作で反映される）
+templates = registry()
+templates.refresh()
+MODE_OPTIONS = {key: tpl.label for key, tpl in templates.templates().items()}
+MODE_OPTIONS["bulk"] = f"{len(MODE_OPTIONS) + 1}. 一括作成（CSV/TSV）"
 
 if "prompts" not in st.session_state:
-    st.session_state.prompts = {key: "" for key, _ in MODE_OPTIONS}
-
-COPY_INSTRUCTION = (
-    "それぞれ個別のコピー操作をするため、各項目のテキストが単独で使えるようコピー専用ブロックで出力してください。"
-)
+    st.session_state.prompts = {}
 
 
 def store_prompt(mode_key: str, prompt: str) -> None:
@@ -30,182 +40,217 @@ def store_prompt(mode_key: str, prompt: str) -> None:
     st.toast("プロンプトを生成しました。下でコピーできます。")
 
 
-def render_copy_button(prompt: str) -> None:
-    """Custom HTML button so the clipboard copy also works on mobile."""
-    safe_text = json.dumps(prompt)
-    components.html(
-        f"""
-        <div style="display:flex; justify-content:flex-end; width:100%; margin-bottom:0.3rem;">
-          <button
-            style="background-color:#ff6b6b;border:none;border-radius:8px;
-                   color:white;font-size:1rem;padding:0.55rem 1.4rem;cursor:pointer;"
-            onclick='navigator.clipboard.writeText({safe_text}).then(() => {{
-              const toast = document.createElement("div");
-              toast.textContent = "コピーしました";
-              toast.style.position = "fixed";
-              toast.style.bottom = "24px";
-              toast.style.left = "50%";
-              toast.style.transform = "translateX(-50%)";
-              toast.style.background = "#323232";
-              toast.style.color = "#fff";
-              toast.style.padding = "0.6rem 1.2rem";
-              toast.style.borderRadius = "999px";
-              toast.style.zIndex = "9999";
-              document.body.appendChild(toast);
-              setTimeout(() => toast.remove(), 1800);
-            }})'>
-            コピー
-          </button>
-        </div>
-        """,
-        height=70,
-        scrolling=False,
-    )
+def apply_catalog_item(tpl: CompiledTemplate, item: CatalogItem) -> None:
+    """Copy the catalog's values into the template's inputs and switch to that mode."""
+    values = item.values()
+    for spec in tpl.fields:
+        if values.get(spec.name):
+            st.session_state[f"{tpl.key}-{spec.name}"] = values[spec.name]
+    st.session_state["mode"] = tpl.key
+    st.toast("商品カタログから入力しました。")
 
 
-NAME_LOOKUP_PROMPT = dedent(
-    """
-    アップロードされた画像（2枚程度）をもとにできるだけ正確な商品名を探し出す。
-    （プロンプト: この商品の商品名を教えて下さい。確証がない場合は候補を3つ程度上げてください。
-    そのときJANコードも教えてほしいです。）
-    """
-).strip()
+def autofill(tpl: CompiledTemplate, spec: FieldSpec, catalog: Catalog) -> None:
+    value = st.session_state.get(f"{tpl.key}-{spec.name}", "")
+    if spec.lookup == "jan":
+        item = catalog.lookup_jan(value)
+    else:
+        matches = catalog.lookup_model(value)
+        item = matches[0] if len(matches) == 1 else None
+    if item is not None:
+        apply_catalog_item(tpl, item)
 
 
-def render_unknown_mode() -> None:
-    st.write("商品情報がほとんど無いときに使うテンプレートです。")
-    notes = st.text_area(
-        "特徴・注意事項",
-        placeholder="例: 付属品の欠品、動作確認済み内容など",
-        key="unknown-notes",
-    )
-    if st.button("プロンプトを表示", use_container_width=True, key="btn-unknown"):
-        notes_instruction = (
-            f"商品説明の冒頭には次の特徴・注意事項を丁寧に書いてください: {notes.strip()}"
-            if notes.strip()
-            else "商品説明の冒頭で購入者が知りたい特徴・注意事項を丁寧に説明してください。"
-        )
-        prompt = dedent(
-            f"""
-            メルカリに商品を出品します。画像などをもとに商品名～最低価格までをAIに検索し、
-            以下の項目について類似の商品から購入しやすいようにそれぞれシンプルにまとめてください。
-            以下のように表示してください。
-            商品説明は写真を参考に売れやすい文句を考えてください
-            商品名:
-            カテゴリー:
-            型番:
-            商品の説明:
-            最低価格:
-            あと、同様の商品が売れていたら最低販売済み価格を表示してください。
-            {notes_instruction}
-            {COPY_INSTRUCTION}
-            絵文字は登録できません。
-            """
-        ).strip()
-        store_prompt("unknown", prompt)
-
-
-def render_name_lookup_mode() -> None:
-    st.write("画像から商品名やJAN候補を洗い出したいときに利用します。")
-    if st.button("プロンプトを表示", use_container_width=True, key="btn-name-lookup"):
-        store_prompt("name_lookup", NAME_LOOKUP_PROMPT)
-
-
-def render_known_name_mode() -> None:
-    st.write("商品名が決まっている場合の簡易入力モードです。")
-    manufacturer = st.text_input("メーカー名", key="known-name-maker")
-    product_name = st.text_input("商品名", key="known-name-product")
-    notes = st.text_area(
-        "特徴・注意事項",
-        placeholder="例: 使用回数、キズ有無、付属品など",
-        key="known-name-notes",
-    )
+def lookup_target() -> Optional[CompiledTemplate]:
+    """The first mode whose fields can take catalog values (where search results are sent)."""
+    return next((t for t in templates.templates().values() if any(f.lookup for f in t.fields)), None)
 
-    if st.button("プロンプトを表示", use_container_width=True, key="btn-known-name"):
-        if not product_name.strip():
-            st.warning("商品名を入力してください。")
-            return
-        maker_label = f"{manufacturer.strip()}の" if manufacturer.strip() else ""
-        notes_instruction = (
-            f"商品説明の最初に以下の特徴・注意事項を丁寧に記載してください: {notes.strip()}"
-            if notes.strip()
-            else "商品説明の最初に商品の状態や注意点を丁寧に記載してください。"
+
+def render_catalog_search(catalog: Catalog) -> None:
+    target = lookup_target()
+    if target is None:
+        return
+    query = st.text_input("商品カタログを検索（JAN・型番の先頭）", key="catalog-query")
+    if not query.strip():
+        return
+    found = catalog.search(query, limit=20)
+    if not found:
+        st.caption("カタログに一致する商品がありません。")
+        return
+    for n, item in enumerate(found):
+        cols = st.columns([5, 1])
+        cols[0].write(f"{item.maker} {item.product}（{item.model or '型番なし'} / {item.jan or 'JANなし'}）")
+        cols[1].button("使う", key=f"catalog-use-{n}", on_click=apply_catalog_item, args=(target, item))
+
+
+def render_template_mode(tpl: CompiledTemplate, catalog: Optional[Catalog]) -> None:
+    """Inputs generated from the template's fields; the prompt is a fill of the compiled template."""
+    if tpl.description:
+        st.write(tpl.description)
+    if catalog is not None and tpl.options.get("catalog_search"):
+        render_catalog_search(catalog)
+    values = {}
+    for spec in tpl.fields:
+        widget = st.text_area if spec.kind == "textarea" else st.text_input
+        # JAN・型番は入力を確定した時点でカタログを引き、残りの項目を埋める
+        callback = {}
+        if catalog is not None and spec.lookup in ("jan", "model"):
+            callback = {"on_change": autofill, "args": (tpl, spec, catalog)}
+        values[spec.name] = widget(
+            spec.label, placeholder=spec.placeholder or None, key=f"{tpl.key}-{spec.name}", **callback
         )
-        prompt = dedent(
-            f"""
-            メルカリに商品を出品します。以下の項目について類似の商品から購入しやすいようにそれぞれ
-            シンプルにまとめてもらいたいと思います。出品の商品は{maker_label}{product_name.strip()}です。
-            以下のように表示してください【商品名】【カテゴリー】【型番】【商品説明】【最低価格】
-            あと、同様の商品が売れていたら最低販売済み価格を表示してください。
-            {notes_instruction}
-            {COPY_INSTRUCTION}
-            """
-        ).strip()
-        store_prompt("known_name", prompt)
-
-
-def render_known_code_mode() -> None:
-    st.write("型番やJANコードまで把握しているときの詳細モードです。")
-    manufacturer = st.text_input("メーカー名", key="known-code-maker")
-    product_name = st.text_input("商品名", key="known-code-product")
-    model_code = st.text_input("型番", key="known-code-model")
-    jan_code = st.text_input("JANコード", key="known-code-jan")
-    notes = st.text_area(
-        "特徴・注意事項",
-        placeholder="例: コンディション、付属品、注意すべきポイントなど",
-        key="known-code-notes",
-    )
 
-    if st.button("プロンプトを表示", use_container_width=True, key="btn-known-code"):
-        missing = [label for label, value in [
-            ("商品名", product_name),
-            ("型番", model_code),
-            ("JANコード", jan_code),
-        ] if not value.strip()]
+    if st.button("プロンプトを表示", use_container_width=True, key=f"btn-{tpl.key}"):
+        checked, missing, errors = tpl.check(values)
         if missing:
             st.warning(" / ".join(missing) + " を入力してください。")
             return
+        if errors:
+            st.warning("、".join(errors) + "。")
+            return
+        store_prompt(tpl.key, tpl.fill(checked))
+
 
-        maker_label = f"{manufacturer.strip()}の" if manufacturer.strip() else ""
-        notes_instruction = (
-            f"商品説明の最初に以下の特徴・注意事項を丁寧に記載してください: {notes.strip()}"
-            if notes.strip()
-            else "商品説明の最初に商品の状態や注意点を丁寧に記載してください。"
+# エラー行の表示は先頭からこの件数まで（全件は errors.txt / JSONL に入る）
+MAX_ERROR_ROWS = 200
+
+
+def render_catalog_sidebar() -> Optional[Catalog]:
+    """Catalog size and CSV import in the sidebar; returns the catalog when it has products."""
+    catalog = default_catalog()
+    with st.sidebar.expander("商品カタログ"):
+        try:
+            count = len(catalog)
+        except (OSError, ValueError) as e:
+            st.error(f"商品カタログを開けませんでした: {e}")
+            count = 0
+        st.caption(f"登録 {count}件。JAN・型番からメーカー・商品名を引けます（端末内のファイルだけで完結）。")
+        files = st.file_uploader(
+            "CSV/TSV（列名: メーカー名 / 商品名 / 型番 / JANコード）",
+            type=["csv", "tsv", "txt"],
+            accept_multiple_files=True,
+            key="catalog-files",
         )
-        prompt = dedent(
-            f"""
-            メルカリに商品を出品します。以下の項目について類似の商品から購入しやすいようにそれぞれ
-            シンプルにまとめてもらいたいと思います。出品の商品は{maker_label}{product_name.strip()}で、
-            型番は{model_code.strip()}です。JANコードは{jan_code.strip()}です。
-            以下のように表示してください【商品名】【カテゴリー】【型番】【商品説明】【最低価格】
-            あと、同様の商品が売れていたら最低販売済み価格を表示してください。
-            {notes_instruction}
-            {COPY_INSTRUCTION}
-            """
-        ).strip()
-        store_prompt("known_code", prompt)
-
-
-mode_labels = [label for _, label in MODE_OPTIONS]
-selected_label = st.selectbox("モードを選択", mode_labels)
-current_mode = next(key for key, label in MODE_OPTIONS if label == selected_label)
+        keep = st.checkbox("登録済みの商品を残す", value=True, key="catalog-keep")
+        if files and st.button("取り込む", use_container_width=True, key="btn-catalog-import"):
+            try:
+                with st.spinner("取り込み中..."):
+                    report = import_files([(f, f.name) for f in files], catalog, keep_existing=keep)
+            except (OSError, ValueError, UnicodeDecodeError) as e:
+                st.error(f"取り込めませんでした: {e}")
+            else:
+                count = report.records
+                st.success(f"{report.added}行を取り込みました（登録 {report.records}件）。")
+                if report.skipped:
+                    st.warning(f"{len(report.skipped)}行はスキップしました。")
+                    st.dataframe(
+                        [{"ファイル": f, "行": n, "理由": why} for f, n, why in report.skipped[:MAX_ERROR_ROWS]],
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+    return catalog if count else None
+
+
+def _bulk_key(uploaded: Any, as_zip: bool, catalog: Optional[Catalog]) -> Tuple[str, ...]:
+    # 同じファイル・形式・テンプレート・カタログなら作り直さない
+    try:
+        catalog_stamp = str(os.stat(catalog.path).st_mtime_ns) if catalog is not None else ""
+    except FileNotFoundError:
+        catalog_stamp = ""
+    digests = ",".join(t.digest for t in templates.templates().values())
+    upload = hashlib.sha256(uploaded.getvalue()).hexdigest()
+    return (upload, "zip" if as_zip else "jsonl", digests, catalog_stamp)
+
+
+def bulk_result(uploaded: Any, as_zip: bool, catalog: Optional[Catalog]) -> Optional[Dict[str, Any]]:
+    """Build the ZIP/JSONL into a temp file once per input; later reruns reuse the file."""
+    key = _bulk_key(uploaded, as_zip, catalog)
+    cached = st.session_state.get("bulk-result")
+    if cached is not None and cached["key"] == key and os.path.exists(cached["path"]):
+        return cached
+    # 1件ずつディスクへ書き出すので、件数が多くてもメモリに全件を抱えない
+    with tempfile.NamedTemporaryFile(suffix=".zip" if as_zip else ".jsonl", delete=False) as out:
+        try:
+            uploaded.seek(0)
+            items = build_items(read_rows(uploaded, uploaded.name), catalog)
+            summary = (write_zip if as_zip else write_jsonl)(items, out)
+        except (ValueError, UnicodeDecodeError) as e:
+            out.close()
+            os.unlink(out.name)
+            st.error(f"ファイルを読み込めませんでした: {e}")
+            return None
+    if cached is not None and os.path.exists(cached["path"]):
+        os.unlink(cached["path"])
+    st.session_state["bulk-result"] = {"key": key, "path": out.name, "summary": summary}
+    return st.session_state["bulk-result"]
+
+
+def render_bulk_mode(catalog: Optional[Catalog]) -> None:
+    st.write("CSV/TSV の1行ごとに、入力済みの列からモードを選んでプロンプトをまとめて作ります。")
+    st.caption(
+        "1行目は列名: " + " / ".join(FIELD_LABELS[f] for f in BULK_FIELDS)
+        + "（Excel の CSV（Shift_JIS）もそのまま読めます）"
+    )
+    uploaded = st.file_uploader("CSV/TSV ファイル", type=["csv", "tsv", "txt"], key="bulk-file")
+    fmt = st.radio("出力形式", ["ZIP（1件1ファイル）", "JSONL"], horizontal=True, key="bulk-format")
+    if uploaded is None:
+        return
+
+    as_zip = fmt.startswith("ZIP")
+    result = bulk_result(uploaded, as_zip, catalog)
+    if result is None:
+        return
+    summary = result["summary"]
+
+    if not summary.rows:
+        st.warning("データ行がありません。")
+        return
+    counts = " / ".join(f"{MODE_LABELS[m]} {summary.by_mode.get(m, 0)}件" for m in MODE_LABELS)
+    st.success(f"{summary.rows}行を処理しました（{counts}）")
+    if summary.from_catalog:
+        st.caption(f"{summary.from_catalog}行は空欄を商品カタログで補いました。")
+    if summary.errors:
+        st.error(f"{len(summary.errors)}行はプロンプトを作れませんでした。")
+        st.dataframe(
+            [
+                {"行": e.line, "エラー": e.error, **{FIELD_LABELS[f]: e.values[f] for f in BULK_FIELDS}}
+                for e in summary.errors[:MAX_ERROR_ROWS]
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+        if len(summary.errors) > MAX_ERROR_ROWS:
+            st.caption(f"先頭{MAX_ERROR_ROWS}行のみ表示しています（全件はダウンロードに含まれます）。")
+    if summary.rows > len(summary.errors):
+        stem = uploaded.name.rsplit(".", 1)[0] or "prompts"
+        with open(result["path"], "rb") as f:
+            st.download_button(
+                "ダウンロード",
+                data=f,
+                file_name=f"{stem}_prompts.{'zip' if as_zip else 'jsonl'}",
+                mime="application/zip" if as_zip else "application/x-ndjson",
+                use_container_width=True,
+            )
+
+
+for name, error in templates.errors.items():
+    st.warning(f"テンプレート {name} を読み込めませんでした: {error}")
+
+catalog = render_catalog_sidebar()
+current_mode = st.selectbox("モードを選択", list(MODE_OPTIONS), format_func=MODE_OPTIONS.__getitem__, key="mode")
 
 with st.container():
-    if current_mode == "unknown":
-        render_unknown_mode()
-    elif current_mode == "name_lookup":
-        render_name_lookup_mode()
-    elif current_mode == "known_name":
-        render_known_name_mode()
+    if current_mode == "bulk":
+        render_bulk_mode(catalog)
     else:
-        render_known_code_mode()
+        render_template_mode(templates.get(current_mode), catalog)
 
 current_prompt = st.session_state.prompts.get(current_mode, "")
 
 st.divider()
 if current_prompt:
     st.markdown("#### 生成されたプロンプト")
-    render_copy_button(current_prompt)
+    copy_button(current_prompt, key=f"copy-{current_mode}")
     text_height = min(500, max(220, len(current_prompt) // 2))
     st.text_area(
         "生成されたプロンプト",
@@ -213,5 +258,5 @@ if current_prompt:
         height=text_height,
         label_visibility="collapsed",
     )
-else:
+elif current_mode != "bulk":
     st.info("各モードのボタンを押すとプロンプトが表示されます。")
@@ -1,21 +1,75 @@
-import json
-from typing import Dict
+import asyncio
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import streamlit as st
-from openai import OpenAI
 
+from utils import ai_cache, perf, prompting, rollups, storage
+from utils.mindmap import MindmapContext, prompt_context
+from utils.models import TEXT_FIELDS, DiaryEntry
 
-def _client() -> OpenAI:
-    api_key = st.secrets.get("openai", {}).get("api_key")
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+SYSTEM_MESSAGE = "あなたは思慮深く具体的な日本語のコーチです。"
+DEFAULT_TIMEOUT_SECONDS = 60.0
+# 振り返り1件の回答の上限（レート制限の見積もりにもこの値を使う）
+MAX_COMPLETION_TOKENS = 1000
+
+_clients: Dict[Tuple[str, Optional[str]], "OpenAI"] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _settings() -> Tuple[str, Optional[str]]:
+    config = st.secrets.get("openai", {})
+    api_key = config.get("api_key")
     if not api_key:
         raise ValueError("OpenAI APIキーが設定されていません (.streamlit/secrets.toml を確認してください)。")
-    return OpenAI(api_key=api_key)
+    # base_url を指定すると OpenAI 互換のローカルサーバー（テスト用の偽物など）へ向けられる
+    return api_key, config.get("base_url")
+
+
+def _client() -> "OpenAI":
+    # 接続プールを使い回すため、クライアントはプロセス内で共有する
+    key = _settings()
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # openai SDK は読み込みが重いので、実際に呼ぶときまで import しない
+            from openai import OpenAI
+
+            client = _clients[key] = OpenAI(api_key=key[0], base_url=key[1])
+        return client
+
+
+def _async_client() -> "AsyncOpenAI":
+    # httpx の非同期クライアントはイベントループをまたげないので、ループごとに共有する
+    loop = asyncio.get_running_loop()
+    api_key, base_url = _settings()
+    with _clients_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = _async_clients[loop] = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        return client
+
+
+def _messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt},
+    ]
 
 
-def build_prompt(mindmap: Dict, diary: Dict) -> str:
-    mindmap_text = mindmap.get("content") or "未入力"
-    diary_text = json.dumps(diary, ensure_ascii=False, indent=2)
-    return f"""
+def request_tokens(prompt: str) -> int:
+    """Tokens a reflection request counts against a tokens/min limit: prompt plus completion cap."""
+    return prompting.estimate_tokens(SYSTEM_MESSAGE) + prompting.estimate_tokens(prompt) + MAX_COMPLETION_TOKENS
+
+
+REFLECTION_TEMPLATE = """
 あなたは目標達成まで伴走するアドバイザーです。
 以下のマインドマップと日記データをもとに、
 ・よくできたこと
@@ -26,24 +80,197 @@ def build_prompt(mindmap: Dict, diary: Dict) -> str:
 を簡潔に箇条書きでまとめてください。
 
 # マインドマップ
-{mindmap_text}
+{mindmap}
 
 # 日記データ
-{diary_text}
-""".strip()
+{diaries}
+"""
+
+
+def mindmap_context(
+    mindmap: Dict, diaries: Sequence[Dict[str, Any]], budget_tokens: int
+) -> Optional[MindmapContext]:
+    """The mindmap cut down for a prompt about ``diaries``; None when it is empty.
+
+    Changes are taken against the version in effect before the oldest of ``diaries``,
+    so the prompt marks what was added to the mindmap during the days under review.
+    """
+    content = mindmap.get("content") or ""
+    if not content.strip():
+        return None
+    history = storage.mindmap_history()
+    dates = [d.get("date") or "" for d in diaries]
+    base_rev = history.at_or_before(min(dates)) if dates else None
+    base = history.content(base_rev.number) if base_rev is not None else None
+    related = [" ".join(str(d.get(k) or "") for k in TEXT_FIELDS) for d in diaries]
+    return prompt_context(content, related, base, budget_tokens)
+
+
+@perf.timed()
+def build_prompt(
+    mindmap: Dict,
+    diary: Union[Dict, List[Dict[str, Any]]],
+    budget_tokens: int = prompting.DEFAULT_BUDGET_TOKENS,
+    history: Optional[List[Dict[str, Any]]] = None,
+    summarizer: Optional[rollups.Summarizer] = None,
+) -> str:
+    """Fit ``diary`` (one day or a list) into ``budget_tokens``.
+
+    With ``history``, older days are sent as cached weekly/monthly rollups and only
+    the most recent days (plus ``diary``) as raw rows.
+    """
+    diaries = [diary] if isinstance(diary, (dict, DiaryEntry)) else diary
+    # マインドマップは予算の1/4まで。超える分は日記に関係する枝・変わった枝だけにする
+    context = mindmap_context(mindmap, diaries, budget_tokens // 4)
+    mindmap_text = context.text if context is not None else "未入力"
+    fixed = prompting.estimate_tokens(REFLECTION_TEMPLATE.format(mindmap=mindmap_text, diaries=""))
+    budget = max(0, budget_tokens - fixed)
+    if history is not None:
+        by_date = {d.get("date", ""): d for d in history}
+        by_date.update((d.get("date", ""), d) for d in diaries)
+        diary_text = rollups.build_context(rollups.default_store(), list(by_date.values()), budget, summarizer=summarizer)
+    else:
+        # 1日分でも履歴でも、ヘッダー1行＋1日1行のタブ区切りにして予算内に収める
+        diary_text = "（タブ区切り・1行1日）\n" + prompting.encode_diaries(diaries, budget).text
+    return REFLECTION_TEMPLATE.format(mindmap=mindmap_text, diaries=diary_text).strip()
+
+
+def llm_summarizer(model: str = "gpt-4o-mini") -> rollups.Summarizer:
+    """Summarizer for ``rollups`` that asks the model for a short period summary."""
+
+    def summarize(label: str, entries: List[Dict[str, Any]]) -> str:
+        table = prompting.encode_diaries(entries, budget_tokens=4000, full_days=len(entries)).text
+        prompt = f"{label} の日記を、傾向・できたこと・課題が分かるよう2〜3文で要約してください。\n{table}"
+        perf.count("openai.api")
+        resp = _client().chat.completions.create(model=model, messages=_messages(prompt))
+        return (resp.choices[0].message.content or "").strip()
 
+    return summarize
 
-def generate_reflection(mindmap: Dict, diary: Dict, model: str = "gpt-4o-mini") -> str:
-    prompt = build_prompt(mindmap, diary)
+
+def _reflection_prompt(
+    mindmap: Dict,
+    diary: Union[Dict, List[Dict[str, Any]]],
+    model: str,
+    history: Optional[List[Dict[str, Any]]],
+    llm_rollups: bool,
+) -> str:
+    try:
+        summarizer = llm_summarizer(model) if llm_rollups else None
+        return build_prompt(mindmap, diary, history=history, summarizer=summarizer)
+    except Exception as exc:
+        raise RuntimeError(f"AI振り返りの生成に失敗しました: {exc}") from exc
+
+
+@perf.timed()
+def generate_reflection(
+    mindmap: Dict,
+    diary: Union[Dict, List[Dict[str, Any]]],
+    model: str = "gpt-4o-mini",
+    history: Optional[List[Dict[str, Any]]] = None,
+    llm_rollups: bool = False,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    regenerate: bool = False,
+    reserve: Optional[Callable[[int], None]] = None,
+) -> str:
+    """Reflection text; identical (model, system, prompt) requests are served from the disk cache
+    unless ``regenerate`` is set. ``reserve(tokens)`` (e.g. a rate limiter's ``acquire``) is
+    called with ``request_tokens(prompt)`` just before the API request, not on a cache hit."""
+    prompt = _reflection_prompt(mindmap, diary, model, history, llm_rollups)
+    cache = ai_cache.default_cache()
+    key = ai_cache.cache_key(model, SYSTEM_MESSAGE, prompt)
+    cached = None if regenerate else cache.get(key)
+    if cached is not None:
+        return cached
+    if reserve is not None:
+        reserve(request_tokens(prompt))
     client = _client()
+    perf.count("openai.api")
     try:
         resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "あなたは思慮深く具体的な日本語のコーチです。"},
-                {"role": "user", "content": prompt},
-            ],
+            model=model, messages=_messages(prompt), max_tokens=MAX_COMPLETION_TOKENS, timeout=timeout
+        )
+        text = resp.choices[0].message.content or ""
+    except Exception as exc:
+        raise RuntimeError(f"AI振り返りの生成に失敗しました: {exc}") from exc
+    cache.put(key, text)
+    return text
+
+
+@perf.timed()
+def stream_reflection(
+    mindmap: Dict,
+    diary: Dict,
+    model: str = "gpt-4o-mini",
+    history: Optional[List[Dict[str, Any]]] = None,
+    llm_rollups: bool = False,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    cancel: Optional[threading.Event] = None,
+    regenerate: bool = False,
+) -> Iterator[str]:
+    """Yield the reflection text as it arrives (for ``st.write_stream``).
+
+    Setting ``cancel`` stops the stream and closes the HTTP response; ``timeout``
+    applies to the connection and to each read between chunks. A cached answer is
+    yielded at once, and only a completed stream is written to the cache.
+    """
+    prompt = _reflection_prompt(mindmap, diary, model, history, llm_rollups)
+    cache = ai_cache.default_cache()
+    key = ai_cache.cache_key(model, SYSTEM_MESSAGE, prompt)
+    cached = None if regenerate else cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    client = _client()
+    perf.count("openai.api")
+    try:
+        stream = client.chat.completions.create(
+            model=model, messages=_messages(prompt), max_tokens=MAX_COMPLETION_TOKENS, timeout=timeout, stream=True
+        )
+    except Exception as exc:
+        raise RuntimeError(f"AI振り返りの生成に失敗しました: {exc}") from exc
+    parts: List[str] = []
+    try:
+        for chunk in stream:
+            if cancel is not None and cancel.is_set():
+                return
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield parts[-1]
+    except Exception as exc:
+        raise RuntimeError(f"AI振り返りの生成に失敗しました: {exc}") from exc
+    finally:
+        stream.close()
+    cache.put(key, "".join(parts))
+
+
+@perf.timed()
+async def agenerate_reflection(
+    mindmap: Dict,
+    diary: Dict,
+    model: str = "gpt-4o-mini",
+    history: Optional[List[Dict[str, Any]]] = None,
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    regenerate: bool = False,
+) -> str:
+    """Async ``generate_reflection`` on the shared ``AsyncOpenAI`` client; cancel by cancelling the task."""
+    prompt = _reflection_prompt(mindmap, diary, model, history, False)
+    cache = ai_cache.default_cache()
+    key = ai_cache.cache_key(model, SYSTEM_MESSAGE, prompt)
+    cached = None if regenerate else cache.get(key)
+    if cached is not None:
+        return cached
+    client = _async_client()
+    perf.count("openai.api")
+    try:
+        resp = await asyncio.wait_for(
+            client.chat.completions.create(model=model, messages=_messages(prompt), max_tokens=MAX_COMPLETION_TOKENS),
+            timeout=timeout,
         )
-        return resp.choices[0].message.content or ""
+        text = resp.choices[0].message.content or ""
+    except asyncio.CancelledError:
+        raise
     except Exception as exc:
         raise RuntimeError(f"AI振り返りの生成に失敗しました: {exc}") from exc
+    cache.put(key, text)
+    return text
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils import perf, storage
+from utils.fileio import write_json_atomic
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+
+
+def cache_key(model: str, system: str, prompt: str) -> str:
+    payload = json.dumps([model, system, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReflectionCache:
+    """Disk cache of AI responses keyed by (model, system message, prompt).
+
+    One JSON file per key; a file's mtime is its last access, which drives the
+    LRU eviction once more than ``max_entries`` files exist. Files are counted once and
+    the count is kept on put, so the directory is only listed when eviction is due; it
+    then trims to 90% of the limit so the next listing is a while off.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> None:
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._count: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            if time.time() - float(data["created_at"]) > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    if self._count:
+                        self._count -= 1
+                raise KeyError(key)
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            with self._lock:
+                self.misses += 1
+            perf.cache("ai_cache", False)
+            return None
+        with self._lock:
+            self.hits += 1
+        perf.cache("ai_cache", True)
+        return data["text"]
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        is_new = not path.exists()
+        write_json_atomic(path, {"created_at": time.time(), "text": text})
+        with self._lock:
+            if self._count is None:
+                self._count = sum(1 for _ in self.directory.glob("*.json"))
+            elif is_new:
+                self._count += 1
+            over = self._count > self.max_entries
+        if over:
+            self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            dated = []
+            for path in self.directory.glob("*.json"):
+                try:
+                    dated.append((path.stat().st_mtime, path))
+                except FileNotFoundError:
+                    continue  # 別のプロセスが先に消した
+            keep = self.max_entries - self.max_entries // 10
+            dated.sort(key=lambda item: item[0])
+            for _, path in dated[: max(len(dated) - keep, 0)]:
+                path.unlink(missing_ok=True)
+            self._count = min(len(dated), keep)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_default_cache: Optional[ReflectionCache] = None
+
+
+def default_cache() -> ReflectionCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ReflectionCache(storage.DATA_DIR / "ai_cache")
+    return _default_cache
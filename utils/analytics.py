@@ -0,0 +1,304 @@
+import threading
+import warnings
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils import storage
+from utils.models import DiaryTable
+
+WINDOWS = (7, 30)
+WEEKDAYS = ["月", "火", "水", "木", "金", "土", "日"]
+
+
+def _hours(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _stamp(entry: Dict[str, Any]) -> int:
+    return hash((str(entry.get("date", "")), str(entry.get("updated_at", ""))))
+
+
+Diaries = Union[DiaryTable, Sequence[Dict[str, Any]]]
+
+
+def _pairs(diaries: Diaries) -> Any:
+    if isinstance(diaries, DiaryTable):
+        return zip(diaries.dates, diaries.column("updated_at"))
+    return ((str(d.get("date", "")), str(d.get("updated_at", ""))) for d in diaries)
+
+
+def signature(diaries: Diaries) -> Tuple[int, int]:
+    """Cheap identity of a diary list: entry count and XOR of (date, updated_at) hashes.
+
+    XOR lets ``DiaryAnalytics.update`` swap one day's stamp without rescanning.
+    """
+    acc = 0
+    for pair in _pairs(diaries):
+        acc ^= hash(pair)
+    return len(diaries), acc
+
+
+def _columns(diaries: Diaries) -> Tuple[np.ndarray, np.ndarray]:
+    """(days as datetime64[D], hours) with one value per date."""
+    if isinstance(diaries, DiaryTable):
+        # 列をそのまま配列にする（日付は重複なし・変換済み）
+        return np.array(diaries.dates, dtype="datetime64[D]"), np.array(diaries.column("youtube"), dtype=float)
+    by_day: Dict[date, float] = {}
+    for d in diaries:
+        day = _parse(d.get("date", ""))
+        if day is not None:
+            by_day[day] = _hours(d.get("youtube"))
+    return np.array(list(by_day), dtype="datetime64[D]"), np.fromiter(by_day.values(), dtype=float, count=len(by_day))
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start indexes and lengths of the True runs in ``mask``."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    return starts, np.flatnonzero(edges == -1) - starts
+
+
+class DiaryAnalytics:
+    """YouTube hours on a day axis (Monday-aligned, whole weeks) as NumPy arrays.
+
+    Rolling means, weekly totals and weekday stats are computed in vectorized passes
+    and patched locally by ``update`` when one day changes; streaks are recomputed
+    lazily from the presence mask.
+    """
+
+    def __init__(self, diaries: Diaries, today: Optional[date] = None) -> None:
+        self.today = today or date.today()
+        days, hours = _columns(diaries)
+        self.first = days.min().astype(date) if len(days) else self.today
+        self.start = self.first - timedelta(days=self.first.weekday())
+        self.end = max(days.max().astype(date), self.today) if len(days) else self.today
+        n = self._length(self.end)
+        self.hours = np.full(n, np.nan)
+        self.present = np.zeros(n, dtype=bool)
+        if len(days):
+            idx = (days - np.datetime64(self.start, "D")).astype(np.int64)
+            self.hours[idx] = hours
+            self.present[idx] = True
+        self._stamps = {pair[0]: hash(pair) for pair in _pairs(diaries)}
+        self.count, self.stamp = signature(diaries)
+        self._lock = threading.RLock()
+        self._compute_all()
+
+    def _length(self, end: date) -> int:
+        return ((end - self.start).days // 7 + 1) * 7
+
+    def _index(self, day: date) -> int:
+        return (day - self.start).days
+
+    # --- 集計（全体） ---
+
+    def _compute_all(self) -> None:
+        n = len(self.hours)
+        self.rolling = {w: self._rolling_range(w, 0, n) for w in WINDOWS}
+        matrix = self.hours.reshape(-1, 7)
+        days = self.present.reshape(-1, 7).sum(axis=1)
+        self.week_days = days
+        self.week_totals = np.where(days > 0, np.nansum(matrix, axis=1), np.nan)
+        self.weekday = self._weekday_columns(matrix, self.present.reshape(-1, 7))
+        self._streaks: Optional[Dict[str, Any]] = None
+
+    def _rolling_range(self, window: int, lo: int, hi: int) -> np.ndarray:
+        """Mean of the written days in the trailing ``window`` for each index in ``lo..hi``."""
+        base = max(0, lo - window + 1)
+        values = np.nan_to_num(self.hours[base:hi])
+        csum = np.concatenate(([0.0], np.cumsum(values)))
+        ccount = np.concatenate(([0], np.cumsum(self.present[base:hi])))
+        ends = np.arange(lo, hi) - base + 1
+        starts = np.maximum(ends - window, 0)
+        counts = ccount[ends] - ccount[starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, (csum[ends] - csum[starts]) / counts, np.nan)
+
+    @staticmethod
+    def _weekday_columns(matrix: np.ndarray, present: np.ndarray) -> Dict[str, np.ndarray]:
+        with warnings.catch_warnings():
+            # 一度も書いていない曜日は全て NaN になるので警告を抑える
+            warnings.simplefilter("ignore", RuntimeWarning)
+            q25, q50, q75 = np.nanpercentile(matrix, [25, 50, 75], axis=0)
+            return {
+                "mean": np.nanmean(matrix, axis=0),
+                "p25": q25,
+                "median": q50,
+                "p75": q75,
+                "days": present.sum(axis=0),
+            }
+
+    # --- 1日分の差分更新 ---
+
+    def update(self, entry: Dict[str, Any]) -> None:
+        day = _parse(entry.get("date", ""))
+        if day is None:
+            return
+        with self._lock:
+            if day < self.start or day > self.end:
+                self._grow(day)
+            i = self._index(day)
+            old = self._stamps.get(str(entry["date"]))
+            if old is None:
+                self.count += 1
+            else:
+                self.stamp ^= old
+            self._stamps[str(entry["date"])] = _stamp(entry)
+            self.stamp ^= self._stamps[str(entry["date"])]
+            self.hours[i] = _hours(entry.get("youtube"))
+            self.present[i] = True
+            if day < self.first:
+                self.first = day
+            n = len(self.hours)
+            for w in WINDOWS:
+                hi = min(n, i + w)
+                self.rolling[w][i:hi] = self._rolling_range(w, i, hi)
+            week, col = divmod(i, 7)
+            row = self.hours[week * 7 : week * 7 + 7]
+            self.week_days[week] = int(self.present[week * 7 : week * 7 + 7].sum())
+            self.week_totals[week] = np.nansum(row)
+            column = self._weekday_columns(
+                self.hours.reshape(-1, 7)[:, col : col + 1], self.present.reshape(-1, 7)[:, col : col + 1]
+            )
+            for key, values in column.items():
+                self.weekday[key][col] = values[0]
+            self._streaks = None
+
+    def _grow(self, day: date) -> None:
+        # 範囲外の日付（翌日以降・最初の日より前）は配列を週単位で広げて全体を計算し直す
+        start = min(self.start, day - timedelta(days=day.weekday()))
+        end = max(self.end, day)
+        offset = (self.start - start).days
+        old_hours, old_present = self.hours, self.present
+        self.start, self.end = start, end
+        n = self._length(end)
+        self.hours = np.full(n, np.nan)
+        self.present = np.zeros(n, dtype=bool)
+        self.hours[offset : offset + len(old_hours)] = old_hours
+        self.present[offset : offset + len(old_present)] = old_present
+        self._compute_all()
+
+    def advance(self, today: date) -> None:
+        """Extend the axis to ``today`` so streaks and gaps count the days since the last entry."""
+        with self._lock:
+            if today > self.end:
+                self.today = today
+                self._grow(today)
+
+    # --- 参照用 ---
+
+    def _dates(self, lo: int, hi: int) -> np.ndarray:
+        return np.datetime64(self.start.isoformat()) + np.arange(lo, hi)
+
+    def daily(self, days: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Per-day hours and rolling means for the last ``days`` days up to ``end`` (all when None)."""
+        hi = self._index(self.end) + 1
+        lo = self._index(self.first) if days is None else max(self._index(self.first), hi - days)
+        data = {"日付": self._dates(lo, hi), "YouTube": self.hours[lo:hi]}
+        for w in WINDOWS:
+            data[f"{w}日平均"] = self.rolling[w][lo:hi]
+        return data
+
+    def weekly(self, weeks: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Weekly totals, written days and the change from the previous week."""
+        last = self._index(self.end) // 7 + 1
+        first = self._index(self.first) // 7
+        lo = first if weeks is None else max(first, last - weeks)
+        totals = self.week_totals[first:last]
+        delta = np.diff(totals, prepend=np.nan)
+        return {
+            "週": np.datetime64(self.start.isoformat()) + np.arange(lo, last) * 7,
+            "合計": self.week_totals[lo:last],
+            "記入日数": self.week_days[lo:last],
+            "前週比": delta[lo - first :],
+        }
+
+    def weekday_stats(self) -> Dict[str, Any]:
+        # その曜日が期間内に何回あったか（記入率の分母）
+        span = self._index(self.end) - self._index(self.first) + 1
+        weekdays = (self.first.weekday() + np.arange(span)) % 7
+        totals = np.bincount(weekdays, minlength=7)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = np.where(totals > 0, self.weekday["days"] / totals, np.nan)
+        return {"曜日": WEEKDAYS, **{k: v.copy() for k, v in self.weekday.items()}, "記入率": rate}
+
+    def streaks(self, top_gaps: int = 5) -> Dict[str, Any]:
+        """Current/longest writing streak and the longest gaps between ``first`` and ``end``."""
+        with self._lock:
+            if self._streaks is None:
+                lo, hi = self._index(self.first), self._index(self.end) + 1
+                mask = self.present[lo:hi]
+                starts, lengths = _runs(mask)
+                current = 0
+                if len(starts):
+                    last_end = starts[-1] + lengths[-1]
+                    # 今日がまだ未記入でも、昨日まで続いていれば継続中とみなす
+                    if last_end >= len(mask) - 1:
+                        current = int(lengths[-1])
+                gap_starts, gap_lengths = _runs(~mask)
+                order = np.argsort(-gap_lengths, kind="stable")[:top_gaps]
+                self._streaks = {
+                    "current": current,
+                    "longest": int(lengths.max()) if len(lengths) else 0,
+                    "written_days": int(mask.sum()),
+                    "missing_days": int((~mask).sum()),
+                    "gaps": [
+                        ((self.first + timedelta(days=int(gap_starts[k]))).isoformat(), int(gap_lengths[k]))
+                        for k in order
+                    ],
+                }
+            return self._streaks
+
+    def latest(self) -> Dict[str, float]:
+        i = self._index(self.end)
+        week = i // 7
+        return {
+            **{f"{w}日平均": float(self.rolling[w][i]) for w in WINDOWS},
+            "今週": float(np.nan_to_num(self.week_totals[week])),
+            "先週": float(np.nan_to_num(self.week_totals[week - 1])) if week > 0 else 0.0,
+        }
+
+
+_LOCK = threading.Lock()
+_current: Optional[DiaryAnalytics] = None
+_subscribed = False
+
+
+def _on_change(entry: Optional[Dict[str, Any]]) -> None:
+    global _current
+    with _LOCK:
+        if _current is None:
+            return
+        if entry is None:
+            _current = None
+        else:
+            _current.update(entry)
+
+
+def current(diaries: Diaries) -> DiaryAnalytics:
+    """Process-wide analytics for ``diaries``, kept up to date through ``storage.subscribe``.
+
+    Rebuilt only when ``diaries`` no longer matches (e.g. edits made on another device).
+    """
+    global _current, _subscribed
+    with _LOCK:
+        if not _subscribed:
+            storage.subscribe(_on_change)
+            _subscribed = True
+        if _current is None or (_current.count, _current.stamp) != signature(diaries):
+            _current = DiaryAnalytics(diaries)
+        else:
+            _current.advance(date.today())
+        return _current
@@ -0,0 +1,193 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils import storage
+from utils.fileio import write_json_atomic
+
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# (key, label, 対象の日記, その時点までの履歴)
+Job = Tuple[str, str, List[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+class RateLimiter:
+    """Token buckets for requests/min and tokens/min shared by all worker threads."""
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int) -> None:
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) * 60.0 / self.rpm, (tokens - self._tokens) * 60.0 / self.tpm)
+            time.sleep(max(wait, 0.01))
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # ai.* は RuntimeError で包んで投げるので、元の例外までたどる
+    while exc is not None:
+        code = getattr(exc, "status_code", None)
+        if isinstance(code, int):
+            return code
+        if type(exc).__name__ in ("APIConnectionError", "APITimeoutError"):
+            return 503
+        exc = exc.__cause__  # type: ignore[assignment]
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = _status_code(exc)
+    return code is not None and (code == 429 or code >= 500)
+
+
+def backoff_delay(attempt: int) -> float:
+    # full jitter: 0〜上限の一様乱数
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+
+
+class ReflectionStore:
+    """Generated reflections keyed by day (2025-11-20) or ISO week (2025-W47), saved after every result."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is None:
+            data: Dict[str, Dict[str, Any]] = {}
+            if self.path.exists():
+                with self.path.open("r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    data = loaded
+            self._data = data
+        return self._data
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, key: str, label: str, text: str, model: str) -> None:
+        with self._lock:
+            self._load()[key] = {"label": label, "text": text, "model": model, "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M")}
+            write_json_atomic(self.path, self._load())
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return sorted(self._load().items())
+
+
+_default_store: Optional[ReflectionStore] = None
+
+
+def default_store() -> ReflectionStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = ReflectionStore(storage.DATA_DIR / "reflections.json")
+    return _default_store
+
+
+def plan_jobs(diaries: Sequence[Dict[str, Any]], start: date, end: date, unit: str = "day") -> List[Job]:
+    """One job per day (or ISO week) in ``start..end`` that has entries, with history up to that point."""
+    ordered = sorted(diaries, key=lambda x: x.get("date", ""))
+    in_range = [d for d in ordered if start.isoformat() <= d.get("date", "") <= end.isoformat()]
+    groups: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+    for entry in in_range:
+        day = date.fromisoformat(entry["date"])
+        if unit == "week":
+            year, week, _ = day.isocalendar()
+            monday = day - timedelta(days=day.weekday())
+            key, label = f"{year}-W{week:02d}", f"{monday.isoformat()} の週"
+        else:
+            key, label = entry["date"], entry["date"]
+        groups.setdefault(key, (label, []))[1].append(entry)
+    jobs: List[Job] = []
+    for key, (label, entries) in groups.items():
+        last = entries[-1]["date"]
+        history = [d for d in ordered if d.get("date", "") <= last]
+        jobs.append((key, label, entries, history))
+    return jobs
+
+
+def run_batch(
+    jobs: Sequence[Job],
+    generate: Callable[[List[Dict[str, Any]], List[Dict[str, Any]], Callable[[int], None]], str],
+    store: ReflectionStore,
+    model: str,
+    max_workers: int = 4,
+    rpm: int = 60,
+    tpm: int = 150_000,
+    regenerate: bool = False,
+    on_progress: Optional[Callable[[int, int, str], None]] = None,
+) -> Dict[str, Any]:
+    """Run ``generate(entries, history, acquire)`` for every job on a bounded thread pool.
+
+    Results are saved as they finish, so an interrupted run resumes by skipping keys
+    already in ``store``. 429/5xx errors are retried with jittered exponential backoff.
+    ``generate`` calls ``acquire(tokens)`` just before each API request with that request's
+    prompt plus completion cap (``ai.request_tokens``); cached answers are not charged.
+    ``on_progress(done, total, key)`` is called from the calling thread.
+    """
+    limiter = RateLimiter(rpm, tpm)
+    todo = [job for job in jobs if regenerate or store.get(job[0]) is None]
+    skipped = len(jobs) - len(todo)
+    errors: Dict[str, str] = {}
+
+    def work(job: Job) -> None:
+        key, label, entries, history = job
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                text = generate(entries, history, limiter.acquire)
+                break
+            except Exception as exc:
+                if attempt >= MAX_RETRIES or not is_retryable(exc):
+                    raise
+                time.sleep(backoff_delay(attempt))
+        store.put(key, label, text, model)
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reflection-batch") as pool:
+        futures = {pool.submit(work, job): job[0] for job in todo}
+        try:
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    errors[key] = str(exc)
+                done += 1
+                if on_progress is not None:
+                    on_progress(done, len(todo), key)
+        except BaseException:
+            # 画面の再実行などで中断されたら、未着手の分は走らせない（次回はそこから再開）
+            for future in futures:
+                future.cancel()
+            raise
+    return {"generated": len(todo) - len(errors), "skipped": skipped, "errors": errors}
@@ -0,0 +1,345 @@
+import bisect
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.mercari import jan_error, normalize_jan, read_rows
+
+CATALOG_FILE = Path(__file__).resolve().parent.parent / "data" / "mercari_catalog.bin"
+
+# ファイル形式（little-endian。特記以外は uint32）
+#   header:  magic, 件数, 各セクションの開始位置（jan / records / model）
+#   jan:     件数 m (uint64), JAN を整数にしたもの m 個 (uint64, 昇順), record 番号 m 個
+#   records: 件数 n, 開始位置 n+1 個, UTF-8 本体（maker \x1f product \x1f model \x1f jan）
+#   model:   件数 m, record 番号 m 個, キー開始位置 m+1 個, キー本体（昇順に連結）
+# jan は header の直後（8 バイト境界）に置き、memoryview のまま bisect できるようにする
+MAGIC = b"MCAT\x00\x00\x00\x02"
+_HEADER = struct.Struct("<8sIIII")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_PAIR = struct.Struct("<II")
+_SEP = "\x1f"
+
+_MODEL_NOISE = re.compile(r"[\s\-_/.・‐－]")
+
+
+def normalize_model(value: str) -> str:
+    """Model codes compared loosely: full-width folded, upper case, no spaces/hyphens/dots."""
+    return _MODEL_NOISE.sub("", unicodedata.normalize("NFKC", value).upper())
+
+
+@dataclass
+class CatalogItem:
+    maker: str
+    product: str
+    model: str
+    jan: str
+
+    def values(self) -> Dict[str, str]:
+        """Fields under the names the listing templates use."""
+        return {"maker": self.maker, "product": self.product, "model": self.model, "jan": self.jan}
+
+
+@dataclass
+class ImportReport:
+    records: int = 0
+    added: int = 0
+    skipped: List[Tuple[str, int, str]] = field(default_factory=list)
+
+
+class _Index:
+    """One sorted key section read straight from the map; lookups are binary searches."""
+
+    def __init__(self, mm: mmap.mmap, offset: int) -> None:
+        self.mm = mm
+        (self.count,) = _U32.unpack_from(mm, offset)
+        self.ids = offset + 4
+        self.starts = self.ids + 4 * self.count
+        self.blob = self.starts + 4 * (self.count + 1)
+
+    def key(self, i: int) -> bytes:
+        start, end = _PAIR.unpack_from(self.mm, self.starts + 4 * i)
+        return self.mm[self.blob + start : self.blob + end]
+
+    def record(self, i: int) -> int:
+        return _U32.unpack_from(self.mm, self.ids + 4 * i)[0]
+
+    def bisect(self, target: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def exact(self, target: bytes) -> Iterator[int]:
+        i = self.bisect(target)
+        while i < self.count and self.key(i) == target:
+            yield self.record(i)
+            i += 1
+
+    def prefix(self, target: bytes) -> Iterator[Tuple[bytes, int]]:
+        i = self.bisect(target)
+        while i < self.count:
+            key = self.key(i)
+            if not key.startswith(target):
+                return
+            yield key, self.record(i)
+            i += 1
+
+
+class _JanIndex:
+    """JANs as sorted uint64 viewed in place, so ``bisect`` runs in C over the map."""
+
+    def __init__(self, mm: mmap.mmap, offset: int) -> None:
+        (count,) = _U64.unpack_from(mm, offset)
+        keys = offset + 8
+        ids = keys + 8 * count
+        self.keys = memoryview(mm)[keys:ids].cast("Q")
+        self.ids = memoryview(mm)[ids : ids + 4 * count].cast("I")
+
+    def exact(self, jan: int) -> Optional[int]:
+        i = bisect.bisect_left(self.keys, jan)
+        return self.ids[i] if i < len(self.keys) and self.keys[i] == jan else None
+
+    def prefix(self, digits: str) -> Iterator[int]:
+        # 13 桁として前方一致する範囲、次に 8 桁（JAN短縮）として一致する範囲
+        for width in (13, 8):
+            if len(digits) > width:
+                continue
+            scale = 10 ** (width - len(digits))
+            lo, hi = int(digits) * scale, (int(digits) + 1) * scale
+            for i in range(bisect.bisect_left(self.keys, lo), bisect.bisect_left(self.keys, hi)):
+                yield self.ids[i]
+
+    def release(self) -> None:
+        self.keys.release()
+        self.ids.release()
+
+
+class _View:
+    def __init__(self, f: IO[bytes], stat: os.stat_result) -> None:
+        self.file = f
+        self.stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, jans, records, models = _HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("商品カタログの形式が正しくありません")
+        self.records = records
+        self.blob = records + 4 + 4 * (self.count + 1)
+        self.jan = _JanIndex(self.mm, jans)
+        self.model = _Index(self.mm, models)
+
+    def item(self, i: int) -> CatalogItem:
+        start, end = _PAIR.unpack_from(self.mm, self.records + 4 + 4 * i)
+        maker, product, model, jan = self.mm[self.blob + start : self.blob + end].decode("utf-8").split(_SEP)
+        return CatalogItem(maker, product, model, jan)
+
+    def close(self) -> None:
+        self.jan.release()
+        self.mm.close()
+        self.file.close()
+
+
+class Catalog:
+    """Read-only product catalog on a memory-mapped file (see ``build`` for the format).
+
+    Only the pages touched by a lookup are read, so a catalog with millions of rows costs
+    no RAM up front. The file is re-mapped when an import replaces it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._view: Optional[_View] = None
+
+    def _current(self) -> Optional[_View]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        with self._lock:
+            view = self._view
+            if view is not None and (st is None or view.stat != (st.st_ino, st.st_mtime_ns, st.st_size)):
+                # 取り込みで置き換わった。古い map は他のスレッドが読み終えたら GC で閉じる
+                # （os.replace なので、それまでは古い内容のまま読める）
+                view = self._view = None
+            if view is None and st is not None and st.st_size:
+                f = open(self.path, "rb")
+                try:
+                    view = self._view = _View(f, os.fstat(f.fileno()))
+                except (ValueError, struct.error):
+                    f.close()
+                    raise
+            return view
+
+    def __len__(self) -> int:
+        view = self._current()
+        return view.count if view is not None else 0
+
+    def lookup_jan(self, jan: str) -> Optional[CatalogItem]:
+        """The product for a JAN (any spacing/full-width digits); None when unknown or invalid."""
+        jan = normalize_jan(jan)
+        view = self._current()
+        if view is None or jan_error(jan):
+            return None
+        i = view.jan.exact(int(jan))
+        return view.item(i) if i is not None else None
+
+    def lookup_model(self, model: str) -> List[CatalogItem]:
+        """Every product with this model code (compared via ``normalize_model``)."""
+        key = normalize_model(model)
+        view = self._current()
+        if view is None or not key:
+            return []
+        return [view.item(i) for i in view.model.exact(key.encode("utf-8"))]
+
+    def search(self, prefix: str, limit: int = 10) -> List[CatalogItem]:
+        """Products whose JAN or model code starts with ``prefix``, JAN matches first."""
+        view = self._current()
+        if view is None:
+            return []
+        found: Dict[int, None] = {}
+        jan = normalize_jan(prefix)
+        if jan.isascii() and jan.isdigit():
+            for i in view.jan.prefix(jan):
+                if len(found) >= limit:
+                    break
+                found[i] = None
+        key = normalize_model(prefix)
+        if key:
+            for _, i in view.model.prefix(key.encode("utf-8")):
+                if len(found) >= limit:
+                    break
+                found.setdefault(i)
+        return [view.item(i) for i in found]
+
+    def items(self) -> Iterator[CatalogItem]:
+        view = self._current()
+        for i in range(view.count if view is not None else 0):
+            yield view.item(i)  # type: ignore[union-attr]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._view is not None:
+                self._view.close()
+                self._view = None
+
+
+def _index_section(keys: List[Tuple[bytes, int]]) -> bytes:
+    keys.sort()
+    starts = [0]
+    for key, _ in keys:
+        starts.append(starts[-1] + len(key))
+    return b"".join(
+        [
+            _U32.pack(len(keys)),
+            struct.pack(f"<{len(keys)}I", *(i for _, i in keys)),
+            struct.pack(f"<{len(starts)}I", *starts),
+            *(key for key, _ in keys),
+        ]
+    )
+
+
+def build(items: Iterable[CatalogItem], path: Path) -> int:
+    """Write ``items`` as a catalog file (atomically) and return the record count.
+
+    Items are deduplicated by JAN, or by maker + model code when there is no JAN; later
+    items win. Sorting needs every record in memory once, which is fine for an import.
+    """
+    unique: Dict[Tuple[str, str], CatalogItem] = {}
+    for item in items:
+        key = ("jan", item.jan) if item.jan else ("model", item.maker + _SEP + normalize_model(item.model))
+        unique[key] = item
+    records = list(unique.values())
+    bodies = [_SEP.join((r.maker, r.product, r.model, r.jan)).encode("utf-8") for r in records]
+    starts = [0]
+    for body in bodies:
+        starts.append(starts[-1] + len(body))
+    record_section = b"".join([_U32.pack(len(records)), struct.pack(f"<{len(starts)}I", *starts), *bodies])
+    jans = sorted((int(r.jan), i) for i, r in enumerate(records) if r.jan)
+    jan_section = b"".join(
+        [
+            _U64.pack(len(jans)),
+            struct.pack(f"<{len(jans)}Q", *(k for k, _ in jans)),
+            struct.pack(f"<{len(jans)}I", *(i for _, i in jans)),
+        ]
+    )
+    model_keys = ((normalize_model(r.model), i) for i, r in enumerate(records))
+    model_section = _index_section([(k.encode("utf-8"), i) for k, i in model_keys if k])
+
+    offset = _HEADER.size  # 24: jan のキー列が 8 バイト境界から始まる
+    header = _HEADER.pack(
+        MAGIC,
+        len(records),
+        offset,
+        offset + len(jan_section),
+        offset + len(jan_section) + len(record_section),
+    )
+    tmp = path.with_name(path.name + ".tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tmp.open("wb") as f:
+        f.write(header)
+        f.write(jan_section)
+        f.write(record_section)
+        f.write(model_section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(records)
+
+
+def read_items(stream: IO[bytes], filename: str, report: ImportReport) -> Iterator[CatalogItem]:
+    """Catalog rows from a CSV/TSV dump (same headers as bulk mode); bad rows go to ``report``."""
+    for line, values in read_rows(stream, filename):
+        if not any(values.values()):
+            continue
+        jan = normalize_jan(values["jan"]) if values["jan"] else ""
+        error = jan_error(jan) if jan else ""
+        if not error and not values["product"]:
+            error = "商品名がありません"
+        if not error and not (jan or values["model"]):
+            error = "JANコードか型番のどちらかが必要です"
+        if error:
+            report.skipped.append((filename, line, error))
+            continue
+        report.added += 1
+        yield CatalogItem(values["maker"], values["product"], values["model"], jan)
+
+
+def import_files(
+    files: Iterable[Tuple[IO[bytes], str]], catalog: "Catalog", keep_existing: bool = True
+) -> ImportReport:
+    """Rebuild ``catalog``'s file from CSV/TSV dumps (optionally on top of what it already has).
+
+    Raises ``ValueError`` when a file's header has no known column.
+    """
+    report = ImportReport()
+
+    def rows() -> Iterator[CatalogItem]:
+        if keep_existing:
+            yield from catalog.items()
+        for stream, filename in files:
+            yield from read_items(stream, filename, report)
+
+    report.records = build(rows(), catalog.path)
+    return report
+
+
+_default: Optional[Catalog] = None
+
+
+def default_catalog() -> Catalog:
+    """The catalog kept next to the diary data (data/mercari_catalog.bin)."""
+    global _default
+    if _default is None:
+        _default = Catalog(CATALOG_FILE)
+    return _default
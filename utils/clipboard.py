@@ -0,0 +1,26 @@
+import hashlib
+from pathlib import Path
+from typing import Any, Dict
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+# 静的ファイル1つの部品。HTML/JS はブラウザにキャッシュされ、再実行ごとに送るのは引数だけ
+_copy_button = components.declare_component(
+    "copy_button", path=str(Path(__file__).resolve().parent / "static" / "copy_button")
+)
+
+
+def copy_button(text: str, key: str, label: str = "コピー") -> None:
+    """Clipboard button (works on mobile) that resends ``text`` only when the browser lacks it.
+
+    The browser keeps the text under its digest and reports the digest back as the
+    component value; once that matches, later reruns send the digest alone. A new text
+    costs one extra rerun for that acknowledgement.
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    args: Dict[str, Any] = {"digest": digest, "label": label}
+    if st.session_state.get(key) != digest:
+        # bytes は JSON（日本語は \uXXXX で約3倍）にせずそのまま送られる
+        args["text"] = text.encode("utf-8")
+    _copy_button(key=key, default=None, **args)
@@ -0,0 +1,208 @@
+import threading
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+DayLike = Union[date, str]
+
+
+def _day(value: DayLike) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def _year_length(year: int) -> int:
+    return 366 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 365
+
+
+_MONTH_STARTS = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365)
+
+
+def _locate(value: DayLike) -> Tuple[int, int]:
+    """(year, 0-based day of year); ISO strings are parsed by hand since this runs per entry."""
+    if isinstance(value, date):
+        return value.year, value.timetuple().tm_yday - 1
+    text = str(value)
+    if len(text) != 10 or text[4] != "-" or text[7] != "-":
+        raise ValueError(f"invalid date: {text!r}")
+    year, month, day = int(text[:4]), int(text[5:7]), int(text[8:10])
+    leap = int(_year_length(year) == 366)
+    if not 1 <= month <= 12:
+        raise ValueError(f"invalid date: {text!r}")
+    length = _MONTH_STARTS[month] - _MONTH_STARTS[month - 1] + (leap if month == 2 else 0)
+    if not 1 <= day <= length:
+        raise ValueError(f"invalid date: {text!r}")
+    return year, _MONTH_STARTS[month - 1] + (leap if month > 2 else 0) + day - 1
+
+
+def _mask(lo: int, hi: int) -> int:
+    return ((1 << (hi - lo + 1)) - 1) << lo
+
+
+def _bit_runs(bits: int) -> Iterator[Tuple[int, int]]:
+    """(first bit, length) of each run of 1 bits, lowest first; O(number of runs)."""
+    base = 0
+    while bits:
+        zeros = (bits & -bits).bit_length() - 1
+        bits >>= zeros
+        base += zeros
+        ones = (~bits & (bits + 1)).bit_length() - 1
+        yield base, ones
+        bits >>= ones
+        base += ones
+
+
+class Coverage:
+    """Which dates have a diary entry: one int bitmap per year, bit ``n`` = day ``n`` of the year.
+
+    Range queries work on whole years at a time (mask + popcount), so a multi-year
+    lookback costs about the same as two weeks.
+    """
+
+    def __init__(self) -> None:
+        self._years: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dates(cls, dates: Iterable[DayLike]) -> "Coverage":
+        cov = cls()
+        years = cov._years
+        for value in dates:
+            try:
+                year, n = _locate(value)
+            except ValueError:
+                continue
+            years[year] = years.get(year, 0) | (1 << n)
+        return cov
+
+    def add(self, value: DayLike) -> None:
+        year, n = _locate(value)
+        with self._lock:
+            self._years[year] = self._years.get(year, 0) | (1 << n)
+
+    def discard(self, value: DayLike) -> None:
+        year, n = _locate(value)
+        with self._lock:
+            self._years[year] = self._years.get(year, 0) & ~(1 << n)
+
+    def __contains__(self, value: DayLike) -> bool:
+        year, n = _locate(value)
+        return bool(self._years.get(year, 0) >> n & 1)
+
+    def first(self) -> Optional[date]:
+        with self._lock:
+            years = sorted(y for y, bits in self._years.items() if bits)
+            if not years:
+                return None
+            bits = self._years[years[0]]
+        return date(years[0], 1, 1) + timedelta(days=(bits & -bits).bit_length() - 1)
+
+    def _segments(self, start: date, end: date) -> Iterator[Tuple[int, int, int, int]]:
+        """(year, first day index, last day index, masked bits) for each year in ``start..end``."""
+        with self._lock:
+            years = dict(self._years)
+        for year in range(start.year, end.year + 1):
+            lo = start.timetuple().tm_yday - 1 if year == start.year else 0
+            hi = end.timetuple().tm_yday - 1 if year == end.year else _year_length(year) - 1
+            yield year, lo, hi, years.get(year, 0) & _mask(lo, hi)
+
+    def count(self, start: DayLike, end: DayLike) -> int:
+        """Days with an entry in ``start..end`` (inclusive)."""
+        start, end = _day(start), _day(end)
+        if start > end:
+            return 0
+        return sum(bin(bits).count("1") for _, _, _, bits in self._segments(start, end))
+
+    def ratio(self, start: DayLike, end: DayLike) -> float:
+        start, end = _day(start), _day(end)
+        days = (end - start).days + 1
+        return self.count(start, end) / days if days > 0 else 0.0
+
+    def _runs(self, start: date, end: date, written: bool) -> Iterator[Tuple[date, int]]:
+        # 年をまたいで続く連続は1つにまとめる
+        pending: Optional[Tuple[date, int]] = None
+        for year, lo, hi, bits in self._segments(start, end):
+            if not written:
+                bits = ~bits & _mask(lo, hi)
+            jan1 = date(year, 1, 1)
+            for first, length in _bit_runs(bits):
+                run_start = jan1 + timedelta(days=first)
+                if pending is not None and pending[0] + timedelta(days=pending[1]) == run_start:
+                    pending = (pending[0], pending[1] + length)
+                    continue
+                if pending is not None:
+                    yield pending
+                pending = (run_start, length)
+        if pending is not None:
+            yield pending
+
+    def streaks(self, start: DayLike, end: DayLike) -> List[Tuple[date, int]]:
+        """(first day, length) of each run of written days in ``start..end``."""
+        return list(self._runs(_day(start), _day(end), True))
+
+    def gaps(self, start: DayLike, end: DayLike) -> List[Tuple[date, int]]:
+        """(first day, length) of each run of missing days in ``start..end``."""
+        return list(self._runs(_day(start), _day(end), False))
+
+    def missing(self, start: DayLike, end: DayLike) -> List[str]:
+        """ISO dates without an entry in ``start..end``, oldest first (cost grows with the result)."""
+        return [
+            (first + timedelta(days=k)).isoformat()
+            for first, length in self._runs(_day(start), _day(end), False)
+            for k in range(length)
+        ]
+
+    def longest_streak(self, start: DayLike, end: DayLike) -> Tuple[int, Optional[date]]:
+        """Length and first day of the longest run of written days in ``start..end``."""
+        best: Tuple[int, Optional[date]] = (0, None)
+        for first, length in self._runs(_day(start), _day(end), True):
+            if length > best[0]:
+                best = (length, first)
+        return best
+
+    def current_streak(self, end: DayLike) -> int:
+        """Consecutive written days ending at ``end`` (0 when ``end`` itself is missing)."""
+        end = _day(end)
+        total = 0
+        with self._lock:
+            years = dict(self._years)
+        year, hi = end.year, end.timetuple().tm_yday - 1
+        while True:
+            # 末尾から見て最初の未記入日 = 反転したビットの最上位
+            holes = ~years.get(year, 0) & _mask(0, hi)
+            if holes:
+                return total + hi - (holes.bit_length() - 1)
+            total += hi + 1
+            year -= 1
+            if year not in years:
+                return total
+            hi = _year_length(year) - 1
+
+
+def calendar_svg(cov: Coverage, end: date, weeks: int = 53, cell: int = 11, gap: int = 2) -> str:
+    """GitHub-style calendar (columns = weeks, rows = Mon..Sun) of written days up to ``end``."""
+    last_monday = end - timedelta(days=end.weekday())
+    start = last_monday - timedelta(weeks=weeks - 1)
+    step = cell + gap
+    left, top = 18, 14
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{left + weeks * step}" height="{top + 7 * step}" '
+        'font-size="9" font-family="sans-serif">'
+    ]
+    for row, label in ((0, "月"), (2, "水"), (4, "金")):
+        parts.append(f'<text x="0" y="{top + row * step + cell - 2}" fill="#888">{label}</text>')
+    month = None
+    for col in range(weeks):
+        monday = start + timedelta(weeks=col)
+        if monday.month != month:
+            month = monday.month
+            parts.append(f'<text x="{left + col * step}" y="9" fill="#888">{month}月</text>')
+        for row in range(7):
+            day = monday + timedelta(days=row)
+            if day > end:
+                continue
+            color = "#40c463" if day in cov else "#ebedf0"
+            parts.append(
+                f'<rect x="{left + col * step}" y="{top + row * step}" width="{cell}" height="{cell}" '
+                f'rx="2" fill="{color}"><title>{day.isoformat()}</title></rect>'
+            )
+    parts.append("</svg>")
+    return "".join(parts)
@@ -0,0 +1,162 @@
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+_A1_RE = re.compile(r"^(?:.*!)?([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+_DATE_RE = re.compile(r"^\d{4}-\d{1,2}-\d{1,2}( \d{1,2}:\d{2}(:\d{2})?)?$")
+
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - ord("A") + 1)
+    return n
+
+
+def _col_letters(n: int) -> str:
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+class FakeWorksheet:
+    """In-memory stand-in for the subset of ``gspread.Worksheet`` this app uses.
+
+    Values are stored as strings like the Sheets API returns them, and every API
+    method call is counted in ``calls`` so quota use can be checked offline.
+    ``fail_next`` makes the next N calls raise, for exercising retries.
+    With ``user_entered=True``, dates written with ``value_input_option="USER_ENTERED"``
+    come back the way a Japanese-locale sheet shows them ("2026/10/18 9:05:00").
+    """
+
+    title = "Sheet1"
+
+    def __init__(self, rows: Optional[List[List[Any]]] = None, user_entered: bool = False) -> None:
+        self.rows: List[List[str]] = [[self._cell(v) for v in row] for row in rows or []]
+        self.user_entered = user_entered
+        self.calls: Dict[str, int] = {}
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cell(value: Any) -> str:
+        return "" if value is None else str(value)
+
+    def _entered(self, value: Any, kwargs: Dict[str, Any]) -> str:
+        text = self._cell(value)
+        if not (self.user_entered and kwargs.get("value_input_option") == "USER_ENTERED" and _DATE_RE.match(text)):
+            return text
+        # Sheets は日付・日時として解釈し、表示形式（時は0埋めなし・秒付き）で返す
+        if " " not in text:
+            d = datetime.strptime(text, "%Y-%m-%d")
+            return f"{d.year}/{d.month:02d}/{d.day:02d}"
+        d = datetime.strptime(text, "%Y-%m-%d %H:%M:%S" if text.count(":") == 2 else "%Y-%m-%d %H:%M")
+        return f"{d.year}/{d.month:02d}/{d.day:02d} {d.hour}:{d.minute:02d}:{d.second:02d}"
+
+    def _call(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise RuntimeError(f"fake {name} failure")
+
+    def _parse(self, a1: str):
+        match = _A1_RE.match(a1)
+        if match is None:
+            raise ValueError(f"unsupported range: {a1}")
+        c1, r1, c2, r2 = match.groups()
+        if not r1:
+            # "A:A" のような列全体の指定
+            return 1, _col_index(c1), len(self.rows), _col_index(c2 or c1)
+        return int(r1), _col_index(c1), int(r2 or r1), _col_index(c2 or c1)
+
+    def _write(self, a1: str, values: List[List[Any]], kwargs: Dict[str, Any]) -> None:
+        r1, c1, _, _ = self._parse(a1)
+        for dr, row in enumerate(values):
+            r = r1 + dr
+            while len(self.rows) < r:
+                self.rows.append([])
+            target = self.rows[r - 1]
+            for dc, value in enumerate(row):
+                c = c1 + dc
+                while len(target) < c:
+                    target.append("")
+                target[c - 1] = self._entered(value, kwargs)
+
+    def _read(self, a1: str) -> List[List[str]]:
+        r1, c1, r2, c2 = self._parse(a1)
+        out = []
+        for r in range(r1, min(r2, len(self.rows)) + 1):
+            row = self.rows[r - 1][c1 - 1 : c2]
+            # API と同じく、行末の空セルと末尾の空行は返さない
+            while row and row[-1] == "":
+                row.pop()
+            out.append(row)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def get_all_values(self) -> List[List[str]]:
+        with self._lock:
+            self._call("get_all_values")
+            return [list(r) for r in self.rows]
+
+    def get_all_records(self) -> List[Dict[str, str]]:
+        with self._lock:
+            self._call("get_all_records")
+            if not self.rows:
+                return []
+            header = self.rows[0]
+            return [{h: (row[i] if i < len(row) else "") for i, h in enumerate(header)} for row in self.rows[1:]]
+
+    def row_values(self, row: int) -> List[str]:
+        with self._lock:
+            self._call("row_values")
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def col_values(self, col: int) -> List[str]:
+        with self._lock:
+            self._call("col_values")
+            values = [row[col - 1] if col <= len(row) else "" for row in self.rows]
+            while values and values[-1] == "":
+                values.pop()
+            return values
+
+    def append_row(self, values: List[Any], **kwargs: Any) -> Dict[str, Any]:
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values: List[List[Any]], **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            self._call("append_rows")
+            start = len(self.rows) + 1
+            self.rows.extend([self._entered(v, kwargs) for v in row] for row in values)
+            width = max((len(r) for r in values), default=1)
+            return {"updates": {"updatedRange": f"{self.title}!A{start}:{_col_letters(width)}{len(self.rows)}"}}
+
+    def update(self, range_name: str, values: List[List[Any]], **kwargs: Any) -> None:
+        with self._lock:
+            self._call("update")
+            self._write(range_name, values, kwargs)
+
+    def batch_update(self, data: List[Dict[str, Any]], **kwargs: Any) -> None:
+        with self._lock:
+            self._call("batch_update")
+            for item in data:
+                self._write(item["range"], item["values"], kwargs)
+
+    def batch_get(self, ranges: List[str], **kwargs: Any) -> List[List[List[str]]]:
+        with self._lock:
+            self._call("batch_get")
+            return [self._read(r) for r in ranges]
+
+    def delete_rows(self, start_index: int, end_index: Optional[int] = None) -> None:
+        with self._lock:
+            self._call("delete_rows")
+            del self.rows[start_index - 1 : end_index or start_index]
+
+    def insert_row(self, values: List[Any], index: int = 1, **kwargs: Any) -> None:
+        with self._lock:
+            self._call("insert_row")
+            self.rows.insert(index - 1, [self._entered(v, kwargs) for v in values])
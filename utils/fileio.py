@@ -0,0 +1,19 @@
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from utils import perf
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    # 書き込み途中で落ちても元ファイルが壊れないよう、一時ファイルに書いてから置き換える
+    tmp = path.with_name(path.name + ".tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+        if perf.ENABLED:
+            perf.add_bytes(written=os.fstat(f.fileno()).st_size)
+    os.replace(tmp, path)
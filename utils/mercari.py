@@ -0,0 +1,229 @@
+import codecs
+import csv
+import io
+import json
+import re
+import unicodedata
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.templates import TemplateRegistry
+
+if TYPE_CHECKING:
+    from utils.catalog import Catalog
+
+COPY_INSTRUCTION = (
+    "それぞれ個別のコピー操作をするため、各項目のテキストが単独で使えるようコピー専用ブロックで出力してください。"
+)
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "mercari"
+
+
+def _jan_rule(value: str) -> Tuple[str, str]:
+    jan = normalize_jan(value)
+    return jan, jan_error(jan)
+
+
+_registry: Optional[TemplateRegistry] = None
+
+
+def registry() -> TemplateRegistry:
+    """Listing templates in templates/mercari (call ``refresh()`` on it to pick up edits)."""
+    global _registry
+    if _registry is None:
+        _registry = TemplateRegistry(
+            TEMPLATE_DIR, rules={"jan": _jan_rule}, constants={"copy_instruction": COPY_INSTRUCTION}
+        )
+    return _registry
+
+
+def normalize_jan(value: str) -> str:
+    """Digits only (full-width digits, spaces and hyphens are folded away)."""
+    if value.isascii() and value.isdigit():
+        return value
+    return re.sub(r"[\s\-]", "", unicodedata.normalize("NFKC", value))
+
+
+def jan_error(jan: str) -> str:
+    """Why ``jan`` (already normalized) is not a valid JAN-8/JAN-13, or "" when it is."""
+    if not (jan.isascii() and jan.isdigit()) or len(jan) not in (8, 13):
+        return "JANコードは8桁か13桁の数字で入力してください"
+    # チェックディジットの左隣から左へ 3, 1, 3, 1... の重み
+    total = 3 * sum(map(int, jan[-2::-2])) + sum(map(int, jan[-3::-2]))
+    if (10 - total % 10) % 10 != int(jan[-1]):
+        return "JANコードのチェックディジットが一致しません"
+    return ""
+
+
+# --- 一括作成（CSV/TSV） ---
+
+BULK_FIELDS = ["maker", "product", "model", "jan", "notes"]
+FIELD_LABELS = {"maker": "メーカー名", "product": "商品名", "model": "型番", "jan": "JANコード", "notes": "特徴・注意事項"}
+_ALIASES = {
+    "maker": ["メーカー", "メーカー名", "ブランド", "maker", "manufacturer", "brand"],
+    "product": ["商品名", "品名", "product", "product_name", "name"],
+    "model": ["型番", "品番", "model", "model_code", "modelcode"],
+    "jan": ["jan", "janコード", "jan_code", "ean", "バーコード"],
+    "notes": ["特徴・注意事項", "注意事項", "特徴", "備考", "メモ", "notes", "note"],
+}
+_HEADER_LOOKUP = {unicodedata.normalize("NFKC", a).lower(): f for f, names in _ALIASES.items() for a in names}
+MODE_LABELS = {"unknown": "不明商品", "known_name": "商品名", "known_code": "型番/JAN"}
+
+
+@dataclass
+class BulkItem:
+    """One CSV row: the mode chosen for it and the prompt, or the reason it was rejected."""
+
+    line: int
+    values: Dict[str, str]
+    mode: str = ""
+    prompt: str = ""
+    error: str = ""
+    from_catalog: bool = False
+
+
+@dataclass
+class BulkSummary:
+    rows: int = 0
+    by_mode: Dict[str, int] = field(default_factory=dict)
+    errors: List[BulkItem] = field(default_factory=list)
+    from_catalog: int = 0
+
+
+def _decode(stream: IO[bytes], sample_size: int = 64 * 1024) -> io.TextIOBase:
+    """UTF-8 (BOM allowed) when the head decodes, otherwise Shift_JIS (Excel's Japanese CSV)."""
+    head = stream.read(sample_size)
+    stream.seek(0)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError:
+        encoding = "cp932"
+    return io.TextIOWrapper(stream, encoding=encoding, newline="")  # type: ignore[arg-type]
+
+
+def read_rows(stream: IO[bytes], filename: str = "") -> Iterator[Tuple[int, Dict[str, str]]]:
+    """(line number, values by field) per data row, read lazily; raises ``ValueError`` on a bad header."""
+    text = _decode(stream)
+    first = text.readline()
+    delimiter = "\t" if filename.lower().endswith((".tsv", ".txt")) or "\t" in first else ","
+    header = next(csv.reader([first], delimiter=delimiter), [])
+    columns = [_HEADER_LOOKUP.get(unicodedata.normalize("NFKC", h).strip().lower()) for h in header]
+    if not any(columns):
+        labels = " / ".join(FIELD_LABELS.values())
+        raise ValueError(f"1行目に列名（{labels}）が見つかりません")
+    reader = csv.reader(text, delimiter=delimiter)
+    for cells in reader:
+        values = {f: "" for f in BULK_FIELDS}
+        for name, cell in zip(columns, cells):
+            if name is not None:
+                values[name] = cell.strip()
+        # 見出し行は readline で読んだので +1（セル内改行があればその行の最後の行番号）
+        yield reader.line_num + 1, values
+
+
+def _complete(item: BulkItem, jan: str, catalog: "Catalog") -> str:
+    """Fill the row's blank fields from the catalog (by JAN, else by a unique model code)."""
+    values = item.values
+    found = catalog.lookup_jan(jan) if jan else None
+    if found is None and values["model"]:
+        matches = catalog.lookup_model(values["model"])
+        found = matches[0] if len(matches) == 1 else None
+    if found is None:
+        return jan
+    # 行に書いてある値が優先。空欄だけを埋める
+    filled = {k: v for k, v in found.values().items() if v and not values[k]}
+    if filled:
+        item.values = {**values, **filled}
+        item.from_catalog = True
+    return jan or found.jan
+
+
+def build_item(line: int, values: Dict[str, str], catalog: Optional["Catalog"] = None) -> Optional[BulkItem]:
+    """Validate one row and pick its mode; ``None`` for a blank row.
+
+    Name + model code + JAN -> ``known_code``, a name -> ``known_name``, neither -> ``unknown``.
+    With a ``catalog``, blank fields are looked up first, so a row with only a JAN is enough.
+    """
+    if not any(values.values()):
+        return None
+    item = BulkItem(line, values)
+    jan = normalize_jan(values["jan"]) if values["jan"] else ""
+    if jan:
+        item.error = jan_error(jan)
+    if catalog is not None and not item.error and not (values["product"] and values["model"] and jan):
+        jan = _complete(item, jan, catalog)
+        values = item.values
+    if not item.error and not values["product"] and (values["model"] or jan):
+        item.error = "商品名がありません（型番・JANだけの行は、商品カタログに登録するか商品名探索モードで調べてください）"
+    if item.error:
+        return item
+    # 行は検証済みなので、テンプレート側の検証は通さずに埋める
+    if values["product"] and values["model"] and jan:
+        item.mode = "known_code"
+        fill = {**values, "jan": jan}
+    elif values["product"]:
+        # 型番か JAN の片方だけ分かっている場合は、その値を注意事項に添える
+        extra = "、".join(f"{FIELD_LABELS[f]}: {v}" for f, v in (("model", values["model"]), ("jan", jan)) if v)
+        item.mode = "known_name"
+        fill = {**values, "notes": "。".join(p for p in (values["notes"], extra) if p)}
+    else:
+        maker = f"{FIELD_LABELS['maker']}: {values['maker']}" if values["maker"] else ""
+        item.mode = "unknown"
+        fill = {"notes": "。".join(p for p in (maker, values["notes"]) if p)}
+    # item.mode はテンプレートの key（一括作成はこの3つの key とフィールド名に依存している）
+    item.prompt = registry().get(item.mode).fill(fill)
+    return item
+
+
+def build_items(
+    rows: Iterable[Tuple[int, Dict[str, str]]], catalog: Optional["Catalog"] = None
+) -> Iterator[BulkItem]:
+    for line, values in rows:
+        item = build_item(line, values, catalog)
+        if item is not None:
+            yield item
+
+
+_UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def _entry_name(item: BulkItem) -> str:
+    label = _UNSAFE_NAME.sub("_", item.values["product"])[:40].strip("_") or MODE_LABELS[item.mode]
+    return f"{item.line:05d}_{label}.txt"
+
+
+def _tally(summary: BulkSummary, item: BulkItem) -> bool:
+    summary.rows += 1
+    summary.from_catalog += item.from_catalog
+    if item.error:
+        summary.errors.append(item)
+        return False
+    summary.by_mode[item.mode] = summary.by_mode.get(item.mode, 0) + 1
+    return True
+
+
+def write_zip(items: Iterable[BulkItem], out: IO[bytes]) -> BulkSummary:
+    """One text file per prompt, written as the items arrive (nothing is collected first)."""
+    summary = BulkSummary()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for item in items:
+            if _tally(summary, item):
+                archive.writestr(_entry_name(item), item.prompt)
+        if summary.errors:
+            lines = [f"{e.line}行目: {e.error}" for e in summary.errors]
+            archive.writestr("errors.txt", "\n".join(lines) + "\n")
+    return summary
+
+
+def write_jsonl(items: Iterable[BulkItem], out: IO[bytes]) -> BulkSummary:
+    """One JSON object per row (errors included), written as the items arrive."""
+    summary = BulkSummary()
+    for item in items:
+        _tally(summary, item)
+        record: Dict[str, Any] = {"line": item.line, **item.values, "mode": item.mode}
+        record.update({"error": item.error} if item.error else {"prompt": item.prompt})
+        out.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+    return summary
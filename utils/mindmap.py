@@ -0,0 +1,369 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import perf
+from utils.prompting import estimate_tokens
+
+DEFAULT_BUDGET_TOKENS = 1500
+# 差分をこの件数つないだら全文を保存し直す（どの版も全文1つ＋差分数件で復元できる）
+SNAPSHOT_EVERY = 20
+TAB_WIDTH = 4
+BULLETS = ("- ", "* ", "・", "■ ")
+
+Path_ = Tuple[str, ...]
+
+
+# --- ツリー ---
+
+
+@dataclass
+class Node:
+    label: str
+    line: str
+    children: List["Node"] = field(default_factory=list)
+
+    def walk(self, prefix: Path_ = ()) -> Iterable[Tuple[Path_, "Node"]]:
+        path = prefix + (self.label,)
+        yield path, self
+        for child in self.children:
+            yield from child.walk(path)
+
+    def lines(self) -> List[str]:
+        return [node.line for _, node in self.walk()]
+
+
+@dataclass
+class Tree:
+    """An indented outline parsed into nodes; treat as read-only (trees are cached and shared)."""
+
+    roots: List[Node]
+    digest: str
+
+    def paths(self) -> Set[Path_]:
+        return {path for root in self.roots for path, _ in root.walk()}
+
+    def trunk(self) -> Tuple[List[Node], List[Node]]:
+        """(single-child chain from the top, the branches under it) — e.g. 理想の自分 -> 健康, 仕事..."""
+        chain: List[Node] = []
+        level = self.roots
+        while len(level) == 1 and level[0].children:
+            chain.append(level[0])
+            level = level[0].children
+        return chain, level
+
+
+def _label(text: str) -> str:
+    text = text.strip()
+    for bullet in BULLETS:
+        if text.startswith(bullet):
+            return text[len(bullet) :].strip()
+    return text
+
+
+def _parse(content: str, digest: str) -> Tree:
+    roots: List[Node] = []
+    stack: List[Tuple[int, Node]] = []
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        width = len(line.expandtabs(TAB_WIDTH)) - len(line.expandtabs(TAB_WIDTH).lstrip())
+        node = Node(_label(line), line.rstrip())
+        while stack and stack[-1][0] >= width:
+            stack.pop()
+        (stack[-1][1].children if stack else roots).append(node)
+        stack.append((width, node))
+    return Tree(roots, digest)
+
+
+def content_digest(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+_TREES: "OrderedDict[str, Tree]" = OrderedDict()
+_TREES_LOCK = threading.Lock()
+_TREES_MAX = 32
+
+
+def parse(content: str) -> Tree:
+    """Tree for ``content``, cached by content hash (the same text is parsed once per process)."""
+    digest = content_digest(content)
+    with _TREES_LOCK:
+        tree = _TREES.get(digest)
+        perf.cache("mindmap.parse", tree is not None)
+        if tree is not None:
+            _TREES.move_to_end(digest)
+            return tree
+    tree = _parse(content, digest)
+    with _TREES_LOCK:
+        _TREES[digest] = tree
+        while len(_TREES) > _TREES_MAX:
+            _TREES.popitem(last=False)
+    return tree
+
+
+@dataclass
+class TreeDiff:
+    """Nodes (as label paths) added and removed between two versions; a renamed node is both."""
+
+    added: List[Path_]
+    removed: List[Path_]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def diff_trees(old: Tree, new: Tree) -> TreeDiff:
+    if old.digest == new.digest:
+        return TreeDiff([], [])
+    before, after = old.paths(), new.paths()
+    # 親ごと増減したときは子を並べない（親の行だけ見れば分かる）
+    added = [p for p in sorted(after - before) if p[:-1] not in after - before]
+    removed = [p for p in sorted(before - after) if p[:-1] not in before - after]
+    return TreeDiff(added, removed)
+
+
+# --- プロンプト用に絞り込む ---
+
+
+def _grams(text: str) -> Set[str]:
+    text = "".join(text.split()).lower()
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+@dataclass
+class MindmapContext:
+    text: str
+    tokens: int
+    shown: List[str]
+    omitted: List[str]
+    changed: List[str]
+
+
+def prompt_context(
+    content: str,
+    related: Iterable[str] = (),
+    base: Optional[str] = None,
+    budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+) -> MindmapContext:
+    """The mindmap for a prompt, cut down to the branches that matter when it is over budget.
+
+    Branches changed since ``base`` come first (added lines are marked ［新］), then the
+    branches sharing the most character bigrams with ``related`` (e.g. the diaries being
+    reviewed). Omitted branches are still listed by name so the structure stays visible.
+    A mindmap that fits the budget without changes is returned as is.
+    """
+    tree = parse(content)
+    chain, branches = tree.trunk()
+    labels = [b.label for b in branches]
+    diff = diff_trees(parse(base), tree) if base is not None else TreeDiff([], [])
+    added = set(diff.added)
+    depth = len(chain)
+    # 削除された枝は今の版に無いので、今の枝の後ろに名前順で並べる
+    changed = sorted(
+        {p[depth] for p in diff.added + diff.removed if len(p) > depth},
+        key=lambda label: (labels.index(label) if label in labels else len(labels), label),
+    )
+    tokens = estimate_tokens(content)
+    if tokens <= budget_tokens and not added:
+        return MindmapContext(content, tokens, labels, [], changed)
+
+    wanted = _grams(" ".join(related))
+    prefix = tuple(n.label for n in chain)
+
+    def render(branch: Node) -> List[str]:
+        return [
+            node.line + (" ［新］" if path in added else "")
+            for path, node in branch.walk(prefix)
+        ]
+
+    def score(i: int) -> Tuple[int, int, int]:
+        overlap = len(_grams(" ".join(n.label for _, n in branches[i].walk())) & wanted)
+        return (labels[i] not in changed, -overlap, i)
+
+    head = [n.line for n in chain]
+    used = estimate_tokens("\n".join(head)) + 20  # 20: 省略行の分
+    keep: Set[int] = set()
+    for i in sorted(range(len(branches)), key=score):
+        cost = estimate_tokens("\n".join(render(branches[i])))
+        if used + cost <= budget_tokens:
+            keep.add(i)
+            used += cost
+    lines = list(head)
+    for i, branch in enumerate(branches):
+        if i in keep:
+            lines.extend(render(branch))
+    omitted = [labels[i] for i in range(len(branches)) if i not in keep]
+    if omitted:
+        indent = branches[0].line[: len(branches[0].line) - len(branches[0].line.lstrip())]
+        lines.append(f"{indent}（省略: {' / '.join(omitted)}）")
+    if diff.removed:
+        lines.append("（前回から削除: " + " / ".join(" › ".join(p[depth:]) for p in diff.removed[:10]) + "）")
+    text = "\n".join(lines)
+    return MindmapContext(
+        text, estimate_tokens(text), [labels[i] for i in sorted(keep)], omitted, changed
+    )
+
+
+# --- 版の履歴 ---
+
+
+def _delta(old: List[str], new: List[str]) -> List[Any]:
+    """Line ops turning ``old`` into ``new``: n = copy n lines, -n = skip n, [lines] = insert."""
+    import difflib  # 保存のときだけ使う
+
+    ops: List[Any] = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(new[j1:j2])
+    return ops
+
+
+def _apply(old: List[str], ops: List[Any]) -> List[str]:
+    out: List[str] = []
+    i = 0
+    for op in ops:
+        if isinstance(op, list):
+            out.extend(op)
+        elif op > 0:
+            out.extend(old[i : i + op])
+            i += op
+        else:
+            i -= op
+    return out
+
+
+@dataclass
+class Revision:
+    number: int
+    at: str
+    digest: str
+    offset: int
+    snapshot: bool
+    lines: int
+
+
+class MindmapHistory:
+    """Every saved mindmap as an append-only JSONL file of full snapshots and line deltas.
+
+    A full snapshot is written every ``snapshot_every`` revisions (or when a delta would
+    not be smaller), so any revision is rebuilt from one snapshot plus a few deltas read
+    from known offsets. The file is scanned to index the offsets once, and again only
+    when its size no longer matches what this process wrote.
+    """
+
+    def __init__(self, path: Path, snapshot_every: int = SNAPSHOT_EVERY) -> None:
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._index: Optional[List[Revision]] = None
+        self._end = 0
+        self._texts: "OrderedDict[int, List[str]]" = OrderedDict()
+
+    def _load(self) -> List[Revision]:
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            size = 0
+        if self._index is None or size != self._end:
+            index: List[Revision] = []
+            offset = 0
+            if size:
+                with self.path.open("rb") as f:
+                    for raw in f:
+                        try:
+                            rec = json.loads(raw)
+                        except ValueError:
+                            break  # 書き込み途中で落ちた末尾の行は捨てる（次の追記の前に切り詰める）
+                        index.append(
+                            Revision(rec["rev"], rec["at"], rec["hash"], offset, "snapshot" in rec, rec["lines"])
+                        )
+                        offset += len(raw)
+            self._index = index
+            self._end = offset
+            self._texts.clear()
+        return self._index
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def revisions(self) -> List[Revision]:
+        with self._lock:
+            return list(self._load())
+
+    def _lines(self, number: int) -> List[str]:
+        cached = self._texts.get(number)
+        if cached is not None:
+            self._texts.move_to_end(number)
+            return cached
+        index = self._load()
+        pos = number - 1
+        start = pos
+        while not index[start].snapshot:
+            start -= 1
+        lines: List[str] = []
+        with self.path.open("rb") as f:
+            f.seek(index[start].offset)
+            for _ in range(start, pos + 1):
+                rec = json.loads(f.readline())
+                lines = rec["snapshot"] if "snapshot" in rec else _apply(lines, rec["delta"])
+        self._texts[number] = lines
+        while len(self._texts) > 8:
+            self._texts.popitem(last=False)
+        return lines
+
+    def content(self, number: int) -> str:
+        """Text of revision ``number`` (1 = oldest); raises ``IndexError`` when it does not exist."""
+        with self._lock:
+            if not 1 <= number <= len(self._load()):
+                raise IndexError(number)
+            return "".join(self._lines(number))
+
+    def at_or_before(self, stamp: str) -> Optional[Revision]:
+        """The revision in effect at ``stamp`` (``YYYY-MM-DD HH:MM`` or a date)."""
+        with self._lock:
+            index = self._load()
+            i = bisect.bisect_right([r.at for r in index], stamp)
+            return index[i - 1] if i else None
+
+    def record(self, content: str, at: str) -> Optional[Revision]:
+        """Append ``content`` as a new revision; None when it equals the latest one."""
+        digest = content_digest(content)
+        new = content.splitlines(keepends=True)
+        with self._lock:
+            index = self._load()
+            if index and index[-1].digest == digest:
+                return None
+            rec: Dict[str, Any] = {"rev": len(index) + 1, "at": at, "hash": digest, "lines": len(new)}
+            since_snapshot = next((k for k, r in enumerate(reversed(index)) if r.snapshot), len(index))
+            delta = _delta(self._lines(len(index)), new) if index else None
+            if delta is not None and since_snapshot + 1 < self.snapshot_every:
+                body = json.dumps(delta, ensure_ascii=False)
+                if len(body) < len(content):
+                    rec["delta"] = delta
+            if "delta" not in rec:
+                rec["snapshot"] = new
+            raw = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                f.truncate(self._end)
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+            revision = Revision(rec["rev"], at, digest, self._end, "snapshot" in rec, len(new))
+            index.append(revision)
+            self._end += len(raw)
+            self._texts[revision.number] = new
+            return revision
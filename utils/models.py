@@ -0,0 +1,243 @@
+import bisect
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+
+# シート・JSON と同じ日本語キー → 属性名
+FIELDS = {
+    "date": "date",
+    "料理": "cooking",
+    "仕事": "work",
+    "youtube": "youtube",
+    "やるでき": "yarudeki",
+    "人": "person",
+    "反省": "reflection",
+    "updated_at": "updated_at",
+}
+TEXT_FIELDS = ["料理", "仕事", "やるでき", "人", "反省"]
+
+
+# 以下の変換は読み込み時に全件へかかるので、よくある型を先に素通しする
+def _text(value: Any) -> str:
+    if type(value) is str:
+        return value
+    return "" if value is None else str(value)
+
+
+def _hours(value: Any) -> float:
+    if type(value) is float:
+        return value
+    if value is None or value == "":
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def iso_date(value: Any) -> str:
+    """``YYYY-MM-DD`` for a date or a date string (``2024/1/5`` too); raises ``ValueError``."""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value or "").strip()
+    if len(text) == 10 and text[4] == "-" and text[7] == "-":
+        # ほぼ全ての行はこの形なので、日付として正しいかの確認だけ行う
+        date.fromisoformat(text)
+        return text
+    # シートの表示形式によっては 2024/1/5 のように返ってくる
+    parts = text.replace("/", "-").split("-")
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        raise ValueError(f"invalid date: {text!r}")
+    return date(int(parts[0]), int(parts[1]), int(parts[2])).isoformat()
+
+
+@dataclass
+class DiaryEntry:
+    """One day of the diary, validated and coerced once.
+
+    Entries are shared between callers (see ``DiaryTable.entries``), so treat them as
+    read-only and use ``dataclasses.replace`` for changes. This is a convention, not
+    enforced: ``frozen=True`` would make building every row at load ~2.7x slower.
+    ``entry["料理"]`` / ``entry.get("料理")`` keep working so code written for the
+    plain dicts can take entries unchanged.
+    """
+
+    __slots__ = tuple(FIELDS.values())
+
+    date: str
+    cooking: str
+    work: str
+    youtube: float
+    yarudeki: str
+    person: str
+    reflection: str
+    updated_at: str
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "DiaryEntry":
+        """Build from a Japanese-keyed dict (sheet row, JSON); raises ``ValueError`` on a bad date."""
+        if isinstance(data, DiaryEntry):
+            return data
+        get = data.get
+        return cls(
+            iso_date(get("date")),
+            _text(get("料理")),
+            _text(get("仕事")),
+            _hours(get("youtube")),
+            _text(get("やるでき")),
+            _text(get("人")),
+            _text(get("反省")),
+            _text(get("updated_at")),
+        )
+
+    @classmethod
+    def empty(cls, date_str: str) -> "DiaryEntry":
+        return cls(iso_date(date_str), "", "", 0.0, "", "", "", "")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, attr) for key, attr in FIELDS.items()}
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, FIELDS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        attr = FIELDS.get(key)
+        return getattr(self, attr) if attr is not None else default
+
+
+EntryLike = Union[DiaryEntry, Mapping[str, Any]]
+
+
+class DiaryTable:
+    """Diaries as parallel columns sorted by date (oldest first).
+
+    ``youtube`` is an ``array('d')``, so whole-column work (sums, NumPy views) needs no
+    per-row coercion. Row objects are built on first use and shared afterwards; callers
+    treat entries as read-only (see ``DiaryEntry``), so handing them out is safe.
+    """
+
+    def __init__(self) -> None:
+        self.dates: List[str] = []
+        self.columns: Dict[str, Any] = {key: [] for key in FIELDS if key != "date"}
+        self.columns["youtube"] = array("d")
+        self._rows: Optional[List[DiaryEntry]] = None
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[EntryLike]) -> "DiaryTable":
+        """Coerce and sort once; rows with an invalid date are skipped, later duplicates win."""
+        by_date: Dict[str, DiaryEntry] = {}
+        for raw in entries:
+            try:
+                entry = DiaryEntry.from_dict(raw)
+            except ValueError:
+                continue
+            by_date[entry.date] = entry
+        table = cls()
+        rows = [by_date[d] for d in sorted(by_date)]
+        for key, attr in FIELDS.items():
+            values = list(map(attrgetter(attr), rows))
+            if key == "date":
+                table.dates = values
+            else:
+                table.columns[key] = array("d", values) if key == "youtube" else values
+        table._rows = rows
+        return table
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __bool__(self) -> bool:
+        return bool(self.dates)
+
+    def _build(self, i: int) -> DiaryEntry:
+        cols = self.columns
+        return DiaryEntry(
+            self.dates[i],
+            cols["料理"][i],
+            cols["仕事"][i],
+            cols["youtube"][i],
+            cols["やるでき"][i],
+            cols["人"][i],
+            cols["反省"][i],
+            cols["updated_at"][i],
+        )
+
+    def entries(self) -> List[DiaryEntry]:
+        """All rows oldest first (the shared list; copy before changing it)."""
+        if self._rows is None:
+            self._rows = [self._build(i) for i in range(len(self.dates))]
+        return self._rows
+
+    def row(self, i: int) -> DiaryEntry:
+        return self.entries()[i]
+
+    def __iter__(self) -> Iterator[DiaryEntry]:
+        return iter(self.entries())
+
+    def column(self, key: str) -> Sequence[Any]:
+        return self.dates if key == "date" else self.columns[key]
+
+    def get(self, date_str: str) -> Optional[DiaryEntry]:
+        i = bisect.bisect_left(self.dates, date_str)
+        if i < len(self.dates) and self.dates[i] == date_str:
+            return self.row(i)
+        return None
+
+    def latest(self, n: int = 1) -> List[DiaryEntry]:
+        """The newest ``n`` entries, newest first."""
+        return self.entries()[: -n - 1 if n < len(self.dates) else None : -1]
+
+    def slice(self, start: Optional[str] = None, end: Optional[str] = None) -> "DiaryTable":
+        """Entries with ``start <= date <= end`` (either bound optional) as a new table."""
+        lo = bisect.bisect_left(self.dates, start) if start else 0
+        hi = bisect.bisect_right(self.dates, end) if end else len(self.dates)
+        table = DiaryTable()
+        table.dates = self.dates[lo:hi]
+        table.columns = {key: values[lo:hi] for key, values in self.columns.items()}
+        if self._rows is not None:
+            table._rows = self._rows[lo:hi]
+        return table
+
+    def copy(self) -> "DiaryTable":
+        return self.slice()
+
+    def upsert(self, raw: EntryLike) -> DiaryEntry:
+        """Insert or replace one day in place; raises ``ValueError`` on a bad date."""
+        entry = DiaryEntry.from_dict(raw)
+        i = bisect.bisect_left(self.dates, entry.date)
+        exists = i < len(self.dates) and self.dates[i] == entry.date
+        if not exists:
+            self.dates.insert(i, entry.date)
+        for key, attr in FIELDS.items():
+            if key == "date":
+                continue
+            if exists:
+                self.columns[key][i] = getattr(entry, attr)
+            else:
+                self.columns[key].insert(i, getattr(entry, attr))
+        if self._rows is not None:
+            if exists:
+                self._rows[i] = entry
+            else:
+                self._rows.insert(i, entry)
+        return entry
+
+    def discard(self, date_str: str) -> None:
+        i = bisect.bisect_left(self.dates, date_str)
+        if i == len(self.dates) or self.dates[i] != date_str:
+            return
+        del self.dates[i]
+        for values in self.columns.values():
+            del values[i]
+        if self._rows is not None:
+            del self._rows[i]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [e.to_dict() for e in self.entries()]
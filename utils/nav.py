@@ -1,5 +1,7 @@
 import streamlit as st
 
+from utils import perf, storage
+
 
 def sidebar(active: str = "") -> None:
     st.sidebar.subheader("メニュー")
@@ -8,5 +10,69 @@ def sidebar(active: str = "") -> None:
     st.sidebar.page_link("pages/02_diary_list.py", label="📜 日記一覧／検索")
     st.sidebar.page_link("pages/03_mindmap.py", label="🧠 マインドマップ管理")
     st.sidebar.page_link("pages/04_ai_export.py", label="🤖 AIへ")
+    st.sidebar.page_link("pages/05_reflections.py", label="🗓️ 振り返りをまとめて作成")
+    st.sidebar.page_link("pages/06_analytics.py", label="📈 YouTube 時間の分析")
     if active:
         st.sidebar.caption(f"現在: {active}")
+
+    status = storage.sync_status()
+    if status["enabled"]:
+        st.sidebar.caption(f"Sheets同期: 送信待ち {status['pending']} 件 / 失敗 {status['failed']} 件")
+        if status["failed"]:
+            st.sidebar.caption(f"最後のエラー: {status['error']}")
+            if st.sidebar.button("失敗分を再送する", use_container_width=True):
+                storage.retry_failed_sync()
+    elif status["watermark"]:
+        st.sidebar.caption(f"シートの最終更新: {status['watermark']}")
+
+    # 計測はプロセス全体の管理用スイッチ。他のセッションで切り替えた状態もここに反映する
+    st.session_state["perf-enabled"] = perf.ENABLED
+    st.sidebar.toggle(
+        "⏱️ 処理時間を計測する（全セッション共通）",
+        key="perf-enabled",
+        on_change=_toggle_perf,
+        help="このアプリを使っている全員の処理が計測対象になります。",
+    )
+    if perf.ENABLED:
+        _perf_panel()
+
+
+def _toggle_perf() -> None:
+    # 操作したときだけ切り替える（再実行のたびにこのセッションの値で上書きしない）
+    perf.enable(st.session_state["perf-enabled"])
+
+
+def _perf_panel() -> None:
+    # サイドバーはページ本体より先に描画されるので、表示はこの操作の直前までの集計
+    snap = perf.snapshot()
+    with st.sidebar.expander("計測結果（プロセス全体）", expanded=False):
+        if not snap["calls"]:
+            st.caption("まだ記録がありません。ページを操作すると集計されます。")
+        else:
+            st.dataframe(
+                [
+                    {
+                        "処理": c["name"],
+                        "回数": int(c["calls"]),
+                        "平均ms": round(c["avg_ms"], 1),
+                        "最大ms": round(c["max_ms"], 1),
+                        "読込KB": round(c["bytes_read"] / 1024, 1),
+                        "書込KB": round(c["bytes_written"] / 1024, 1),
+                    }
+                    for c in snap["calls"]
+                ],
+                hide_index=True,
+            )
+        counters = snap["counters"]
+        st.caption(f"Sheets API {counters.get('sheets.api', 0)} 回 / OpenAI API {counters.get('openai.api', 0)} 回")
+        if snap["hit_rates"]:
+            st.caption("キャッシュ命中率: " + " / ".join(f"{k} {v:.0%}" for k, v in snap["hit_rates"].items()))
+        st.download_button(
+            "JSON Lines で書き出す",
+            perf.export_jsonl(),
+            file_name="perf.jsonl",
+            mime="application/x-ndjson",
+            use_container_width=True,
+        )
+        if st.button("集計をリセット", use_container_width=True):
+            perf.reset()
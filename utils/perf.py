@@ -0,0 +1,192 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# 環境変数かサイドバーのトグルで有効にする。無効時は各呼び出しでこのフラグを見るだけ
+ENABLED = os.environ.get("DIARY_PERF", "") not in ("", "0")
+MAX_EVENTS = 5000
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats: Dict[str, Dict[str, float]] = {}
+_counters: Dict[str, int] = {}
+_events: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+
+
+def enable(on: bool = True) -> None:
+    global ENABLED
+    ENABLED = on
+
+
+def _spans() -> List[List[int]]:
+    spans = getattr(_local, "spans", None)
+    if spans is None:
+        spans = _local.spans = []
+    return spans
+
+
+def _record(name: str, started: float, ok: bool, span: List[int]) -> None:
+    ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "bytes_read": 0, "bytes_written": 0}
+        stat["calls"] += 1
+        stat["errors"] += 0 if ok else 1
+        stat["total_ms"] += ms
+        stat["max_ms"] = max(stat["max_ms"], ms)
+        stat["bytes_read"] += span[0]
+        stat["bytes_written"] += span[1]
+        _events.append(
+            {
+                "type": "call",
+                "ts": round(time.time(), 3),
+                "name": name,
+                "ms": round(ms, 3),
+                "ok": ok,
+                "bytes_read": span[0],
+                "bytes_written": span[1],
+                "thread": threading.current_thread().name,
+            }
+        )
+
+
+def timed(name: Optional[str] = None) -> Callable[[F], F]:
+    """Record duration, errors and bytes of each call under ``name`` (default ``module.function``).
+
+    Generators are timed until exhausted or closed, coroutines until they return.
+    Durations are inclusive: a nested timed call also counts toward its caller.
+    """
+
+    def decorate(fn: F) -> F:
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        def begin() -> List[int]:
+            span = [0, 0]
+            _spans().append(span)
+            return span
+
+        def end(span: List[int], started: float, ok: bool) -> None:
+            spans = _spans()
+            if spans and spans[-1] is span:
+                spans.pop()
+            _record(label, started, ok, span)
+
+        if inspect.isgeneratorfunction(fn):
+
+            @functools.wraps(fn)
+            def gen_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not ENABLED:
+                    return (yield from fn(*args, **kwargs))
+                started, ok = time.perf_counter(), False
+                try:
+                    result = yield from fn(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    # 途中の yield で他の計測が挟まるので、ここではスタックに積まない
+                    _record(label, started, ok, [0, 0])
+
+            return gen_wrapper  # type: ignore[return-value]
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not ENABLED:
+                    return await fn(*args, **kwargs)
+                started, ok = time.perf_counter(), False
+                try:
+                    result = await fn(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    _record(label, started, ok, [0, 0])
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            span, started, ok = begin(), time.perf_counter(), False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                end(span, started, ok)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def count(name: str, n: int = 1) -> None:
+    """Bump a counter such as ``sheets.api`` or ``openai.api``."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def cache(name: str, hit: bool) -> None:
+    """Count a hit or miss for cache ``name``; see ``hit_rates``."""
+    if ENABLED:
+        count(f"{name}.{'hit' if hit else 'miss'}")
+
+
+def add_bytes(read: int = 0, written: int = 0) -> None:
+    """Attribute I/O bytes to every timed call currently running on this thread."""
+    if not ENABLED:
+        return
+    for span in _spans():
+        span[0] += read
+        span[1] += written
+    count("bytes_read", read)
+    count("bytes_written", written)
+
+
+def hit_rates() -> Dict[str, float]:
+    with _lock:
+        names = {key.rsplit(".", 1)[0] for key in _counters if key.endswith((".hit", ".miss"))}
+        rates = {}
+        for name in sorted(names):
+            hits, misses = _counters.get(f"{name}.hit", 0), _counters.get(f"{name}.miss", 0)
+            rates[name] = hits / (hits + misses) if hits + misses else 0.0
+        return rates
+
+
+def snapshot() -> Dict[str, Any]:
+    """Per-call stats (slowest total first), counters and cache hit rates."""
+    with _lock:
+        calls = [
+            {"name": name, **stat, "avg_ms": stat["total_ms"] / stat["calls"]}
+            for name, stat in sorted(_stats.items(), key=lambda kv: -kv[1]["total_ms"])
+        ]
+        counters = dict(sorted(_counters.items()))
+    return {"calls": calls, "counters": counters, "hit_rates": hit_rates()}
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+        _events.clear()
+
+
+def export_jsonl() -> str:
+    """Recorded calls (most recent ``MAX_EVENTS``) as JSON lines, followed by one counters line."""
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+    lines = [json.dumps(e, ensure_ascii=False) for e in events]
+    lines.append(json.dumps({"type": "counters", "ts": round(time.time(), 3), **counters}, ensure_ascii=False))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+DEFAULT_BUDGET_TOKENS = 6000
+DEFAULT_FULL_DAYS = 14
+CONDENSED_CHARS = 24
+COLUMNS = ["date", "料理", "仕事", "youtube", "やるでき", "人", "反省"]
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[Any]:
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("o200k_base")
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count via tiktoken when installed, otherwise a rough estimate.
+
+    The fallback counts ~1 token per Japanese character and ~4 ASCII characters per token.
+    """
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+def _cell(value: Any, max_chars: Optional[int] = None) -> str:
+    text = " ".join(str(value if value is not None else "").split())
+    if max_chars is not None and len(text) > max_chars:
+        text = text[: max_chars - 1] + "…"
+    return text
+
+
+def _row(diary: Dict[str, Any], max_chars: Optional[int] = None) -> str:
+    return "\t".join(_cell(diary.get(c, ""), None if c == "date" else max_chars) for c in COLUMNS)
+
+
+@dataclass(frozen=True)
+class DiaryBlock:
+    text: str
+    tokens: int
+    full_days: int
+    condensed_days: int
+    omitted_days: int
+
+
+def encode_diaries(
+    diaries: Sequence[Dict[str, Any]],
+    budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+    full_days: int = DEFAULT_FULL_DAYS,
+) -> DiaryBlock:
+    """Tab-separated table (header once, one line per day) that fits ``budget_tokens``.
+
+    The newest ``full_days`` days keep full text, older days are cut to
+    ``CONDENSED_CHARS`` per field, and whatever no longer fits is dropped.
+    """
+    header = "\t".join(COLUMNS)
+    used = estimate_tokens(header) + 1
+    lines: List[str] = []
+    full = condensed = 0
+    # dataclass の生成が import 時間の大半になるので、ここで初めて読み込む
+    from utils.models import DiaryTable
+
+    if isinstance(diaries, DiaryTable):
+        # 既に日付順なので並べ替え不要
+        newest_first = diaries.entries()[::-1]
+    else:
+        newest_first = sorted(diaries, key=lambda x: x.get("date", ""), reverse=True)
+    for i, diary in enumerate(newest_first):
+        line = _row(diary) if i < full_days else _row(diary, CONDENSED_CHARS)
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget_tokens:
+            break
+        used += cost
+        lines.append(line)
+        if i < full_days:
+            full += 1
+        else:
+            condensed += 1
+    omitted = len(newest_first) - len(lines)
+    body = [header] + lines[::-1]
+    if omitted:
+        body.insert(1, f"（これより古い {omitted} 日分は省略）")
+    text = "\n".join(body)
+    return DiaryBlock(text, estimate_tokens(text), full, condensed, omitted)
+
+
+def build_export_prompt(
+    mindmap_text: str,
+    diaries: Sequence[Dict[str, Any]],
+    budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+    full_days: int = DEFAULT_FULL_DAYS,
+    history_builder: Optional[Callable[[Sequence[Dict[str, Any]], int], str]] = None,
+) -> DiaryBlock:
+    """Copy-paste prompt for the AI export page; the budget and ``tokens`` cover the whole prompt.
+
+    ``history_builder(diaries, budget)`` replaces the plain table (e.g. rollups + recent days);
+    the day counts of the result are then left at 0.
+    """
+    template = """#役割
+目標達成までの伴奏してくれるアドバイザーです。
+#命令
+今までのアドバイスをもとにマインドマップを作成し、取り組み始めました。
+昨日までの結果もふくめ、よくできたことを上げたり、もっと効率的にできたことなど気がついたことがあればアドバイスを箇条書きにしてください。
+#文脈
+マインドマップ
+{mindmap}
+日記（タブ区切り・1行1日）
+{diaries}
+"""
+    fixed = estimate_tokens(template.format(mindmap=mindmap_text, diaries=""))
+    if history_builder is not None:
+        text = history_builder(diaries, max(0, budget_tokens - fixed))
+        prompt = template.replace("日記（タブ区切り・1行1日）", "日記").format(mindmap=mindmap_text, diaries=text).strip()
+        return DiaryBlock(prompt, estimate_tokens(prompt), 0, 0, 0)
+    block = encode_diaries(diaries, max(0, budget_tokens - fixed), full_days)
+    prompt = template.format(mindmap=mindmap_text, diaries=block.text).strip()
+    return DiaryBlock(prompt, estimate_tokens(prompt), block.full_days, block.condensed_days, block.omitted_days)
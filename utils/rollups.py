@@ -0,0 +1,197 @@
+import hashlib
+import json
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from utils import perf, storage
+from utils.fileio import write_json_atomic
+from utils.prompting import estimate_tokens, encode_diaries
+
+# (見出し, その期間の日記) -> 要約文。LLM 要約を差し込むときに使う
+Summarizer = Callable[[str, List[Dict[str, Any]]], str]
+
+CONTENT_FIELDS = ["date", "料理", "仕事", "youtube", "やるでき", "人", "反省"]
+
+
+def content_hash(entries: Sequence[Dict[str, Any]]) -> str:
+    # updated_at は内容が同じでも変わるので含めない
+    rows = [[e.get(f, "") for f in CONTENT_FIELDS] for e in sorted(entries, key=lambda x: x.get("date", ""))]
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def week_key(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def month_key(day: date) -> str:
+    return f"{day.year}-{day.month:02d}"
+
+
+def _top(values: List[str], n: int = 3) -> str:
+    counts = Counter(v for v in values if v)
+    return "、".join(f"{v}×{c}" if c > 1 else v for v, c in counts.most_common(n))
+
+
+def extractive_summary(label: str, entries: List[Dict[str, Any]]) -> str:
+    """One-line summary built from the entries themselves (no API call)."""
+    hours = []
+    for e in entries:
+        try:
+            hours.append(float(e.get("youtube") or 0))
+        except (TypeError, ValueError):
+            pass
+    parts = [f"記録 {len(entries)} 日"]
+    if hours:
+        parts.append(f"YouTube 計 {sum(hours):.1f}h（平均 {sum(hours) / len(hours):.1f}h）")
+    for field, name in (("料理", "料理"), ("仕事", "仕事"), ("人", "人"), ("やるでき", "やる/でき")):
+        top = _top([str(e.get(field, "")).strip()[:20] for e in entries])
+        if top:
+            parts.append(f"{name}: {top}")
+    reflections = [str(e.get("反省", "")).strip()[:30] for e in entries if str(e.get("反省", "")).strip()]
+    if reflections:
+        parts.append("反省: " + " / ".join(reflections[:3]))
+    return "・".join(parts)
+
+
+class RollupStore:
+    """Weekly/monthly summaries persisted as JSON, recomputed only when the period's content hash changes."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is None:
+            data: Dict[str, Dict[str, Any]] = {}
+            if self.path.exists():
+                with self.path.open("r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    data = loaded
+            self._data = data
+        return self._data
+
+    def summarize(
+        self,
+        key: str,
+        label: str,
+        entries: List[Dict[str, Any]],
+        summarizer: Optional[Summarizer] = None,
+        save: bool = True,
+    ) -> str:
+        """Cached summary of ``entries`` for ``key``; with ``save=False`` a new one is kept until ``save()``."""
+        digest = content_hash(entries)
+        source = "llm" if summarizer else "extractive"
+        with self._lock:
+            cached = self._load().get(key)
+            hit = bool(cached and cached.get("hash") == digest and cached.get("source") == source)
+            perf.cache("rollups", hit)
+            if hit:
+                return cached["summary"]
+        summary = (summarizer or extractive_summary)(label, entries)
+        with self._lock:
+            self._load()[key] = {"hash": digest, "source": source, "label": label, "summary": summary}
+            self._dirty = True
+        if save:
+            self.save()
+        return summary
+
+    def save(self) -> None:
+        """Write the summaries added since the last save, if any."""
+        with self._lock:
+            if self._dirty:
+                write_json_atomic(self.path, self._load())
+                self._dirty = False
+
+
+_default_store: Optional[RollupStore] = None
+
+
+def default_store() -> RollupStore:
+    """Rollups kept next to the diary data (data/rollups.json)."""
+    global _default_store
+    if _default_store is None:
+        _default_store = RollupStore(storage.DATA_DIR / "rollups.json")
+    return _default_store
+
+
+def _parse(date_str: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(date_str)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_context(
+    store: RollupStore,
+    history: Sequence[Dict[str, Any]],
+    budget_tokens: int,
+    recent_days: int = 7,
+    weeks: int = 8,
+    summarizer: Optional[Summarizer] = None,
+) -> str:
+    """Monthly rollups for old history, weekly rollups for recent weeks, raw rows for the last days.
+
+    Period boundaries are aligned (raw days start on a Monday, weekly rollups start on the
+    1st of a month), so most periods keep the same content hash from one day to the next.
+    """
+    dated = sorted(((d, e) for e in history if (d := _parse(e.get("date", ""))) is not None), key=lambda x: x[0])
+    if not dated:
+        return ""
+    latest = dated[-1][0]
+    raw_start = latest - timedelta(days=recent_days - 1)
+    raw_start -= timedelta(days=raw_start.weekday())
+    weekly_start = (raw_start - timedelta(weeks=weeks)).replace(day=1)
+
+    months: Dict[str, List[Dict[str, Any]]] = {}
+    weekly: Dict[str, List[Dict[str, Any]]] = {}
+    raw: List[Dict[str, Any]] = []
+    for day, entry in dated:
+        if day >= raw_start:
+            raw.append(entry)
+        elif day >= weekly_start:
+            key = week_key(day)
+            if day - timedelta(days=day.weekday()) < weekly_start:
+                # 月初で切れた週は内容が違うので別キーにする
+                key = f"{key}@{weekly_start.isoformat()}"
+            weekly.setdefault(key, []).append(entry)
+        else:
+            months.setdefault(month_key(day), []).append(entry)
+
+    # 新しい要約は最後にまとめて1回だけ書き出す（途中で失敗しても作った分は残す）
+    week_lines = []
+    kept: List[str] = []
+    try:
+        for key, entries in weekly.items():
+            label = f"{key.split('@')[0]}（{entries[0]['date']}〜{entries[-1]['date']}）"
+            week_lines.append(f"{label}: {store.summarize(key, label, entries, summarizer, save=False)}")
+
+        # まとめは予算の半分まで。超える分は古い月から落とす（落とす月は要約もしない）
+        summary_budget = budget_tokens // 2
+        used = sum(estimate_tokens(line) + 1 for line in week_lines)
+        for key in reversed(list(months)):
+            line = f"{key}: {store.summarize(key, key, months[key], summarizer, save=False)}"
+            cost = estimate_tokens(line) + 1
+            if used + cost > summary_budget:
+                break
+            used += cost
+            kept.append(line)
+    finally:
+        store.save()
+    dropped = len(months) - len(kept)
+
+    sections: List[str] = []
+    if kept:
+        note = f"（これより古い {dropped} か月分は省略）\n" if dropped else ""
+        sections.append("## 月ごとのまとめ\n" + note + "\n".join(reversed(kept)))
+    if week_lines:
+        sections.append("## 週ごとのまとめ\n" + "\n".join(week_lines))
+    remaining = max(0, budget_tokens - used)
+    sections.append("## 直近の日記（タブ区切り・1行1日）\n" + encode_diaries(raw, remaining, full_days=len(raw)).text)
+    return "\n\n".join(sections)
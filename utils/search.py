@@ -0,0 +1,127 @@
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def normalize(text: Any) -> str:
+    # 全角英数・全角スペースなどを揃えてから小文字化する
+    return unicodedata.normalize("NFKC", str(text)).lower()
+
+
+def _grams(text: str) -> Set[str]:
+    """Unigrams plus character bigrams, so unsegmented Japanese matches without a tokenizer."""
+    grams = set(text)
+    grams.update(text[i : i + 2] for i in range(len(text) - 1))
+    grams.discard(" ")
+    return grams
+
+
+def _query_grams(term: str) -> Set[str]:
+    if len(term) == 1:
+        return {term}
+    return {term[i : i + 2] for i in range(len(term) - 1)}
+
+
+Term = Tuple[Optional[str], str]
+
+
+def parse_query(query: str, fields: Iterable[str]) -> List[List[Term]]:
+    """OR-separated groups of ANDed ``(field or None, term)`` pairs (see ``SearchIndex``)."""
+    lookup = {normalize(f): f for f in fields}
+    groups: List[List[Term]] = [[]]
+    for token in normalize(query).split():
+        if token in ("or", "|"):
+            groups.append([])
+            continue
+        field: Optional[str] = None
+        name, sep, rest = token.partition(":")
+        if sep and rest and name in lookup:
+            field, token = lookup[name], rest
+        groups[-1].append((field, token))
+    return [g for g in groups if g]
+
+
+def matches(entry: Dict[str, Any], groups: List[List[Term]], fields: Iterable[str]) -> bool:
+    """Whether ``entry`` satisfies any group by plain substring match."""
+    texts = {f: normalize(entry.get(f, "")) for f in fields}
+    return any(
+        all(term in texts[field] if field else any(term in t for t in texts.values()) for field, term in group)
+        for group in groups
+    )
+
+
+class SearchIndex:
+    """Inverted index of (field, gram) -> dates, maintained incrementally on upsert.
+
+    Query syntax: whitespace-separated terms are ANDed, ``OR`` (or ``|``) separates
+    alternatives, and ``field:term`` (e.g. ``人:石田``) restricts a term to one field.
+    Candidates from the postings are verified by substring match, so results are the
+    same as a plain ``in`` check.
+    """
+
+    def __init__(self, fields: Iterable[str]) -> None:
+        self.fields = list(fields)
+        self._postings: Dict[Tuple[str, str], Set[str]] = {}
+        self._texts: Dict[str, Dict[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        date_str = entry.get("date", "")
+        self.remove(date_str)
+        texts: Dict[str, str] = {}
+        for field in self.fields:
+            text = normalize(entry.get(field, ""))
+            texts[field] = text
+            for gram in _grams(text):
+                self._postings.setdefault((field, gram), set()).add(date_str)
+        self._texts[date_str] = texts
+
+    def remove(self, date_str: str) -> None:
+        texts = self._texts.pop(date_str, None)
+        if texts is None:
+            return
+        for field, text in texts.items():
+            for gram in _grams(text):
+                dates = self._postings.get((field, gram))
+                if dates is None:
+                    continue
+                dates.discard(date_str)
+                if not dates:
+                    del self._postings[(field, gram)]
+
+    def parse(self, query: str) -> List[List[Term]]:
+        return parse_query(query, self.fields)
+
+    def _match_term(self, field: Optional[str], term: str) -> Dict[str, int]:
+        hits: Dict[str, int] = {}
+        for f in [field] if field else self.fields:
+            candidates: Optional[Set[str]] = None
+            for gram in _query_grams(term):
+                dates = self._postings.get((f, gram))
+                if not dates:
+                    candidates = set()
+                    break
+                candidates = set(dates) if candidates is None else candidates & dates
+            for date_str in candidates or ():
+                count = self._texts[date_str][f].count(term)
+                if count:
+                    hits[date_str] = hits.get(date_str, 0) + count
+        return hits
+
+    def search(self, query: str) -> List[str]:
+        """Return matching dates ranked by hit count, then newest first."""
+        scores: Dict[str, int] = {}
+        for group in self.parse(query):
+            group_hits: Optional[Dict[str, int]] = None
+            for field, term in group:
+                hits = self._match_term(field, term)
+                if group_hits is None:
+                    group_hits = hits
+                else:
+                    group_hits = {d: group_hits[d] + n for d, n in hits.items() if d in group_hits}
+                if not group_hits:
+                    break
+            for date_str, n in (group_hits or {}).items():
+                scores[date_str] = max(scores.get(date_str, 0), n)
+        return sorted(scores, key=lambda d: (scores[d], d), reverse=True)
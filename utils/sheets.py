@@ -0,0 +1,388 @@
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils import perf
+from utils.fileio import write_json_atomic
+from utils.models import iso_date
+from utils.sync import timestamp
+
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+# サービスアカウントのアクセストークンは1時間で失効するので、少し手前で認証し直す
+TOKEN_TTL_SECONDS = 50 * 60
+# 他端末からの手編集に追従するため、日付→行番号の対応表はこの間隔でA列から取り直す
+ROW_MAP_TTL_SECONDS = 60
+# ミラーの差分確認は画面の再実行ごとには行わず、この間隔をあける
+MIRROR_CHECK_SECONDS = 5
+# 削除や updated_at を変えない手編集を拾うため、この間隔で全件を読み直す
+MIRROR_FULL_SECONDS = 10 * 60
+
+_UPDATED_RANGE_RE = re.compile(r"![A-Z]+(\d+)")
+
+
+def _column_letter(n: int) -> str:
+    return chr(ord("A") + n - 1)
+
+
+def date_key(value: Any) -> str:
+    """A date cell as ``YYYY-MM-DD``; USER_ENTERED shows dates as 2025/11/20, callers use ISO."""
+    try:
+        return iso_date(value)
+    except ValueError:
+        return str(value)
+
+
+class SheetConnection:
+    """Pooled client + worksheet handle, with a cached date -> row-number map."""
+
+    def __init__(self, client: Any, worksheet: Any, headers: List[str]) -> None:
+        self.client = client
+        self.worksheet = worksheet
+        self.headers = headers
+        self.created_at = time.monotonic()
+        self.header_checked = False
+        self.lock = threading.RLock()
+        self._row_map: Optional[Dict[str, int]] = None
+        self._row_map_at = 0.0
+
+    def expired(self) -> bool:
+        if self.client is None:
+            # install() で差し込んだワークシート（テスト用の偽物など）は失効させない
+            return False
+        if time.monotonic() - self.created_at > TOKEN_TTL_SECONDS:
+            return True
+        http_client = getattr(self.client, "http_client", None)
+        creds = getattr(http_client, "auth", None) or getattr(self.client, "auth", None)
+        return bool(getattr(creds, "expired", False))
+
+    def row_map(self, refresh: bool = False) -> Dict[str, int]:
+        """Return ISO date -> 1-based row number, fetched from column A only."""
+        with self.lock:
+            stale = time.monotonic() - self._row_map_at > ROW_MAP_TTL_SECONDS
+            hit = not (refresh or stale or self._row_map is None)
+            perf.cache("sheets.row_map", hit)
+            if not hit:
+                perf.count("sheets.api")
+                column = self.worksheet.col_values(1)
+                self._row_map = {date_key(v): i + 1 for i, v in enumerate(column) if i > 0 and v != ""}
+                self._row_map_at = time.monotonic()
+            return self._row_map
+
+    def remember_rows(self, row_map: Dict[str, int]) -> None:
+        """Adopt a date -> row map read elsewhere (e.g. by ``SheetMirror``) as fresh."""
+        with self.lock:
+            self._row_map = row_map
+            self._row_map_at = time.monotonic()
+
+    def fetch_rows(self, dates: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Read only the rows for ``dates`` (one batch_get), keyed by ISO date."""
+        with self.lock:
+            row_map = self.row_map()
+            keys = dict.fromkeys(date_key(d) for d in dates)
+            targets = [(d, row_map[d]) for d in keys if d in row_map]
+            if not targets:
+                return {}
+            last_col = _column_letter(len(self.headers))
+            ranges = [f"A{row}:{last_col}{row}" for _, row in targets]
+            result: Dict[str, Dict[str, Any]] = {}
+            perf.count("sheets.api")
+            for (date_str, _), values in zip(targets, self.worksheet.batch_get(ranges)):
+                cells = values[0] if values else []
+                record = {h: (cells[i] if i < len(cells) else "") for i, h in enumerate(self.headers)}
+                if date_key(record.get("date", "")) == date_str:
+                    result[date_str] = record
+                else:
+                    # 行がずれている（手で並べ替えられた等）ので次回は対応表を取り直す
+                    self._row_map = None
+            return result
+
+    def upsert_rows(self, entries: List[Dict[str, Any]]) -> None:
+        """Write entries with one batch_update for existing dates and one append for new ones."""
+        pending: Dict[str, List[Any]] = {}
+        for entry in entries:
+            # 同じ日付が複数あれば最後のものを採用する
+            pending[date_key(entry["date"])] = [entry.get(h, "") for h in self.headers]
+        if not pending:
+            return
+        last_col = _column_letter(len(self.headers))
+        with self.lock:
+            row_map = self.row_map()
+            updates = []
+            appends = []
+            for date_str, values in pending.items():
+                row = row_map.get(date_str)
+                if row is None:
+                    appends.append(values)
+                else:
+                    updates.append({"range": f"A{row}:{last_col}{row}", "values": [values]})
+            if updates:
+                perf.count("sheets.api")
+                self.worksheet.batch_update(updates)
+            if appends:
+                # 先頭への挿入は下の行を全てずらすので、末尾に追記する
+                perf.count("sheets.api")
+                resp = self.worksheet.append_rows(appends, value_input_option="USER_ENTERED", table_range="A1")
+                match = _UPDATED_RANGE_RE.search(str((resp or {}).get("updates", {}).get("updatedRange", "")))
+                if match is None:
+                    self._row_map = None
+                else:
+                    start = int(match.group(1))
+                    for offset, values in enumerate(appends):
+                        row_map[date_key(values[0])] = start + offset
+
+
+@dataclass
+class MirrorDelta:
+    """What one ``SheetMirror.pull`` changed; ``full`` means every row was replaced."""
+
+    changed: List[Dict[str, Any]] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    full: bool = False
+
+
+def _first_cell(row: List[Any]) -> str:
+    return str(row[0]) if row else ""
+
+
+class SheetMirror:
+    """Local copy of one sheet, keyed by ``key`` (the date column, as ISO dates), kept current with small reads.
+
+    A delta pull reads only the ``key`` column and the ``stamp`` column in one batch_get,
+    then fetches just the rows whose stamp differs from the mirror (new or edited since
+    the last pull) with one more. Dates gone from the date column are dropped. Every
+    ``full_every`` seconds the whole sheet is read again to catch hand edits that left
+    the stamp alone. The mirror is saved to ``path`` so a restart starts from it.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        source: str,
+        key: str = "date",
+        stamp: str = "updated_at",
+        check_every: float = MIRROR_CHECK_SECONDS,
+        full_every: float = MIRROR_FULL_SECONDS,
+    ) -> None:
+        self.path = path
+        self.source = source
+        self.key = key
+        self.stamp = stamp
+        self.check_every = check_every
+        self.full_every = full_every
+        self.watermark = ""
+        self.reconciled_at = 0.0
+        self._records: Optional[Dict[str, Dict[str, Any]]] = None
+        self._checked_at = 0.0
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+                perf.add_bytes(read=f.tell())
+            if data.get("source") != self.source:
+                # 別のシートのミラーは使わない
+                return
+            self._records = {date_key(r[self.key]): r for r in data["rows"]}
+            self.watermark = str(data.get("watermark", ""))
+            self.reconciled_at = float(data.get("reconciled_at", 0.0))
+        except (FileNotFoundError, ValueError, KeyError, TypeError, IndexError):
+            # 無い・壊れている場合は次の pull で全件を読み直す
+            self._records = None
+
+    def _save(self) -> None:
+        write_json_atomic(
+            self.path,
+            {
+                "source": self.source,
+                "watermark": self.watermark,
+                "reconciled_at": self.reconciled_at,
+                "rows": list((self._records or {}).values()),
+            },
+        )
+
+    def _bump(self, record: Dict[str, Any]) -> None:
+        # USER_ENTERED の整形（2026/10/18 9:05:00 など）に左右されないよう日時として比べる
+        stamp = timestamp(record.get(self.stamp))
+        if stamp != datetime.min and stamp > timestamp(self.watermark):
+            self.watermark = stamp.strftime("%Y-%m-%d %H:%M")
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            return list((self._records or {}).values())
+
+    def put(self, records: List[Dict[str, Any]]) -> None:
+        """Record rows this process just wrote, so the next pull does not read them back.
+
+        The file is rewritten with the next pull rather than on every write; after a
+        restart a row missing from the file is simply fetched again.
+        """
+        with self._lock:
+            self._load()
+            if self._records is None:
+                return
+            for record in records:
+                self._records[date_key(record[self.key])] = record
+                self._bump(record)
+                self._dirty = True
+
+    def expire(self) -> None:
+        """Make the next ``pull`` check the sheet instead of waiting for ``check_every``."""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def pull(self, conn: SheetConnection, full: bool = False) -> MirrorDelta:
+        with self._lock:
+            self._load()
+            now = time.time()
+            if full or self._records is None or now - self.reconciled_at > self.full_every:
+                return self._pull_all(conn, now)
+            if time.monotonic() - self._checked_at < self.check_every:
+                return MirrorDelta()
+            return self._pull_changed(conn)
+
+    def _pull_all(self, conn: SheetConnection, now: float) -> MirrorDelta:
+        perf.count("sheets.api")
+        rows = conn.worksheet.get_all_records()
+        records: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            value = row.get(self.key, "")
+            if value != "":
+                records[date_key(value)] = {h: row.get(h, "") for h in conn.headers}
+        removed = [key for key in self._records or {} if key not in records]
+        self._records = records
+        self.watermark = ""
+        for record in records.values():
+            self._bump(record)
+        self.reconciled_at = now
+        self._checked_at = time.monotonic()
+        self._save()
+        self._dirty = False
+        return MirrorDelta(list(records.values()), removed, True)
+
+    def _pull_changed(self, conn: SheetConnection) -> MirrorDelta:
+        records = self._records if self._records is not None else {}
+        key_col = _column_letter(conn.headers.index(self.key) + 1)
+        stamp_col = _column_letter(conn.headers.index(self.stamp) + 1)
+        perf.count("sheets.api")
+        keys_col, stamps_col = conn.worksheet.batch_get([f"{key_col}:{key_col}", f"{stamp_col}:{stamp_col}"])
+        row_map: Dict[str, int] = {}
+        stale: List[str] = []
+        for i, row in enumerate(keys_col):
+            key = _first_cell(row)
+            if i == 0 or not key:
+                continue
+            key = date_key(key)
+            row_map[key] = i + 1
+            stamp = _first_cell(stamps_col[i]) if i < len(stamps_col) else ""
+            current = records.get(key)
+            if current is None or str(current.get(self.stamp, "")) != stamp:
+                stale.append(key)
+        if key_col == "A":
+            # 読んだA列は書き込み時の行番号としてもそのまま使える
+            conn.remember_rows(row_map)
+        delta = MirrorDelta(removed=[key for key in records if key not in row_map])
+        for key in delta.removed:
+            del records[key]
+        if stale:
+            fetched = conn.fetch_rows(stale)
+            for key in stale:
+                record = fetched.get(key)
+                if record is not None:
+                    records[key] = record
+                    self._bump(record)
+                    delta.changed.append(record)
+        self._checked_at = time.monotonic()
+        if delta.changed or delta.removed or self._dirty:
+            self._save()
+            self._dirty = False
+        return delta
+
+
+_LOCK = threading.Lock()
+_connections: Dict[str, SheetConnection] = {}
+
+
+def _authorize(creds_json: Dict[str, Any]) -> Any:
+    import gspread  # type: ignore
+
+    return gspread.service_account_from_dict(creds_json, scopes=SCOPES)
+
+
+def _header_range(headers: List[str]) -> str:
+    return f"A1:{_column_letter(len(headers))}1"
+
+
+def ensure_header(ws: Any, headers: List[str]) -> None:
+    # シート全体ではなく1行目だけを取得する
+    perf.count("sheets.api")
+    first_row = ws.row_values(1)
+    if not first_row:
+        perf.count("sheets.api")
+        ws.append_row(headers)
+        return
+    if first_row != headers:
+        perf.count("sheets.api")
+        ws.update(_header_range(headers), [headers])
+
+
+def pooled(sheet_key: str) -> Optional[SheetConnection]:
+    """Return the live pooled connection for ``sheet_key`` without authorizing."""
+    with _LOCK:
+        conn = _connections.get(sheet_key)
+        if conn is None or conn.expired() or not conn.header_checked:
+            return None
+        return conn
+
+
+def connection(sheet_key: str, creds_json: Dict[str, Any], headers: List[str]) -> SheetConnection:
+    """Return the pooled connection for ``sheet_key``, authorizing only when needed.
+
+    The client and worksheet handle are shared by every session in the process until
+    the token TTL passes; the header row is validated once per handle.
+    """
+    with _LOCK:
+        conn = _connections.get(sheet_key)
+        if conn is None or conn.expired():
+            client = _authorize(creds_json)
+            conn = SheetConnection(client, client.open_by_key(sheet_key).sheet1, headers)
+            _connections[sheet_key] = conn
+        if not conn.header_checked:
+            ensure_header(conn.worksheet, headers)
+            conn.header_checked = True
+        return conn
+
+
+def install(sheet_key: str, worksheet: Any, headers: List[str]) -> SheetConnection:
+    """Register ``worksheet`` (e.g. ``FakeWorksheet``) as the pooled handle for ``sheet_key``."""
+    conn = SheetConnection(None, worksheet, headers)
+    with _LOCK:
+        ensure_header(worksheet, headers)
+        conn.header_checked = True
+        _connections[sheet_key] = conn
+    return conn
+
+
+def reset(sheet_key: Optional[str] = None) -> None:
+    """Drop pooled connections so the next call re-authorizes (e.g. after an API error)."""
+    with _LOCK:
+        for key in list(_connections) if sheet_key is None else [sheet_key]:
+            conn = _connections.get(key)
+            if conn is None:
+                continue
+            if conn.client is None:
+                # install() したワークシートは残し、行番号の対応表だけ取り直す
+                conn._row_map = None
+            else:
+                del _connections[key]
@@ -0,0 +1,235 @@
+import hashlib
+import sqlite3
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+from utils.models import DiaryEntry, EntryLike
+from utils.search import Term, matches, normalize, parse_query
+
+# シートと同じ日本語キー → SQLite の列名
+COLUMNS = {
+    "date": "date",
+    "料理": "cooking",
+    "仕事": "work",
+    "youtube": "youtube",
+    "やるでき": "yarudeki",
+    "人": "person",
+    "反省": "reflection",
+    "updated_at": "updated_at",
+}
+# date は結合用に UNINDEXED で持つので、検索用の列は別名にする
+FTS_COLUMNS = {**{k: v for k, v in COLUMNS.items() if k != "updated_at"}, "date": "date_text"}
+_DATE_MAX = "9999-12-31"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diaries (
+    date TEXT PRIMARY KEY,
+    cooking TEXT NOT NULL DEFAULT '',
+    work TEXT NOT NULL DEFAULT '',
+    youtube REAL NOT NULL DEFAULT 0,
+    yarudeki TEXT NOT NULL DEFAULT '',
+    person TEXT NOT NULL DEFAULT '',
+    reflection TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT ''
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS diaries_fts USING fts5(
+    date UNINDEXED, date_text, cooking, work, youtube, yarudeki, person, reflection
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _fts_rowid(date_str: str) -> int:
+    # 日付から一意な rowid を作り、更新時の削除を rowid 検索で済ませる
+    try:
+        return date.fromisoformat(date_str).toordinal()
+    except ValueError:
+        return int(hashlib.sha1(date_str.encode("utf-8")).hexdigest()[:15], 16)
+
+
+def _hex(text: str) -> str:
+    return text.encode("utf-8").hex()
+
+
+def _fts_text(value: Any) -> str:
+    """Encode text as hex bigram tokens (plus the last character) for the FTS table.
+
+    unicode61 cannot segment Japanese, so each bigram becomes one alphanumeric token;
+    a substring query is then a phrase of consecutive bigram tokens.
+    """
+    text = normalize(value)
+    if not text:
+        return ""
+    tokens = [_hex(text[i : i + 2]) for i in range(len(text) - 1)]
+    tokens.append(_hex(text[-1]))
+    return " ".join(tokens)
+
+
+def _fts_term(term: str) -> str:
+    if len(term) == 1:
+        # 1文字はその文字で始まるバイグラムへの前方一致で探す
+        return f'"{_hex(term)}"*'
+    return '"' + " ".join(_hex(term[i : i + 2]) for i in range(len(term) - 1)) + '"'
+
+
+def _fts_match(groups: List[List[Term]]) -> str:
+    clauses = []
+    for group in groups:
+        terms = []
+        for field, term in group:
+            match = _fts_term(term)
+            terms.append(f"{FTS_COLUMNS[field]} : {match}" if field else match)
+        clauses.append("(" + " AND ".join(terms) + ")")
+    return " OR ".join(clauses)
+
+
+class SqliteStore:
+    """SQLite diary store: ``date`` primary key, FTS5 over text fields, WAL for readers."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_entry(row: sqlite3.Row) -> DiaryEntry:
+        # 列は NOT NULL で型も揃っているので、そのまま並び順どおりに渡す
+        return DiaryEntry(*(row[col] for col in COLUMNS.values()))
+
+    @staticmethod
+    def _to_params(entry: EntryLike) -> List[Any]:
+        params: List[Any] = []
+        for key in COLUMNS:
+            value = entry.get(key, "")
+            if key == "youtube":
+                try:
+                    value = float(value or 0)
+                except (TypeError, ValueError):
+                    value = 0.0
+            params.append(value if value is not None else "")
+        return params
+
+    def _write(self, conn: sqlite3.Connection, entry: EntryLike) -> None:
+        cols = ", ".join(COLUMNS.values())
+        marks = ", ".join("?" for _ in COLUMNS)
+        conn.execute(f"INSERT OR REPLACE INTO diaries ({cols}) VALUES ({marks})", self._to_params(entry))
+        rowid = _fts_rowid(entry["date"])
+        conn.execute("DELETE FROM diaries_fts WHERE rowid = ?", (rowid,))
+        fts_cols = ", ".join(FTS_COLUMNS.values())
+        conn.execute(
+            f"INSERT INTO diaries_fts (rowid, date, {fts_cols}) VALUES (?, ?, {', '.join('?' for _ in FTS_COLUMNS)})",
+            [rowid, entry["date"]] + [_fts_text(entry.get(key, "")) for key in FTS_COLUMNS],
+        )
+
+    def upsert_many(self, entries: Iterable[EntryLike]) -> None:
+        with self._write_lock, self._conn() as conn:
+            for entry in entries:
+                self._write(conn, entry)
+
+    def upsert(self, entry: EntryLike) -> None:
+        self.upsert_many([entry])
+
+    def replace_all(self, entries: Iterable[EntryLike]) -> None:
+        with self._write_lock, self._conn() as conn:
+            conn.execute("DELETE FROM diaries")
+            conn.execute("DELETE FROM diaries_fts")
+            for entry in entries:
+                self._write(conn, entry)
+
+    def get(self, date_str: str) -> Optional[DiaryEntry]:
+        row = self._conn().execute("SELECT * FROM diaries WHERE date = ?", (date_str,)).fetchone()
+        return self._to_entry(row) if row else None
+
+    def range(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        descending: bool = False,
+    ) -> List[DiaryEntry]:
+        """Entries with ``start <= date <= end`` (either bound optional), via the primary key."""
+        sql = "SELECT * FROM diaries WHERE date >= ? AND date <= ?"
+        sql += " ORDER BY date DESC" if descending else " ORDER BY date"
+        params: List[Any] = [start or "", end or _DATE_MAX]
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return [self._to_entry(r) for r in self._conn().execute(sql, params)]
+
+    def dates(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT date FROM diaries")]
+
+    def count(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM diaries WHERE date >= ? AND date <= ?", (start or "", end or _DATE_MAX)
+        ).fetchone()
+        return int(row[0])
+
+    def all(self) -> List[DiaryEntry]:
+        return self.range()
+
+    def _search_sql(
+        self, select: str, query: str, fields: List[str], start: Optional[str], end: Optional[str]
+    ) -> Tuple[str, List[Any], List[List[Term]]]:
+        groups = parse_query(query, fields)
+        sql = (
+            f"SELECT {select} FROM diaries_fts f JOIN diaries d ON d.date = f.date"
+            " WHERE diaries_fts MATCH ? AND d.date >= ? AND d.date <= ?"
+        )
+        return sql, [_fts_match(groups), start or "", end or _DATE_MAX], groups
+
+    def search(
+        self,
+        query: str,
+        fields: List[str],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[DiaryEntry]:
+        """Entries matching ``query``, ranked by FTS5 bm25 and then newest first, one page at a time.
+
+        The bigram phrases already match substrings, so only the returned rows are checked
+        against the plain ``in`` match the JSON backends use.
+        """
+        sql, params, groups = self._search_sql("d.*", query, fields, start, end)
+        if not groups:
+            return []
+        sql += " ORDER BY f.rank, d.date DESC"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        entries = [self._to_entry(r) for r in self._conn().execute(sql, params)]
+        return [e for e in entries if matches(e, groups, fields)]
+
+    def search_count(
+        self, query: str, fields: List[str], start: Optional[str] = None, end: Optional[str] = None
+    ) -> int:
+        sql, params, groups = self._search_sql("COUNT(*)", query, fields, start, end)
+        if not groups:
+            return 0
+        return int(self._conn().execute(sql, params).fetchone()[0])
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._write_lock, self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
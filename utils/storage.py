@@ -1,100 +1,553 @@
+import bisect
 import json
+import os
+import threading
+from dataclasses import replace
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 try:
     import streamlit as st
 except ImportError:  # pragma: no cover - only for non-streamlit contexts
     st = None  # type: ignore
 
+from utils import perf, sheets, sync
+from utils.coverage import Coverage
+from utils.fileio import write_json_atomic
+from utils.mindmap import MindmapHistory
+from utils.models import DiaryEntry, DiaryTable, EntryLike, iso_date
+from utils.search import SearchIndex
+from utils.sync import Outbox, SyncWorker
+
+if TYPE_CHECKING:
+    from utils.sqlite_store import SqliteStore
+
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 DIARY_FILE = DATA_DIR / "diaries.json"
 MINDMAP_FILE = DATA_DIR / "mindmap.json"
-
-SHEETS_CONFIG = {}
-if st is not None:
-    SHEETS_CONFIG = st.secrets.get("gcp", {})  # type: ignore[attr-defined]
-SHEET_KEY = SHEETS_CONFIG.get("sheet_key") or SHEETS_CONFIG.get("sheet_id")
-SHEETS_ENABLED = bool(SHEET_KEY)
+MINDMAP_HISTORY_FILE = DATA_DIR / "mindmap_history.jsonl"
+JOURNAL_FILE = DATA_DIR / "diaries.jsonl"
+OUTBOX_FILE = DATA_DIR / "sheets_outbox.json"
+MIRROR_FILE = DATA_DIR / "sheets_mirror.json"
+SQLITE_FILE = DATA_DIR / "diary.sqlite3"
 
 HEADERS = ["date", "料理", "仕事", "youtube", "やるでき", "人", "反省", "updated_at"]
+SEARCH_FIELDS = [h for h in HEADERS if h != "updated_at"]
+
+# 以下は secrets から初回利用時に決まる（_configure）。import 時には読まない
+_CONFIG_NAMES = (
+    "SHEETS_CONFIG",
+    "STORAGE_CONFIG",
+    "SHEET_KEY",
+    "SHEETS_ENABLED",
+    "SHEETS_SYNC_MODE",
+    "SHEETS_DIRECT",
+    "SHEETS_WRITE_BEHIND",
+    "STORAGE_BACKEND",
+    "JOURNAL_ENABLED",
+    "SQLITE_ENABLED",
+    "JOURNAL_COMPACT_BYTES",
+)
+_configured = False
+
+
+def _secret_section(name: str) -> Any:
+    if st is None:
+        return {}
+    try:
+        return st.secrets.get(name, {})  # type: ignore[attr-defined]
+    except FileNotFoundError:
+        # secrets.toml が無い（ローカル JSON だけで使う）場合
+        return {}
+
+
+def _configure() -> None:
+    """Resolve the settings below from ``st.secrets`` once; names already set on the module win."""
+    global _configured
+    if _configured:
+        return
+    with _LOCK:
+        if _configured:
+            return
+        g = globals()
+        sheets_config = g.setdefault("SHEETS_CONFIG", _secret_section("gcp"))
+        storage_config = g.setdefault("STORAGE_CONFIG", _secret_section("storage"))
+        sheet_key = g.setdefault("SHEET_KEY", sheets_config.get("sheet_key") or sheets_config.get("sheet_id"))
+        enabled = g.setdefault("SHEETS_ENABLED", bool(sheet_key))
+        # "direct": 毎回 Sheets を読み書きする / "write_behind": ローカル保存を正とし、裏で Sheets へ送る
+        mode = g.setdefault("SHEETS_SYNC_MODE", sheets_config.get("sync", "direct"))
+        direct = g.setdefault("SHEETS_DIRECT", enabled and mode != "write_behind")
+        g.setdefault("SHEETS_WRITE_BEHIND", enabled and not direct)
+        # "json": diaries.json を毎回丸ごと書き換える / "journal": diaries.jsonl へ追記し、閾値超過で diaries.json へ畳み込む
+        # "sqlite": diary.sqlite3（初回に diaries.json から自動移行）
+        backend = g.setdefault("STORAGE_BACKEND", storage_config.get("backend", "json"))
+        g.setdefault("JOURNAL_ENABLED", backend == "journal")
+        g.setdefault("SQLITE_ENABLED", backend == "sqlite")
+        g.setdefault("JOURNAL_COMPACT_BYTES", int(storage_config.get("journal_compact_bytes", 256 * 1024)))
+        _configured = True
+
+
+def __getattr__(name: str) -> Any:
+    # storage.SHEETS_ENABLED のような外からの参照も初回に設定を読む
+    if name in _CONFIG_NAMES:
+        _configure()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class StorageError(Exception):
     """Raised when persistence failed."""
 
 
-def _now_str() -> str:
-    return datetime.now().strftime("%Y-%m-%d %H:%M")
+_LOCK = threading.RLock()
+_compaction_thread: Optional[threading.Thread] = None
+_sync_worker_instance: Optional[SyncWorker] = None
+_sqlite_store: Optional["SqliteStore"] = None
+_sqlite_coverage: Optional[Coverage] = None
+_sqlite_table: Optional[DiaryTable] = None
+# シートのミラーは通信を挟むので、ローカル用の _LOCK とは別のロックで守る
+_SHEET_LOCK = threading.RLock()
+_sheet_mirror: Optional[sheets.SheetMirror] = None
+_sheet_cache: Optional["_DiaryCache"] = None
+_mindmap_history: Optional[MindmapHistory] = None
+_listeners: List[Callable[[Optional[DiaryEntry]], None]] = []
+
+
+def subscribe(listener: Callable[[Optional[DiaryEntry]], None]) -> Callable[[], None]:
+    """Call ``listener(entry)`` after each saved or synced diary, ``listener(None)`` after a bulk save.
 
+    Returns a function that removes the listener.
+    """
+    with _LOCK:
+        _listeners.append(listener)
 
-def load_diaries() -> List[Dict[str, Any]]:
-    if SHEETS_ENABLED:
+    def unsubscribe() -> None:
+        with _LOCK:
+            if listener in _listeners:
+                _listeners.remove(listener)
+
+    return unsubscribe
+
+
+def _notify(entry: Optional[DiaryEntry]) -> None:
+    with _LOCK:
+        listeners = list(_listeners)
+    for listener in listeners:
         try:
-            return _load_diaries_from_sheet()
-        except Exception as exc:  # pragma: no cover - Google Sheets optional
-            raise StorageError(f"Google Sheets からの読み込みに失敗しました: {exc}") from exc
+            listener(entry)
+        except Exception:  # pragma: no cover - 集計側の失敗で保存を失敗扱いにしない
+            pass
+
 
+def _now_str() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M")
+
+
+def _read_snapshot() -> List[Dict[str, Any]]:
     if not DIARY_FILE.exists():
         return []
+    with DIARY_FILE.open("r", encoding="utf-8") as f:
+        diaries = json.load(f)
+        if perf.ENABLED:
+            perf.add_bytes(read=f.tell())
+    return diaries if isinstance(diaries, list) else []
+
+
+def _replay_journal(by_date: Dict[str, Dict[str, Any]]) -> None:
+    """Apply journal records on top of ``by_date``; the last record for a date wins."""
+    if not JOURNAL_FILE.exists():
+        return
+    with JOURNAL_FILE.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 追記中に中断された末尾行は読み飛ばす
+                continue
+            if isinstance(record, dict) and record.get("date"):
+                by_date[record["date"]] = record
+        if perf.ENABLED:
+            perf.add_bytes(read=f.tell())
+
+
+def _load_journaled() -> List[Dict[str, Any]]:
+    with _LOCK:
+        by_date = {d.get("date", ""): d for d in _read_snapshot()}
+        _replay_journal(by_date)
+    return list(by_date.values())
+
+
+def _append_journal(entry: Dict[str, Any]) -> None:
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    with _LOCK:
+        JOURNAL_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with JOURNAL_FILE.open("a+b") as f:
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # 前回の追記が途中で切れていた場合、その行と混ざらないよう改行を補う
+                    f.write(b"\n")
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+    perf.add_bytes(written=len(line))
+
+
+class _DiaryCache:
+    """Process-wide view of the local diaries, validated by file mtime/size."""
+
+    def __init__(self) -> None:
+        self.signature: Optional[tuple] = None
+        self.table = DiaryTable()
+        self._coverage: Optional[Coverage] = None
+        self._index: Optional[SearchIndex] = None
+
+    @property
+    def dates(self) -> List[str]:
+        return self.table.dates
+
+    @property
+    def index(self) -> SearchIndex:
+        # 検索されるまでは索引を作らない
+        if self._index is None:
+            index = SearchIndex(SEARCH_FIELDS)
+            for entry in self.table:
+                index.add(entry)
+            self._index = index
+        return self._index
+
+    @property
+    def coverage(self) -> Coverage:
+        if self._coverage is None:
+            self._coverage = Coverage.from_dates(self.dates)
+        return self._coverage
+
+    def reset(self, diaries: Union[DiaryTable, Sequence[EntryLike]], signature: Optional[tuple]) -> None:
+        # 型の変換と日付順の並べ替えは読み込み時の一度だけ
+        self.table = diaries if isinstance(diaries, DiaryTable) else DiaryTable.from_entries(diaries)
+        self._coverage = None
+        self._index = None
+        self.signature = signature
+
+    def put(self, entry: DiaryEntry) -> None:
+        self.table.upsert(entry)
+        if self._coverage is not None:
+            self._coverage.add(entry.date)
+        if self._index is not None:
+            self._index.add(entry)
+
+    def discard(self, date_str: str) -> None:
+        self.table.discard(date_str)
+        if self._coverage is not None:
+            self._coverage.discard(date_str)
+        if self._index is not None:
+            self._index.remove(date_str)
+
+
+_cache = _DiaryCache()
+
+
+def _file_signature(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _local_signature() -> tuple:
+    return (_file_signature(DIARY_FILE), _file_signature(JOURNAL_FILE) if JOURNAL_ENABLED else None)
+
+
+def _local_cache() -> _DiaryCache:
+    with _LOCK:
+        signature = _local_signature()
+        perf.cache("storage.local", _cache.signature == signature)
+        if _cache.signature != signature:
+            _cache.reset(_load_journaled() if JOURNAL_ENABLED else _read_snapshot(), signature)
+        return _cache
+
+
+def invalidate_cache() -> None:
+    global _sqlite_table
+    with _LOCK:
+        _cache.signature = None
+        _sqlite_table = None
+    with _SHEET_LOCK:
+        if _sheet_mirror is not None:
+            _sheet_mirror.expire()
+
+
+@perf.timed()
+def compact_journal() -> None:
+    """Fold the journal into the diaries.json snapshot and truncate it."""
+    _configure()
+    with _LOCK:
+        if not JOURNAL_FILE.exists():
+            return
+        before = _local_signature()
+        diaries = sorted(_load_journaled(), key=lambda x: x.get("date", ""))
+        write_json_atomic(DIARY_FILE, diaries)
+        # スナップショット置換後に落ちても、ジャーナルの再適用は冪等なので問題ない
+        JOURNAL_FILE.unlink()
+        if _cache.signature == before:
+            # 内容は変わらないので、キャッシュは読み直さずにシグネチャだけ更新する
+            _cache.signature = _local_signature()
+
+
+def _run_compaction() -> None:
+    try:
+        compact_journal()
+    except Exception:  # pragma: no cover - 次回の追記時に再試行される
+        pass
+
+
+def _maybe_compact_journal() -> None:
+    global _compaction_thread
+    try:
+        size = JOURNAL_FILE.stat().st_size
+    except FileNotFoundError:
+        return
+    if size < JOURNAL_COMPACT_BYTES:
+        return
+    with _LOCK:
+        if _compaction_thread is not None and _compaction_thread.is_alive():
+            return
+        _compaction_thread = threading.Thread(target=_run_compaction, name="diary-journal-compaction", daemon=True)
+        _compaction_thread.start()
+
+
+def _sqlite() -> "SqliteStore":
+    global _sqlite_store
+    with _LOCK:
+        if _sqlite_store is None:
+            # sqlite3 はこのバックエンドを使うときだけ読み込む
+            from utils.sqlite_store import SqliteStore
+
+            store = SqliteStore(SQLITE_FILE)
+            if store.get_meta("migrated_from_json") is None:
+                migrate_to_sqlite(store)
+            _sqlite_store = store
+        return _sqlite_store
+
+
+@perf.timed()
+def migrate_to_sqlite(store: "SqliteStore") -> int:
+    """One-shot copy of diaries.json (+ journal) and mindmap.json into ``store``."""
+    with _LOCK:
+        diaries = _load_journaled()
+        store.upsert_many(diaries)
+        if MINDMAP_FILE.exists():
+            with MINDMAP_FILE.open("r", encoding="utf-8") as f:
+                store.set_meta("mindmap", f.read())
+        store.set_meta("migrated_from_json", _now_str())
+    return len(diaries)
+
+
+@perf.timed()
+def load_diaries() -> List[DiaryEntry]:
+    _configure()
+    if SHEETS_DIRECT:
+        with _SHEET_LOCK:
+            return _sheet_view().table.entries()[::-1]
+
+    if SHEETS_WRITE_BEHIND:
+        _sync_worker()
+    try:
+        if SQLITE_ENABLED:
+            return _sqlite().all()
+        return list(_local_cache().table.entries())
+    except Exception as exc:  # pragma: no cover - defensive
+        raise StorageError(f"日記データの読み込みに失敗しました: {exc}") from exc
+
+
+@perf.timed()
+def load_table() -> DiaryTable:
+    """All diaries as a date-sorted ``DiaryTable``; the local backends hand out a copy of the cached one."""
+    _configure()
+    if SHEETS_DIRECT:
+        with _SHEET_LOCK:
+            return _sheet_view().table.copy()
+    if SHEETS_WRITE_BEHIND:
+        _sync_worker()
     try:
-        with DIARY_FILE.open("r", encoding="utf-8") as f:
-            diaries = json.load(f)
-            if not isinstance(diaries, list):
-                return []
-            return sorted(diaries, key=lambda x: x.get("date", ""))
+        with _LOCK:
+            if SQLITE_ENABLED:
+                return _sqlite_cached_table().copy()
+            return _local_cache().table.copy()
     except Exception as exc:  # pragma: no cover - defensive
         raise StorageError(f"日記データの読み込みに失敗しました: {exc}") from exc
 
 
-def save_diaries(diaries: List[Dict[str, Any]]) -> None:
-    if SHEETS_ENABLED:
+@perf.timed()
+def save_diaries(diaries: Sequence[EntryLike]) -> None:
+    _configure()
+    if SHEETS_DIRECT:
         # Sheets運用時はローカル保存しない
         return
+    table = _save_all(diaries)
+    if SHEETS_WRITE_BEHIND:
+        # 取り込み・復元した日記もシートへ送る（同じ日付は最新の1件だけが待ちに残る）
+        try:
+            _sync_worker().outbox.enqueue_many(table.to_dicts())
+        except Exception as exc:
+            raise StorageError(f"Google Sheets 送信待ちへの登録に失敗しました: {exc}") from exc
+        _sync_worker().wake()
+    _notify(None)
+
+
+def _save_all(diaries: Sequence[EntryLike]) -> DiaryTable:
+    global _sqlite_coverage, _sqlite_table
     try:
-        with DIARY_FILE.open("w", encoding="utf-8") as f:
-            json.dump(diaries, f, ensure_ascii=False, indent=2)
+        table = DiaryTable.from_entries(diaries)
+        if SQLITE_ENABLED:
+            _sqlite().replace_all(table)
+            with _LOCK:
+                _sqlite_coverage = None
+                _sqlite_table = None
+            return table
+        with _LOCK:
+            _write_snapshot(table.to_dicts())
+            _cache.reset(table, _local_signature())
+        return table
     except Exception as exc:
         raise StorageError(f"日記データの保存に失敗しました: {exc}") from exc
 
 
-def get_diary(date_str: str) -> Optional[Dict[str, Any]]:
-    return next((d for d in load_diaries() if d.get("date") == date_str), None)
+def _write_snapshot(rows: List[Dict[str, Any]]) -> None:
+    write_json_atomic(DIARY_FILE, rows)
+    if JOURNAL_FILE.exists():
+        # 全件保存はジャーナルの内容も含んだスナップショットになる
+        JOURNAL_FILE.unlink()
+
 
+@perf.timed()
+def get_diary(date_str: str) -> Optional[DiaryEntry]:
+    _configure()
+    if SHEETS_DIRECT:
+        with _SHEET_LOCK:
+            return _sheet_view().table.get(date_str)
+    try:
+        if SQLITE_ENABLED:
+            return _sqlite().get(date_str)
+        with _LOCK:
+            return _local_cache().table.get(date_str)
+    except Exception as exc:  # pragma: no cover - defensive
+        raise StorageError(f"日記データの読み込みに失敗しました: {exc}") from exc
 
-def upsert_diary(entry: Dict[str, Any]) -> Dict[str, Any]:
-    entry = {**entry, "updated_at": _now_str()}
-    if SHEETS_ENABLED:
+
+@perf.timed()
+def upsert_diary(entry: EntryLike) -> DiaryEntry:
+    _configure()
+    try:
+        entry = replace(DiaryEntry.from_dict(entry), updated_at=_now_str())
+    except ValueError as exc:
+        raise StorageError(f"日付の形式が正しくありません: {entry.get('date')}") from exc
+    if SHEETS_DIRECT:
         try:
             _upsert_sheet(entry)
         except Exception as exc:  # pragma: no cover - Google Sheets optional
+            sheets.reset(SHEET_KEY)
             raise StorageError(f"Google Sheets への書き込みに失敗しました: {exc}") from exc
+        _notify(entry)
         return entry
 
-    diaries = load_diaries()
-    existing_idx = next((i for i, d in enumerate(diaries) if d.get("date") == entry["date"]), None)
-    if existing_idx is None:
-        diaries.append(entry)
-    else:
-        diaries[existing_idx] = entry
-    diaries = sorted(diaries, key=lambda x: x["date"])
-    save_diaries(diaries)
-    if SHEETS_ENABLED:
+    _put_local(entry)
+    if SHEETS_WRITE_BEHIND:
         try:
-            _sync_to_sheet(entry)
-        except Exception as exc:  # pragma: no cover - Google Sheets optional
-            if st:
-                st.warning(f"Google Sheets への同期に失敗しました: {exc}")
+            _sync_worker().outbox.enqueue(entry.to_dict())
+        except Exception as exc:
+            raise StorageError(f"Google Sheets 送信待ちへの登録に失敗しました: {exc}") from exc
+        _sync_worker().wake()
+    _notify(entry)
     return entry
 
 
-def list_missing_dates(diaries: List[Dict[str, Any]], lookback_days: int = 30) -> List[str]:
-    existing_dates = {d.get("date") for d in diaries}
+def _put_local(entry: DiaryEntry) -> None:
+    if SQLITE_ENABLED:
+        try:
+            _sqlite().upsert(entry)
+        except Exception as exc:
+            raise StorageError(f"日記データの保存に失敗しました: {exc}") from exc
+        with _LOCK:
+            if _sqlite_coverage is not None:
+                _sqlite_coverage.add(entry.date)
+            if _sqlite_table is not None:
+                _sqlite_table.upsert(entry)
+        return
+
+    if JOURNAL_ENABLED:
+        with _LOCK:
+            cache = _local_cache()
+            try:
+                _append_journal(entry.to_dict())
+            except Exception as exc:
+                raise StorageError(f"日記データの保存に失敗しました: {exc}") from exc
+            cache.put(entry)
+            cache.signature = _local_signature()
+        _maybe_compact_journal()
+        return
+
+    with _LOCK:
+        cache = _local_cache()
+        rows = cache.table.to_dicts()
+        idx = bisect.bisect_left(cache.dates, entry.date)
+        if idx < len(rows) and rows[idx]["date"] == entry.date:
+            rows[idx] = entry.to_dict()
+        else:
+            rows.insert(idx, entry.to_dict())
+        try:
+            _write_snapshot(rows)
+        except Exception as exc:
+            raise StorageError(f"日記データの保存に失敗しました: {exc}") from exc
+        # 索引とカバレッジは作り直さずに1件分だけ更新する
+        cache.put(entry)
+        cache.signature = _local_signature()
+
+
+def _sqlite_cached_table() -> DiaryTable:
+    """Every SQLite diary as one table, read once per process and kept up to date on write."""
+    global _sqlite_table
+    with _LOCK:
+        perf.cache("storage.sqlite_table", _sqlite_table is not None)
+        if _sqlite_table is None:
+            _sqlite_table = DiaryTable.from_entries(_sqlite().all())
+        return _sqlite_table
+
+
+def coverage() -> Coverage:
+    """Bitmap of the dates that have an entry, kept up to date on write."""
+    global _sqlite_coverage
+    _configure()
+    if SHEETS_DIRECT:
+        with _SHEET_LOCK:
+            return _sheet_view().coverage
+    if SQLITE_ENABLED:
+        with _LOCK:
+            if _sqlite_coverage is None:
+                _sqlite_coverage = Coverage.from_dates(_sqlite().dates())
+            return _sqlite_coverage
+    with _LOCK:
+        return _local_cache().coverage
+
+
+@perf.timed()
+def list_missing_dates(diaries: Optional[Sequence[EntryLike]] = None, lookback_days: int = 30) -> List[str]:
+    """Dates without an entry from ``lookback_days`` ago through today, oldest first.
+
+    Without ``diaries`` the stored ``coverage()`` bitmap is used, so the lookback length
+    barely matters; with ``diaries`` the given list is checked day by day as before.
+    """
     today = date.today()
+    if diaries is None:
+        return coverage().missing(today - timedelta(days=lookback_days), today)
+    existing_dates = {d.get("date") for d in diaries}
     missing: List[str] = []
     for i in range(lookback_days + 1):
         d = today - timedelta(days=i)
@@ -105,20 +558,74 @@ def list_missing_dates(diaries: List[Dict[str, Any]], lookback_days: int = 30) -
     return missing
 
 
-def search_diaries(keyword: str) -> List[Dict[str, Any]]:
-    keyword_lower = keyword.lower()
-    results: List[Dict[str, Any]] = []
-    for diary in load_diaries():
-        for key, value in diary.items():
-            if key == "updated_at":
-                continue
-            if keyword_lower in str(value).lower():
-                results.append(diary)
-                break
-    return sorted(results, key=lambda x: x["date"], reverse=True)
-
-
+@perf.timed()
+def search_diaries(keyword: str) -> List[DiaryEntry]:
+    """Search with ``人:石田`` style field filters and ``OR``; ranked by hit count, then recency."""
+    _configure()
+    if SHEETS_DIRECT:
+        with _SHEET_LOCK:
+            cache = _sheet_view()
+            return [cache.table.get(d) for d in cache.index.search(keyword)]  # type: ignore[misc]
+
+    if SQLITE_ENABLED:
+        return _sqlite().search(keyword, SEARCH_FIELDS)
+    with _LOCK:
+        cache = _local_cache()
+        return [cache.table.get(d) for d in cache.index.search(keyword)]  # type: ignore[misc]
+
+
+@perf.timed()
+def query_diaries(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    keyword: str = "",
+    limit: int = 20,
+    offset: int = 0,
+) -> Tuple[List[DiaryEntry], int]:
+    """Return one page of entries within ``start..end`` (newest first) and the total hit count.
+
+    With ``keyword`` the page is ordered by search rank instead (see ``search_diaries``;
+    the SQLite backend ranks by FTS5 bm25).
+    """
+    _configure()
+    lo, hi = start or "", end or "9999-12-31"
+    if keyword.strip() and SQLITE_ENABLED and not SHEETS_DIRECT:
+        # 並べ替えと切り出しは SQL 側で行い、そのページの行だけを読み出す
+        store = _sqlite()
+        return (
+            store.search(keyword, SEARCH_FIELDS, start, end, limit=limit, offset=offset),
+            store.search_count(keyword, SEARCH_FIELDS, start, end),
+        )
+    if keyword.strip():
+        hits = [d for d in search_diaries(keyword) if lo <= d.date <= hi]
+        return hits[offset : offset + limit], len(hits)
+
+    if SQLITE_ENABLED and not SHEETS_DIRECT:
+        store = _sqlite()
+        return store.range(start, end, limit=limit, offset=offset, descending=True), store.count(start, end)
+
+    # シートの読み込みは通信を挟むので、ローカル用のロックの外で行う
+    sheet_table = load_table() if SHEETS_DIRECT else None
+    with _LOCK:
+        table = sheet_table if sheet_table is not None else _local_cache().table
+        dates = table.dates
+        i, j = bisect.bisect_left(dates, lo), bisect.bisect_right(dates, hi)
+        # 新しい順にページを切り出す
+        page_end = max(i, j - offset)
+        page_start = max(i, page_end - limit)
+        return table.entries()[page_start:page_end][::-1], j - i
+
+
+@perf.timed()
 def load_mindmap() -> Dict[str, Any]:
+    _configure()
+    if SQLITE_ENABLED:
+        try:
+            raw = _sqlite().get_meta("mindmap")
+            data = json.loads(raw) if raw else None
+        except Exception as exc:  # pragma: no cover - defensive
+            raise StorageError(f"マインドマップの読み込みに失敗しました: {exc}") from exc
+        return data if isinstance(data, dict) else {"content": "", "updated_at": ""}
     if not MINDMAP_FILE.exists():
         return {"content": "", "updated_at": ""}
     try:
@@ -131,67 +638,218 @@ def load_mindmap() -> Dict[str, Any]:
         raise StorageError(f"マインドマップの読み込みに失敗しました: {exc}") from exc
 
 
+def mindmap_history() -> MindmapHistory:
+    """Every saved version of the mindmap (data/mindmap_history.jsonl, for any backend)."""
+    global _mindmap_history
+    with _LOCK:
+        if _mindmap_history is None or _mindmap_history.path != MINDMAP_HISTORY_FILE:
+            _mindmap_history = MindmapHistory(MINDMAP_HISTORY_FILE)
+        return _mindmap_history
+
+
+@perf.timed()
 def save_mindmap(content: str) -> Dict[str, Any]:
+    _configure()
+    history = mindmap_history()
+    # 履歴ができる前の内容も失わないよう、最初の保存で1版目として残す
+    previous = load_mindmap() if not len(history) else None
     mindmap = {"content": content, "updated_at": _now_str()}
     try:
-        with MINDMAP_FILE.open("w", encoding="utf-8") as f:
-            json.dump(mindmap, f, ensure_ascii=False, indent=2)
+        if SQLITE_ENABLED:
+            _sqlite().set_meta("mindmap", json.dumps(mindmap, ensure_ascii=False))
+        else:
+            write_json_atomic(MINDMAP_FILE, mindmap)
     except Exception as exc:
         raise StorageError(f"マインドマップの保存に失敗しました: {exc}") from exc
+    try:
+        if previous and previous.get("content"):
+            history.record(previous["content"], previous.get("updated_at") or "")
+        history.record(content, mindmap["updated_at"])
+    except OSError as exc:
+        raise StorageError(f"マインドマップは保存しましたが、履歴の保存に失敗しました: {exc}") from exc
     return mindmap
 
 
-def _sheet_client():
-    import gspread  # type: ignore
-
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+def _sheet_connection() -> sheets.SheetConnection:
+    conn = sheets.pooled(SHEET_KEY)
+    if conn is not None:
+        return conn
     creds_json = SHEETS_CONFIG.get("service_account_json")
     if not creds_json:
         raise StorageError("Google Sheets 用の service_account_json が secrets にありません。")
-    return gspread.service_account_from_dict(creds_json, scopes=scope)
+    return sheets.connection(SHEET_KEY, creds_json, HEADERS)
+
+
+def _mirror() -> sheets.SheetMirror:
+    global _sheet_mirror, _sheet_cache
+    with _SHEET_LOCK:
+        if _sheet_mirror is None or (_sheet_mirror.path, _sheet_mirror.source) != (MIRROR_FILE, SHEET_KEY):
+            _sheet_mirror = sheets.SheetMirror(MIRROR_FILE, SHEET_KEY)
+            _sheet_cache = None
+        return _sheet_mirror
+
+
+def _pull_sheet() -> "_DiaryCache":
+    """The sheet as a cache (table, index, coverage): the mirror plus what changed since the last pull."""
+    global _sheet_cache
+    with _SHEET_LOCK:
+        mirror = _mirror()
+        delta = mirror.pull(_sheet_connection())
+        perf.cache("sheets.mirror", not (delta.full or delta.changed or delta.removed))
+        if _sheet_cache is None or delta.full:
+            # 日付が空・不正な行（手入力の途中など）は from_entries が読み飛ばす
+            _sheet_cache = _DiaryCache()
+            _sheet_cache.reset(mirror.records(), None)
+            return _sheet_cache
+        for key in delta.removed:
+            try:
+                _sheet_cache.discard(iso_date(key))
+            except ValueError:
+                continue
+        for record in delta.changed:
+            try:
+                _sheet_cache.put(DiaryEntry.from_dict(record))
+            except ValueError:
+                continue
+        return _sheet_cache
 
 
-def _ensure_header(ws) -> None:
-    values = ws.get_all_values()
-    if not values:
-        ws.append_row(HEADERS)
-        return
-    if values[0] != HEADERS:
-        ws.update("A1:H1", [HEADERS])
-
-
-def _load_diaries_from_sheet() -> List[Dict[str, Any]]:
-    gc = _sheet_client()
-    sh = gc.open_by_key(SHEET_KEY)
-    ws = sh.sheet1
-    _ensure_header(ws)
-    records = ws.get_all_records()
-    diaries: List[Dict[str, Any]] = []
-    for row in records:
-        # 既存シートのキーを安全に取り出し、型を調整
-        diary = {h: row.get(h, "") for h in HEADERS}
-        diary["date"] = str(diary.get("date", ""))
+def _sheet_view() -> "_DiaryCache":
+    # 呼び出し側は _SHEET_LOCK を持ったまま結果を使う
+    try:
+        return _pull_sheet()
+    except Exception as exc:  # pragma: no cover - Google Sheets optional
+        sheets.reset(SHEET_KEY)
+        raise StorageError(f"Google Sheets からの読み込みに失敗しました: {exc}") from exc
+
+
+@perf.timed()
+def _load_diaries_from_sheet() -> List[DiaryEntry]:
+    return _pull_sheet().table.entries()[::-1]
+
+
+def _mirror_written(entries: List[EntryLike]) -> None:
+    # 自分で書いた行はミラーにも反映し、次の差分確認で読み直さないようにする
+    with _SHEET_LOCK:
+        if _sheet_mirror is None:
+            return
+        written = [DiaryEntry.from_dict(e) for e in entries]
+        _sheet_mirror.put([e.to_dict() for e in written])
+        if _sheet_cache is not None:
+            for entry in written:
+                _sheet_cache.put(entry)
+
+
+@perf.timed()
+def _upsert_sheet(entry: EntryLike) -> None:
+    _sheet_connection().upsert_rows([entry])
+    _mirror_written([entry])
+
+
+@perf.timed()
+def _fetch_sheet_rows(dates: List[str]) -> Dict[str, Dict[str, Any]]:
+    try:
+        return _sheet_connection().fetch_rows(dates)
+    except Exception:
+        sheets.reset(SHEET_KEY)
+        raise
+
+
+@perf.timed()
+def _push_sheet_rows(entries: List[Dict[str, Any]]) -> None:
+    try:
+        _sheet_connection().upsert_rows(entries)
+    except Exception:
+        sheets.reset(SHEET_KEY)
+        raise
+    _mirror_written(entries)
+
+
+def _adopt_remote(row: Dict[str, Any]) -> None:
+    # シート側の方が新しい場合はローカルを上書きする（updated_at はそのまま）
+    entry = DiaryEntry.from_dict(row)
+    _put_local(entry)
+    _notify(entry)
+
+
+def _put_local_many(entries: List[DiaryEntry]) -> None:
+    """Upsert several entries with one write (one snapshot, or one SQLite transaction)."""
+    if SQLITE_ENABLED:
         try:
-            diary["youtube"] = float(diary.get("youtube", 0)) if diary.get("youtube") != "" else 0.0
-        except Exception:
-            diary["youtube"] = 0.0
-        diaries.append(diary)
-    return sorted(diaries, key=lambda x: x.get("date", ""), reverse=True)
-
-
-def _upsert_sheet(entry: Dict[str, Any]) -> None:
-    gc = _sheet_client()
-    sh = gc.open_by_key(SHEET_KEY)
-    ws = sh.sheet1
-    _ensure_header(ws)
-
-    records = ws.get_all_records()
-    dates = [row.get("date") for row in records]
-    row_values = [entry.get(h, "") for h in HEADERS]
-
-    if entry["date"] in dates:
-        idx = dates.index(entry["date"]) + 2  # 1-based, header is row 1
-        ws.update(f"A{idx}:H{idx}", [row_values])
-    else:
-        # 新規はヘッダー直下に挿入して最新を上に
-        ws.insert_row(row_values, index=2, value_input_option="USER_ENTERED")
+            _sqlite().upsert_many(entries)
+        except Exception as exc:
+            raise StorageError(f"日記データの保存に失敗しました: {exc}") from exc
+        with _LOCK:
+            for entry in entries:
+                if _sqlite_coverage is not None:
+                    _sqlite_coverage.add(entry.date)
+                if _sqlite_table is not None:
+                    _sqlite_table.upsert(entry)
+        return
+    with _LOCK:
+        table = _local_cache().table.copy()
+        for entry in entries:
+            table.upsert(entry)
+        _save_all(table.entries())
+
+
+def _pull_from_sheet() -> None:
+    """Merge rows that are missing or newer on the sheet into the local store."""
+    pending = set(_sync_worker().outbox.dates())
+    local = load_table()
+    newer = []
+    for row in _load_diaries_from_sheet():
+        if row.date in pending:
+            continue
+        current = local.get(row.date)
+        if current is None or sync.timestamp(row.updated_at) > sync.timestamp(current.updated_at):
+            newer.append(row)
+    if not newer:
+        return
+    # 1行ずつ保存すると json では毎回全件を書き直すので、まとめて1回で書く
+    if len(newer) == 1:
+        _put_local(newer[0])
+        _notify(newer[0])
+        return
+    _put_local_many(newer)
+    _notify(None)
+
+
+def _sync_worker() -> SyncWorker:
+    global _sync_worker_instance
+    with _LOCK:
+        if _sync_worker_instance is None:
+            _sync_worker_instance = SyncWorker(
+                Outbox(OUTBOX_FILE),
+                fetch=_fetch_sheet_rows,
+                push=_push_sheet_rows,
+                on_remote_newer=_adopt_remote,
+                pull=_pull_from_sheet,
+                batch_size=int(SHEETS_CONFIG.get("sync_batch_size", 50)),
+                interval=float(SHEETS_CONFIG.get("sync_interval_seconds", 30)),
+            )
+            _sync_worker_instance.start()
+        return _sync_worker_instance
+
+
+def sync_status() -> Dict[str, Any]:
+    """Pending/failed counts of the write-behind outbox (``enabled`` is False otherwise).
+
+    ``watermark`` is the newest ``updated_at`` in the sheet mirror ("" before the first pull).
+    """
+    _configure()
+    watermark = _sheet_mirror.watermark if _sheet_mirror is not None else ""
+    if not SHEETS_WRITE_BEHIND:
+        return {"enabled": False, "pending": 0, "failed": 0, "error": "", "watermark": watermark}
+    outbox = _sync_worker().outbox
+    pending, failed = outbox.counts()
+    return {"enabled": True, "pending": pending, "failed": failed, "error": outbox.last_error(), "watermark": watermark}
+
+
+def retry_failed_sync() -> None:
+    _configure()
+    if not SHEETS_WRITE_BEHIND:
+        return
+    worker = _sync_worker()
+    worker.outbox.retry_failed()
+    worker.wake()
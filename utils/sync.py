@@ -0,0 +1,217 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.fileio import write_json_atomic
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 300.0
+
+
+# USER_ENTERED で書いた値は "2026/10/18 9:05:00" のように整形されて返ってくる
+_TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+
+
+def timestamp(value: Any) -> datetime:
+    """``updated_at`` as a datetime, whichever way Sheets formatted it; ``datetime.min`` if unreadable.
+
+    Comparing the strings is not enough: "9:05:00" sorts after "10:30", and
+    "10:00:00" after "10:00" from the same minute.
+    """
+    text = str(value or "").strip().replace("/", "-")
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return datetime.min
+
+
+class Outbox:
+    """Durable queue of diary entries waiting to be pushed to Google Sheets.
+
+    Only the latest entry per date is kept. The file is rewritten atomically on
+    every change, so a crash never loses an entry that was already saved locally.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._items: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._items is None:
+            items: Dict[str, Dict[str, Any]] = {}
+            if self.path.exists():
+                with self.path.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    items = data
+            self._items = items
+        return self._items
+
+    def _persist(self) -> None:
+        write_json_atomic(self.path, self._load())
+
+    def enqueue(self, entry: Dict[str, Any]) -> None:
+        self.enqueue_many([entry])
+
+    def enqueue_many(self, entries: List[Dict[str, Any]]) -> None:
+        """Queue several entries with one rewrite of the file (e.g. after a bulk save)."""
+        with self._lock:
+            items = self._load()
+            for entry in entries:
+                items[entry["date"]] = {"entry": entry, "attempts": 0, "next_attempt": 0.0, "error": "", "failed": False}
+            self._persist()
+
+    def due(self, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        with self._lock:
+            items = [i for i in self._load().values() if not i["failed"] and i["next_attempt"] <= now]
+        return [i["entry"] for i in sorted(items, key=lambda i: i["entry"]["date"])[:limit]]
+
+    def dates(self) -> List[str]:
+        with self._lock:
+            return list(self._load())
+
+    def next_due_in(self, now: Optional[float] = None) -> Optional[float]:
+        now = time.time() if now is None else now
+        with self._lock:
+            pending = [i["next_attempt"] for i in self._load().values() if not i["failed"]]
+        return max(0.0, min(pending) - now) if pending else None
+
+    def ack(self, entries: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            items = self._load()
+            for entry in entries:
+                item = items.get(entry["date"])
+                # 送信中に同じ日付が再保存されていたら、新しい方は残す
+                if item is not None and item["entry"].get("updated_at") == entry.get("updated_at"):
+                    del items[entry["date"]]
+            self._persist()
+
+    def retry_later(self, entries: List[Dict[str, Any]], error: str) -> None:
+        with self._lock:
+            items = self._load()
+            for entry in entries:
+                item = items.get(entry["date"])
+                if item is None:
+                    continue
+                item["attempts"] += 1
+                item["error"] = error
+                if item["attempts"] >= MAX_ATTEMPTS:
+                    item["failed"] = True
+                else:
+                    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (item["attempts"] - 1))
+                    item["next_attempt"] = time.time() + delay * random.uniform(0.5, 1.0)
+            self._persist()
+
+    def retry_failed(self) -> None:
+        with self._lock:
+            for item in self._load().values():
+                if item["failed"]:
+                    item.update(attempts=0, next_attempt=0.0, failed=False)
+            self._persist()
+
+    def counts(self) -> Tuple[int, int]:
+        """Return (pending, failed)."""
+        with self._lock:
+            items = list(self._load().values())
+        failed = sum(1 for i in items if i["failed"])
+        return len(items) - failed, failed
+
+    def last_error(self) -> str:
+        with self._lock:
+            errors = [i["error"] for i in self._load().values() if i["error"]]
+        return errors[-1] if errors else ""
+
+
+class SyncWorker:
+    """Background thread that drains an ``Outbox`` to Sheets in batches.
+
+    ``fetch`` returns the remote rows for a list of dates and ``push`` writes a batch.
+    When the remote row has a newer ``updated_at`` than the queued entry, the remote
+    wins and is handed to ``on_remote_newer`` instead of being overwritten. ``pull`` runs
+    once (retried every cycle until it succeeds) to seed the local store from the sheet.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        fetch: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+        push: Callable[[List[Dict[str, Any]]], None],
+        on_remote_newer: Callable[[Dict[str, Any]], None],
+        pull: Optional[Callable[[], None]] = None,
+        batch_size: int = 50,
+        interval: float = 30.0,
+    ) -> None:
+        self.outbox = outbox
+        self.fetch = fetch
+        self.push = push
+        self.on_remote_newer = on_remote_newer
+        self.pull = pull
+        self._pulled = pull is None
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sheets-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self._pulled:
+                try:
+                    self.pull()  # type: ignore[misc]
+                    self._pulled = True
+                except Exception:
+                    pass
+            self.drain()
+            wait = self.outbox.next_due_in()
+            self._wake.wait(self.interval if wait is None else min(self.interval, wait))
+            self._wake.clear()
+
+    def drain(self) -> int:
+        """Push every due entry; return how many were acknowledged."""
+        done = 0
+        while not self._stop.is_set():
+            entries = self.outbox.due(self.batch_size)
+            if not entries:
+                break
+            try:
+                remote = self.fetch([e["date"] for e in entries])
+                to_push = []
+                for entry in entries:
+                    row = remote.get(entry["date"])
+                    if row is not None and timestamp(row.get("updated_at")) > timestamp(entry.get("updated_at")):
+                        self.on_remote_newer(row)
+                    else:
+                        to_push.append(entry)
+                if to_push:
+                    self.push(to_push)
+            except Exception as exc:
+                self.outbox.retry_later(entries, str(exc))
+                break
+            self.outbox.ack(entries)
+            done += len(entries)
+        return done
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import string
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import perf
+
+# 値 -> (正規化した値, エラー文。問題なければ "")
+Rule = Callable[[str], Tuple[str, str]]
+
+FIELD_KINDS = ("text", "textarea")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+@dataclass
+class FieldSpec:
+    name: str
+    label: str
+    kind: str = "text"
+    required: bool = False
+    rule: str = ""
+    placeholder: str = ""
+    max_length: int = 0
+    # 入力値で他のフィールドを引く先（例: "jan" / "model"。使い方は画面側が決める）
+    lookup: str = ""
+
+
+@dataclass
+class Part:
+    """A fragment chosen by whether ``when`` (a field) is filled: ``text`` if so, else ``fallback``."""
+
+    when: str
+    text: str
+    fallback: str
+
+
+Segments = List[Tuple[str, Optional[str]]]
+
+
+def _format_string(segments: Segments) -> str:
+    """Back to a ``str.format_map`` pattern (literal braces escaped), so filling runs in C."""
+    return "".join(
+        literal.replace("{", "{{").replace("}", "}}") + ("{" + name + "}" if name is not None else "")
+        for literal, name in segments
+    )
+
+
+@dataclass
+class CompiledTemplate:
+    """A template file parsed once: its input fields, conditional parts and a ready-to-fill pattern."""
+
+    key: str
+    label: str
+    description: str
+    fields: List[FieldSpec]
+    parts: Dict[str, Part]
+    pattern: str
+    digest: str
+    order: Tuple[int, str] = (0, "")
+    # 登録側は解釈しない画面向けの設定（"options": {...}）
+    options: Dict[str, Any] = field(default_factory=dict)
+    _rules: Dict[str, Rule] = field(default_factory=dict, repr=False)
+
+    def check(self, raw: Dict[str, str]) -> Tuple[Dict[str, str], List[str], List[str]]:
+        """(normalized values, labels of missing required fields, other validation errors)."""
+        values: Dict[str, str] = {}
+        missing: List[str] = []
+        errors: List[str] = []
+        for spec in self.fields:
+            value = str(raw.get(spec.name) or "").strip()
+            if not value:
+                if spec.required:
+                    missing.append(spec.label)
+                values[spec.name] = ""
+                continue
+            if spec.rule:
+                value, error = self._rules[spec.rule](value)
+                if error:
+                    errors.append(error)
+            if spec.max_length and len(value) > spec.max_length:
+                errors.append(f"{spec.label}は{spec.max_length}文字以内で入力してください")
+            values[spec.name] = value
+        return values, missing, errors
+
+    def render(self, raw: Dict[str, str]) -> str:
+        """Fill the template; raises ``TemplateError`` when a required field is missing or invalid."""
+        values, missing, errors = self.check(raw)
+        if missing:
+            errors.insert(0, " / ".join(missing) + " を入力してください")
+        if errors:
+            raise TemplateError("、".join(errors))
+        return self.fill(values)
+
+    def fill(self, values: Dict[str, str]) -> str:
+        """Fill already-checked values (every field present, stripped) without validating again."""
+        scope = dict(values)
+        for name, part in self.parts.items():
+            scope[name] = (part.text if values[part.when] else part.fallback).format_map(scope)
+        return self.pattern.format_map(scope)
+
+
+def _compile_text(text: str, known: List[str], constants: Dict[str, str], where: str) -> str:
+    """Check every ``{name}`` in ``text`` against ``known`` once, so filling cannot fail later.
+
+    Constants are substituted here, leaving only per-prompt values for ``format_map``.
+    """
+    segments: Segments = []
+    try:
+        parsed = list(string.Formatter().parse(text))
+    except ValueError as e:
+        raise TemplateError(f"{where}: {e}") from None
+    for literal, name, spec, conversion in parsed:
+        if name is not None and (spec or conversion):
+            raise TemplateError(f"{where}: {{{name}}} に書式指定は使えません")
+        if name is not None and name not in known:
+            raise TemplateError(f"{where}: 未定義の差し込み項目 {{{name}}}")
+        if name in constants:
+            segments.append((literal + constants[name], None))
+        else:
+            segments.append((literal, name))
+    return _format_string(segments)
+
+
+def _text(value: Any, where: str) -> str:
+    # 長い本文は JSON では行のリストで書く
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return "\n".join(value)
+    if isinstance(value, str):
+        return value
+    raise TemplateError(f"{where} は文字列か文字列のリストにしてください")
+
+
+def compile_template(
+    data: Dict[str, Any], digest: str, rules: Dict[str, Rule], constants: Dict[str, str]
+) -> CompiledTemplate:
+    """Validate one template definition and pre-split its text; raises ``TemplateError``."""
+    if not isinstance(data, dict):
+        raise TemplateError("テンプレートは JSON オブジェクトにしてください")
+    key = data.get("key")
+    if not isinstance(key, str) or not key:
+        raise TemplateError("key がありません")
+    fields = []
+    for raw in data.get("fields", []):
+        try:
+            spec = FieldSpec(**raw)
+        except TypeError as e:
+            raise TemplateError(f"fields の書き方が正しくありません: {e}") from None
+        if spec.kind not in FIELD_KINDS:
+            raise TemplateError(f"{spec.name}: kind は {' / '.join(FIELD_KINDS)} のどれかにしてください")
+        if spec.rule and spec.rule not in rules:
+            raise TemplateError(f"{spec.name}: 未知の rule {spec.rule!r}")
+        fields.append(spec)
+    names = [f.name for f in fields]
+    if len(set(names)) != len(names):
+        raise TemplateError("fields の name が重複しています")
+    known = names + list(constants)
+    parts: Dict[str, Part] = {}
+    for name, raw in (data.get("parts") or {}).items():
+        if raw.get("when") not in names:
+            raise TemplateError(f"parts.{name}: when には fields の name を指定してください")
+        # 後の parts からは前の parts も参照できる
+        parts[name] = Part(
+            raw["when"],
+            _compile_text(_text(raw.get("text", ""), f"parts.{name}.text"), known, constants, f"parts.{name}"),
+            _compile_text(_text(raw.get("else", ""), f"parts.{name}.else"), known, constants, f"parts.{name}"),
+        )
+        known.append(name)
+    order = data.get("order", 0)
+    return CompiledTemplate(
+        key=key,
+        label=str(data.get("label") or key),
+        description=str(data.get("description", "")),
+        fields=fields,
+        parts=parts,
+        pattern=_compile_text(_text(data.get("template", ""), "template"), known, constants, "template"),
+        digest=digest,
+        order=(order if isinstance(order, int) else 0, key),
+        options=dict(data.get("options") or {}),
+        _rules=rules,
+    )
+
+
+class TemplateRegistry:
+    """Prompt templates loaded from ``*.json`` in a directory.
+
+    Each file is compiled once and cached by its content hash; ``refresh`` re-reads only
+    files whose mtime or size changed, so calling it on every rerun gives hot reload for
+    the cost of one directory scan. Broken files are skipped and listed in ``errors``.
+    """
+
+    def __init__(
+        self, directory: Path, rules: Optional[Dict[str, Rule]] = None, constants: Optional[Dict[str, str]] = None
+    ) -> None:
+        self.directory = directory
+        self.rules = rules or {}
+        self.constants = constants or {}
+        self.errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        self._by_file: Dict[str, CompiledTemplate] = {}
+        self._by_digest: Dict[str, CompiledTemplate] = {}
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._loaded = False
+
+    def _compile_file(self, path: str) -> CompiledTemplate:
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        cached = self._by_digest.get(digest)
+        perf.cache("templates", cached is not None)
+        if cached is not None:
+            return cached
+        try:
+            data = json.loads(raw.decode("utf-8-sig"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise TemplateError(f"JSON として読めません: {e}") from None
+        compiled = compile_template(data, digest, self.rules, self.constants)
+        self._by_digest[digest] = compiled
+        return compiled
+
+    def refresh(self) -> bool:
+        """Pick up added, edited and removed files; returns True when anything changed."""
+        with self._lock:
+            try:
+                entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json") and e.is_file()]
+            except FileNotFoundError:
+                entries = []
+            seen = set()
+            changed = not self._loaded
+            for entry in entries:
+                seen.add(entry.name)
+                st = entry.stat()
+                stat = (st.st_mtime_ns, st.st_size)
+                if self._stats.get(entry.name) == stat:
+                    continue
+                self._stats[entry.name] = stat
+                changed = True
+                try:
+                    self._by_file[entry.name] = self._compile_file(entry.path)
+                    self.errors.pop(entry.name, None)
+                except (OSError, TemplateError) as e:
+                    self._by_file.pop(entry.name, None)
+                    self.errors[entry.name] = str(e)
+            for name in set(self._stats) - seen:
+                changed = True
+                self._stats.pop(name)
+                self._by_file.pop(name, None)
+                self.errors.pop(name, None)
+            if changed:
+                self._rebuild()
+            self._loaded = True
+            return changed
+
+    def _rebuild(self) -> None:
+        templates: Dict[str, CompiledTemplate] = {}
+        for name in sorted(self._by_file):
+            compiled = self._by_file[name]
+            if compiled.key in templates:
+                self.errors[name] = f"key {compiled.key!r} が他のファイルと重複しています"
+                continue
+            templates[compiled.key] = compiled
+        self._templates = dict(sorted(templates.items(), key=lambda kv: kv[1].order))
+        # 使われなくなった版は捨てる（同じ内容に戻したときの再コンパイルは許容する）
+        live = {t.digest for t in self._by_file.values()}
+        self._by_digest = {d: t for d, t in self._by_digest.items() if d in live}
+
+    def templates(self) -> Dict[str, CompiledTemplate]:
+        """Templates by key in display order (loads the directory on first use)."""
+        if not self._loaded:
+            self.refresh()
+        return self._templates
+
+    def get(self, key: str) -> CompiledTemplate:
+        try:
+            return self.templates()[key]
+        except KeyError:
+            raise TemplateError(f"テンプレート {key!r} がありません") from None